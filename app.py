@@ -1,19 +1,18 @@
 import os
 import logging
 import eventlet # Import eventlet for async mode
-import uuid # For generating the unique user ID
+# Redshift fit pools start from a forkserver (see get_redshift_mp_context), which multiprocessing
+# only offers if it was imported while the socket module still had sendmsg, i.e. before patching
+import multiprocessing
 
 # Use eventlet for async capabilities required by background tasks
 eventlet.monkey_patch()
 
+import click
 from flask import Flask, render_template, redirect, url_for, session, request
 from flask_socketio import SocketIO # No need for emit, join_room, etc. here anymore
 from flask_sqlalchemy import SQLAlchemy
-from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField
-from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from flask_bcrypt import Bcrypt
-from flask import g, make_response, redirect, url_for, flash
+from flask import g, make_response, redirect, url_for, flash, jsonify
 
 # --- App Setup ---
 app = Flask(__name__)
@@ -30,10 +29,97 @@ else:
 
 app.config['SQLALCHEMY_DATABASE_URI'] = uri
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False # Recommended to silence a warning
+# Explicitly sized connection pool (DB_POOL_SIZE, DB_MAX_OVERFLOW, ...), and make psycopg2
+# yield to the eventlet hub while waiting on Postgres so queries don't stall the game loops
+from web_logic.database import engine_options_from_env, instrument_engine, make_psycopg2_green
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(uri)
+if uri.startswith('postgresql'):
+    make_psycopg2_green()
+# Also signs the identity cookie, so it must be set before init_identity()
+app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'a_very_secret_key_please_change')
+# Largest request body, in MB; redshift catalogs (/cosmological-redshift-hypothesis/fit) are the biggest uploads
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 64)) << 20
 
 # THIS LINE IS CRUCIAL: it defines the 'db' object
 db = SQLAlchemy(app) 
-bcrypt = Bcrypt(app) # Initialize Bcrypt
+
+_bcrypt = None
+def get_bcrypt():
+    """Flask-Bcrypt, imported on first use (nothing hashes passwords at boot)."""
+    global _bcrypt
+    if _bcrypt is None:
+        from flask_bcrypt import Bcrypt
+        _bcrypt = Bcrypt(app)
+    return _bcrypt
+
+# bcrypt is ~100 ms of pure CPU: always hash/check through these, which run it on a
+# native thread (web_logic/offload.py) instead of freezing every game on the hub
+from web_logic.offload import run_cpu
+def hash_password(password):
+    return run_cpu(get_bcrypt().generate_password_hash, password).decode('utf-8')
+
+def check_password(password_hash, password):
+    return run_cpu(get_bcrypt().check_password_hash, password_hash, password)
+
+_strategy_solver = None
+def get_strategy_solver():
+    """The NxN calculator's StrategySolver, imported on first use (NumPy is slow to import)."""
+    global _strategy_solver
+    if _strategy_solver is None:
+        from math_logic.strategy import strategy_solver_from_env
+        _strategy_solver = strategy_solver_from_env()
+    return _strategy_solver
+
+_prime_table = None
+def get_prime_table():
+    """The /prime-number-generation PrimeTable, imported on first use."""
+    global _prime_table
+    if _prime_table is None:
+        from math_logic.primes import prime_table_from_env
+        _prime_table = prime_table_from_env()
+    return _prime_table
+
+_equation_lab = None
+def get_equation_lab():
+    """The Open Equation Lab grader, imported on first use."""
+    global _equation_lab
+    if _equation_lab is None:
+        from math_logic.equation_lab import EquationLab
+        _equation_lab = EquationLab(db, EquationCard, StressTest, StressTestResult)
+    return _equation_lab
+
+_redshift_cache = None
+_redshift_mp_context = None
+def get_redshift_cache():
+    """The redshift fit FitCache, imported on first use."""
+    global _redshift_cache
+    if _redshift_cache is None:
+        from math_logic.redshift import fit_cache_from_env
+        _redshift_cache = fit_cache_from_env()
+    return _redshift_cache
+
+def get_redshift_mp_context():
+    """
+    Redshift fits with REDSHIFT_WORKERS > 1 start their pools from a forkserver:
+    a fresh interpreter with only math_logic.redshift loaded, rather than
+    forking this worker's eventlet hub, sockets and database pool.
+    """
+    global _redshift_mp_context
+    if _redshift_mp_context is None:
+        import multiprocessing
+        _redshift_mp_context = multiprocessing.get_context('forkserver')
+        _redshift_mp_context.set_forkserver_preload(['math_logic.redshift'])
+    return _redshift_mp_context
+
+@app.cli.command('regrade-equations')
+@click.option('--workers', default=os.cpu_count() or 1, help='Grading processes.')
+def regrade_equations(workers):
+    """Grade every stale Equation Card / stress test pair."""
+    print(f"Graded {get_equation_lab().regrade(workers=workers)} pairs.")
+
+# Per-query timings and pool usage (db_stats.stats())
+with app.app_context():
+    db_stats = instrument_engine(db.engine)
 
 # --- Database Models ---
 # --- Database Models ---
@@ -43,102 +129,68 @@ class User(db.Model):
     username = db.Column(db.String(20), nullable=False, default='Player1')
     email = db.Column(db.String(120), unique=True, nullable=True) 
     password_hash = db.Column(db.String(60), nullable=True) 
+    # Written in batches by UserWriter.touch(); anonymous users idle too long are pruned
+    last_seen = db.Column(db.DateTime, nullable=True, index=True)
 
     def __repr__(self):
         return f"User('{self.username}', '{self.email}')"
 
 
-# --- Create tables (simple bootstrap for first deploy) ---
-# This is safe to run on startup; it will create missing tables if needed.
-with app.app_context():
-    try:
-        db.create_all()
-    except Exception as e:
-        app.logger.error(f"DB table creation failed: {e}")
-# --- Identity Management ---
-USER_ID_COOKIE_NAME = 'user_id' # The key for the cookie
-
-@app.before_request
-def load_or_create_user():
-    """Checks for a user cookie; loads the user or creates a new one."""
-
-    # Skip identity work for static assets
-    if request.path.startswith('/static') or request.path == '/favicon.ico':
-        return
-
-    user_id_cookie = request.cookies.get(USER_ID_COOKIE_NAME)
+# --- Open Equation Lab Models ---
+# Cards are graded against stress tests by math_logic/equation_lab.py; editing
+# either bumps its version, which is what marks its stored results stale.
+class EquationCard(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    expression = db.Column(db.Text, nullable=False)
+    variables = db.Column(db.JSON, nullable=False, default=dict) # name -> units
+    domain = db.Column(db.String(200), nullable=False, default='') # Comma-separated
+    version = db.Column(db.Integer, nullable=False, default=1)
+    submitted_by = db.Column(db.String(36), nullable=True) # User.id
+    updated_at = db.Column(db.DateTime, nullable=True)
 
-    user = None # Initialize user object
+    def __repr__(self):
+        return f"EquationCard({self.id}, '{self.title}', v{self.version})"
 
-    if user_id_cookie:
-        # 1. Cookie exists: Try to load the user from the database using db.session.get()
-        # This is more robust than User.query.get(id) in certain contexts.
-        user = db.session.get(User, user_id_cookie)
-        if user:
-            g.user = user # Store user object on Flask's global request context
-            return # Continue to the requested route
-        # If user_id_cookie exists but user is not in DB, we treat it as new.
 
-    # 2. No valid cookie/user found: Create a new anonymous user (Tier 1)
-    if not user: # If the user object is still None, create a new one
-        new_user_id = str(uuid.uuid4()) # Generate a UUID for the primary key
-        new_user = User(
-            id=new_user_id,
-            username='Player1', # Default name as requested
-        )
+class StressTest(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    domain = db.Column(db.String(100), nullable=False, default='universal')
+    inputs = db.Column(db.JSON, nullable=False) # variable -> number or list of numbers
+    expected = db.Column(db.JSON, nullable=False) # list of numbers
+    tolerance = db.Column(db.Float, nullable=False, default=0.01) # Relative
+    version = db.Column(db.Integer, nullable=False, default=1)
+    submitted_by = db.Column(db.String(36), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
 
-        # Add and commit the new user within a transaction
-        try:
-            db.session.add(new_user)
-            db.session.commit()
-            
-            # CRUCIAL: After commit, the object is technically detached, but since 
-            # we are using db.session.get() above for existing users, and the 
-            # new_user object is fresh, storing it in g.user is generally safe, 
-            # but we can improve it by being explicit:
-            
-            # Reload the object (optional, but robust)
-            g.user = db.session.get(User, new_user_id) 
+    def __repr__(self):
+        return f"StressTest({self.id}, '{self.title}', v{self.version})"
 
-        except Exception as e:
-            db.session.rollback()
-            # If an error occurs here, we still need to set g.user to something 
-            # to prevent further failure, but since it's a critical failure, 
-            # it's best to log and redirect.
-            app.logger.error(f"Failed to create new user: {e}")
-            # In a real app, you would redirect to an error page. For now, 
-            # we let the request continue and rely on the existing g.user setting 
-            # in the happy path.
-            # We'll stick to setting g.user = new_user, as the error path 
-            # likely caused the redirect you saw before.
-            g.user = new_user
-    
-    return
-    
-@app.after_request
-def set_user_cookie(response):
-    """Ensure the browser has a stable user_id cookie.
 
-    We set/overwrite the cookie when:
-      - the request had no cookie, OR
-      - the request cookie doesn't match the resolved g.user.id (e.g., stale/invalid cookie)
-    """
-    try:
-        resolved_user_id = getattr(getattr(g, 'user', None), 'id', None)
-        if not resolved_user_id:
-            return response
+class StressTestResult(db.Model):
+    card_id = db.Column(db.Integer, db.ForeignKey('equation_card.id', ondelete='CASCADE'), primary_key=True)
+    test_id = db.Column(db.Integer, db.ForeignKey('stress_test.id', ondelete='CASCADE'), primary_key=True,
+                        index=True)
+    card_version = db.Column(db.Integer, nullable=False)
+    test_version = db.Column(db.Integer, nullable=False)
+    grade = db.Column(db.String(8), nullable=False) # Pass / Partial / Fail / Untested
+    score = db.Column(db.Float, nullable=False) # Share of points within tolerance
+    max_error = db.Column(db.Float, nullable=True)
+    detail = db.Column(db.String(200), nullable=False, default='')
+    graded_at = db.Column(db.DateTime, nullable=False)
 
-        incoming_cookie = request.cookies.get(USER_ID_COOKIE_NAME)
-        if (not incoming_cookie) or (incoming_cookie != resolved_user_id):
-            # Long-term cookie (5 years)
-            response.set_cookie(USER_ID_COOKIE_NAME, resolved_user_id, max_age=60*60*24*365*5)
-    except Exception as e:
-        app.logger.error(f"Failed setting user cookie: {e}")
 
-    return response
+# --- Database Schema ---
+# Versioned migrations (web_logic/schema.py): one query at boot once the database is current.
+from web_logic.schema import init_schema
+init_schema(app, db)
 
-# (Your existing app.config['SECRET_KEY'] should be here or moved up)
-app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'a_very_secret_key_please_change')
+# --- Identity Management ---
+# g.user comes from a signed {id, username} cookie and only loads the User row
+# when a route needs more than the id and name (see web_logic/identity.py).
+from web_logic.identity import init_identity
+init_identity(app, db, User)
 
 # --- Logging Setup ---
 # Configure logging before initializing SocketIO or importing manager
@@ -146,8 +198,17 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 log = logging.getLogger(__name__)
 
 # --- SocketIO Setup ---
-# Initialize SocketIO after Flask app, including CORS configuration
-socketio = SocketIO(app, async_mode="eventlet", cors_allowed_origins="*")
+# Initialize SocketIO after Flask app, including CORS configuration.
+# With SOCKETIO_MESSAGE_QUEUE set (a redis:// URL), several workers/nodes share rooms:
+# emits travel through the queue and room events are routed to the owning worker.
+# Either way room emits are encoded once and the same frame goes to every socket in the room.
+MESSAGE_QUEUE_URL = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+from game_logic.backend import EncodeOnceManager, RespSocketIOManager
+if MESSAGE_QUEUE_URL:
+    client_manager = RespSocketIOManager(MESSAGE_QUEUE_URL)
+else:
+    client_manager = EncodeOnceManager()
+socketio = SocketIO(app, async_mode="eventlet", cors_allowed_origins="*", client_manager=client_manager)
 
 # --- Game Logic Import and Handler Registration ---
 # Import the manager module AFTER socketio has been created
@@ -163,100 +224,376 @@ except ImportError:
 except Exception as e:
     log.error(f"An error occurred during manager initialization: {e}", exc_info=True)
 
+def start_war_rooms():
+    """
+    Starts hosting War rooms in this process: claims a room shard (with
+    SOCKETIO_MESSAGE_QUEUE set), starts the routed-message listener and restores
+    snapshotted rooms. Only web workers call this (gunicorn.conf.py's
+    post_worker_init, or the __main__ block below), so `flask` CLI commands and
+    the release phase never hold a shard lease.
+    """
+    if 'manager' not in globals():
+        return
+    from game_logic.backend import backend_from_env
+    from game_logic.snapshots import store_from_env
+    from game_logic.game_log import game_log_from_env
+    manager.start_backend(backend_from_env())
+    # Restore rooms saved before the last restart and keep snapshotting them
+    # (WAR_SNAPSHOTS = a directory, or 'db' for the app database; unset = off)
+    with app.app_context():
+        manager.configure_snapshots(store_from_env(db.engine))
+        # Keep every finished game (seed + events) for replays (WAR_GAME_LOG = a file, or 'db')
+        manager.configure_game_log(game_log_from_env(db.engine))
+
+
+# --- Metrics ---
+# Prometheus text at /metrics: route latency, queries per request, rooms/players,
+# emits, scheduler lag, pool and cache stats. Closed unless METRICS_TOKEN (bearer token) or METRICS_PUBLIC=1 is set
+from web_logic import identity
+from web_logic.metrics import Metrics
+metrics = Metrics()
+with app.app_context():
+    metrics.init_app(app, db.engine)
+metrics.add_collector(db_stats.collect_metrics)
+metrics.add_collector(client_manager.collect_metrics)
+metrics.add_stats('wescoup_user_writer', identity.user_writer.stats,
+                  counters=('batches', 'inserted', 'renamed', 'touched'))
+if identity.user_cache is not None:
+    metrics.add_stats('wescoup_user_cache', identity.user_cache.stats,
+                      counters=('hits', 'misses', 'evictions', 'invalidations'))
+if 'manager' in globals():
+    metrics.add_collector(manager.collect_metrics)
+
+# --- Hub Watchdog ---
+# Logs the stack of any greenlet that holds the eventlet hub for HUB_WATCHDOG_MS+ (0 = off)
+from web_logic import offload
+hub_watchdog = offload.watchdog_from_env()
+metrics.add_stats('wescoup_cpu_offload', lambda: dict(offload.offload_stats), counters=('jobs',))
+if hub_watchdog is not None:
+    metrics.add_stats('wescoup_hub_watchdog', hub_watchdog.stats, counters=('stalls',))
+
+# --- Templates ---
+# Compiled templates are kept in a bytecode cache, filled at build time by bin/post_compile
+from web_logic.templating import init_template_cache
+init_template_cache(app)
+
+# --- Static Assets ---
+# After a build (bin/post_compile runs python -m web_logic.assets), url_for('static')
+# points at content-hashed copies served with immutable year-long caching.
+from web_logic.assets import init_assets
+init_assets(app)
+
+# --- Page Cache ---
+# Pages that don't depend on the visitor are rendered once per worker and served
+# precompressed with ETags (see web_logic/page_cache.py). Routes that read g.user
+# (the War pages, the profile) must not use @page_cache.page.
+from web_logic.page_cache import PageCache
+page_cache = PageCache.from_env()
+metrics.add_stats('wescoup_page_cache', page_cache.stats, counters=('hits', 'misses', 'not_modified'))
+metrics.add_stats('wescoup_strategy_solver', lambda: _strategy_solver.stats() if _strategy_solver else {},
+                  counters=('hits', 'misses', 'solved'))
+metrics.add_stats('wescoup_prime_table', lambda: _prime_table.stats() if _prime_table else {},
+                  counters=('queries', 'segments_sieved'))
+metrics.add_stats('wescoup_equation_lab', lambda: _equation_lab.stats() if _equation_lab else {},
+                  counters=('graded', 'regrades'))
+metrics.add_stats('wescoup_redshift_fits', lambda: _redshift_cache.stats() if _redshift_cache else {},
+                  counters=('hits', 'misses'))
+
 
 # --- Standard Routes ---
 @app.route('/')
+@page_cache.page
 def index():
     return render_template('index.html')
 
 # --- Math Routes ---
 @app.route('/tonys-math-musings')
+@page_cache.page
 def tonys_math_musings():
     return render_template('math/tonys-math-musings.html')
 
 @app.route('/space-launch-assist')
+@page_cache.page
 def space_launch_assist():
     return render_template('math/space-launch-assist.html')
 
 @app.route('/optimal-strategy')
+@page_cache.page
 def optimal_strategy():
     return render_template('math/optimal-strategy.html')
 
 @app.route('/prime-number-generation')
+@page_cache.page
 def prime_number_generation():
     return render_template('math/prime-number-generation.html')
 
+PRIME_LIST_SPAN = 10 ** 6 # Widest range /primes returns as JSON; use primes.txt for more
+
+def _prime_range_args():
+    """(start, stop) from the query string, or a 400 response."""
+    start = request.args.get('start', 0, type=int)
+    stop = request.args.get('stop', type=int)
+    if stop is None or start < 0 or stop < start:
+        return None, (jsonify({'error': 'Expected integer ?start=&stop= with 0 <= start <= stop'}), 400)
+    try:
+        run_cpu(get_prime_table().check_range, start, stop) # May grow the table
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    return (start, stop), None
+
+@app.route('/prime-number-generation/primes')
+def prime_number_generation_primes():
+    """The primes in [start, stop) as JSON (at most PRIME_LIST_SPAN wide)."""
+    bounds, error = _prime_range_args()
+    if error:
+        return error
+    start, stop = bounds
+    if stop - start > PRIME_LIST_SPAN:
+        return jsonify({'error': f'At most {PRIME_LIST_SPAN:,} numbers per request; '
+                                 f'use /prime-number-generation/primes.txt for wider ranges'}), 400
+    primes = get_prime_table().primes(start, stop).tolist()
+    return jsonify({'start': start, 'stop': stop, 'count': len(primes), 'primes': primes})
+
+@app.route('/prime-number-generation/count')
+def prime_number_generation_count():
+    """How many primes lie in [start, stop)."""
+    bounds, error = _prime_range_args()
+    if error:
+        return error
+    start, stop = bounds
+    return jsonify({'start': start, 'stop': stop, 'count': run_cpu(get_prime_table().count, start, stop)})
+
+@app.route('/prime-number-generation/primes.txt')
+def prime_number_generation_download():
+    """Streams the primes in [start, stop) as text, one per line, in bounded memory."""
+    bounds, error = _prime_range_args()
+    if error:
+        return error
+    start, stop = bounds
+    chunks = get_prime_table().iter_primes(start, stop, chunk=1 << 20)
+    body = (''.join(f'{p}\n' for p in primes.tolist()) for primes in chunks)
+    return app.response_class(body, mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename=primes-{start}-{stop}.txt'})
+
 @app.route('/cosmological-redshift-hypothesis')
+@page_cache.page
 def cosmological_redshift_hypothesis():
     return render_template('math/cosmological-redshift-hypothesis.html')
 
+REDSHIFT_WORKERS = int(os.environ.get('REDSHIFT_WORKERS', 1))
+
+@app.route('/cosmological-redshift-hypothesis/fit', methods=['POST'])
+def cosmological_redshift_fit():
+    """
+    Fits the energy-loss and expansion models to an uploaded CSV catalog
+    (multipart field "catalog", or the raw request body). Query options:
+    replicates (bootstrap resamples), omega_m, distance=luminosity|comoving.
+    See math_logic/redshift.py; results are cached by the file's SHA-256.
+    """
+    import hashlib
+    import tempfile
+    from math_logic.redshift import DEFAULT_OMEGA_M, DEFAULT_REPLICATES, MAX_REPLICATES, cached_fit
+
+    max_upload = app.config['MAX_CONTENT_LENGTH']
+    too_large = jsonify({'error': f'Catalogs are limited to {max_upload >> 20} MB'}), 413
+    if request.content_length and request.content_length > max_upload:
+        return too_large
+    replicates = request.args.get('replicates', DEFAULT_REPLICATES, type=int)
+    omega_m = request.args.get('omega_m', DEFAULT_OMEGA_M, type=float)
+    distance = request.args.get('distance', 'luminosity')
+    if not (0 <= replicates <= MAX_REPLICATES and 0 < omega_m <= 1 and distance in ('luminosity', 'comoving')):
+        return jsonify({'error': f'Expected 0 <= replicates <= {MAX_REPLICATES}, 0 < omega_m <= 1 and '
+                                 f'distance=luminosity or comoving'}), 400
+
+    upload = request.files.get('catalog')
+    stream = upload.stream if upload else request.stream
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+        path = f.name
+        for chunk in iter(lambda: stream.read(1 << 20), b''):
+            size += len(chunk)
+            if size > max_upload: # A chunked body has no Content-Length to check up front
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    if size > max_upload:
+        os.unlink(path)
+        return too_large
+    try:
+        mp_context = get_redshift_mp_context() if REDSHIFT_WORKERS > 1 else None
+        result, cached = run_cpu(cached_fit, path, get_redshift_cache(), digest=digest.hexdigest(),
+                                 workers=REDSHIFT_WORKERS, mp_context=mp_context, replicates=replicates,
+                                 omega_m=omega_m, luminosity=distance == 'luminosity', seed=0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        os.unlink(path)
+    return jsonify(dict(result, cached=cached))
+
 @app.route('/redefining-gravity')
+@page_cache.page
 def redefining_gravity():
     return render_template('math/redefining-gravity.html')
 
 @app.route('/open-equation-lab')
+@page_cache.page
 def open_equation_lab():
     return render_template('math/open-equation-lab.html')
 
+@app.route('/open-equation-lab/cards', methods=['GET', 'POST'])
+def open_equation_lab_cards():
+    """
+    GET lists every Equation Card with its Pass/Partial/Fail/Untested counts.
+    POST creates a card (or edits one of your own, {"id": ...}) from JSON {title, expression,
+    variables: {name: units}, domain} and grades it against the tests that apply.
+    """
+    lab = get_equation_lab()
+    if request.method == 'GET':
+        return jsonify({'cards': lab.summaries()})
+    try:
+        card = lab.save_card(request.get_json(silent=True) or {}, user_id=g.user.id)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except PermissionError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 403
+    lab.regrade(card_ids=[card.id], run=run_cpu)
+    return open_equation_lab_card(card.id)
+
+@app.route('/open-equation-lab/cards/<int:card_id>')
+def open_equation_lab_card(card_id):
+    """One Equation Card and its result against every test that applies to it."""
+    from math_logic.equation_lab import card_json
+    card = db.session.get(EquationCard, card_id)
+    if card is None:
+        return jsonify({'error': f'No card {card_id}'}), 404
+    return jsonify(dict(card_json(card), profile=get_equation_lab().profile(card)))
+
+@app.route('/open-equation-lab/tests', methods=['GET', 'POST'])
+def open_equation_lab_tests():
+    """
+    GET lists the stress tests. POST creates one (or edits your own, {"id": ...}) from JSON
+    {title, domain, inputs: {name: number or list}, expected: [...], tolerance}
+    and grades every card it applies to.
+    """
+    from math_logic.equation_lab import test_json
+    lab = get_equation_lab()
+    if request.method == 'GET':
+        return jsonify({'tests': [test_json(t) for t in db.session.scalars(db.select(StressTest))]})
+    try:
+        test = lab.save_test(request.get_json(silent=True) or {}, user_id=g.user.id)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except PermissionError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 403
+    lab.regrade(test_ids=[test.id], run=run_cpu)
+    return jsonify(test_json(test))
+
 @app.route('/beal-conjecture')
+@page_cache.page
 def beal_conjecture():
     return render_template('math/beal-conjecture.html')
 
+@app.route('/beal-conjecture/search')
+def beal_conjecture_search():
+    """Progress and results of the Beal counterexample searches (run with python -m math_logic.beal)."""
+    from math_logic.beal import beal_dir_from_env, list_runs
+    return jsonify({'runs': list_runs(beal_dir_from_env())})
+
 # --- Tennis & Pickleblall Routes ---
 @app.route('/tonys-tennis-tools')
+@page_cache.page
 def tonys_tennis_tools():
     return render_template('tennis/tonys-tennis-tools.html')
 
 @app.route('/tonys-tracker-instructions')
+@page_cache.page
 def tonys_tracker_instructions():
     return render_template('tennis/tonys-tracker-instructions.html')
 
 @app.route('/tonys-tennis-tracker')
+@page_cache.page
 def tonys_tennis_tracker():
     return render_template('tennis/tonys-tennis-tracker.html')
 
 @app.route('/tonys-doubles-tracker')
+@page_cache.page
 def tonys_doubles_tracker():
     return render_template('tennis/tonys-doubles-tracker.html')
 
 @app.route('/tonys-strategy-calculator-instructions')
+@page_cache.page
 def tonys_strategy_calculator_instructions():
     return render_template('tennis/tonys-strategy-calculator-instructions.html')
 
 @app.route('/tonys-strategy-calculator-2x2')
+@page_cache.page
 def tonys_strategy_calculator_2x2():
     return render_template('tennis/tonys-strategy-calculator-2x2.html')
 
 @app.route('/tonys-strategy-calculator-3x3')
+@page_cache.page
 def tonys_strategy_calculator_3x3():
     return render_template('tennis/tonys-strategy-calculator-3x3.html')
 
 @app.route('/tonys-strategy-calculator-NxN')
+@page_cache.page
 def tonys_strategy_calculator_NxN():
     return render_template('tennis/tonys-strategy-calculator-NxN.html')
 
+@app.route('/tonys-strategy-calculator-NxN/solve', methods=['POST'])
+def tonys_strategy_calculator_NxN_solve():
+    """
+    Solves payoff matrices exactly (see math_logic/strategy.py). Takes JSON
+    {"payoffs": [[...], ...]} for one matrix or {"matrices": [...]} for a batch,
+    and returns {"result": {...}} or {"results": [...]} with each player's mix and the game value.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or ('payoffs' not in data and 'matrices' not in data):
+        return jsonify({'error': 'Expected JSON with "payoffs" or "matrices"'}), 400
+    batch = data['matrices'] if 'matrices' in data else [data['payoffs']]
+    if not isinstance(batch, list):
+        return jsonify({'error': '"matrices" must be a list of payoff matrices'}), 400
+    try:
+        results = get_strategy_solver().solve_batch(batch, run=run_cpu)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if 'matrices' in data:
+        return jsonify({'results': results})
+    return jsonify({'result': results[0]})
+
 @app.route('/tonys-pickleball-tools')
+@page_cache.page
 def tonys_pickleball_tools():
     return render_template('pickleball/tonys-pickleball-tools.html')
 
 @app.route('/tonys-pickleball-instructions')
+@page_cache.page
 def tonys_pickleball_instructions():
     return render_template('pickleball/tonys-pickleball-instructions.html')
 
 @app.route('/tonys-pickleball-tracker')
+@page_cache.page
 def tonys_pickleball_tracker():
     return render_template('pickleball/tonys-pickleball-tracker.html')
 
 @app.route('/tonys-pickleball-doubles-tracker')
+@page_cache.page
 def tonys_pickleball_doubles_tracker():
     return render_template('pickleball/tonys-pickleball-doubles-tracker.html')
 
 @app.route('/floating-mulligan')
+@page_cache.page
 def floating_mulligan():
     return render_template('golf/floating-mulligan.html')
 
 # --- Game Routes ---
 @app.route('/tonys-time-traps')
+@page_cache.page
 def tonys_time_traps():
     """Serves the main game selection page."""
     return render_template('games/tonys-time-traps.html')
@@ -280,6 +617,7 @@ def war_new_game():
     )
 
 @app.route('/tonys-snake-game')
+@page_cache.page
 def tonys_snake_game():
     # I need to set this up for g.user in the future.
     # player_username = g.user.username
@@ -296,6 +634,29 @@ def war_game_room(code):
         player_username=g.user.username
     )
 
+@app.route('/war/watch/<code>')
+def war_watch_room(code):
+    """Renders the game board for a spectator (?view=results for results and war climaxes only)."""
+    view = request.args.get('view', 'full')
+    log.info(f"Serving War spectator page for room: {code} ({view} view)")
+    return render_template(
+        'games/war_multiplayer.html',
+        room_code=code,
+        spectate_view=view,
+        player_username=g.user.username
+    )
+
+@app.route('/war/replay/<game_id>')
+def war_replay(game_id):
+    """Renders the game board in replay mode (?speed=2&turn=100 to fast-forward)."""
+    log.info(f"Serving War replay page for game: {game_id}")
+    return render_template(
+        'games/war_multiplayer.html',
+        room_code=game_id,
+        replay_id=game_id,
+        player_username=g.user.username
+    )
+
 @app.route('/profile')
 def user_profile():
     """Renders the user profile page using the current user (Tier 1 or Tier 2)."""
@@ -319,6 +680,9 @@ def change_username():
         if not new_username or len(new_username.strip()) < 2:
             flash('Username must be at least 2 characters long.', 'danger')
             return redirect(url_for('user_profile'))
+        if len(new_username.strip()) > identity.MAX_USERNAME_LENGTH:
+            flash(f'Username must be at most {identity.MAX_USERNAME_LENGTH} characters long.', 'danger')
+            return redirect(url_for('user_profile'))
 
         # Check for reserved/default name if Tier 2 (optional, can be expanded)
         # For now, let's keep it simple: just update the current user.
@@ -350,6 +714,7 @@ if __name__ == '__main__':
     log.info("Starting Wescoup website locally with Flask-SocketIO...")
     # Get port from environment or default to 5001 for local dev
     port = int(os.environ.get('PORT', 5001))
+    start_war_rooms()
     # Use socketio.run() for development server which handles WebSockets correctly
     socketio.run(app, debug=True, host='0.0.0.0', port=port)
 
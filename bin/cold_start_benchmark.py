@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Cold-start benchmark: how long a fresh worker process takes from launch to
+its first responses.
+
+Each run starts a new interpreter that imports app (monkey-patching, schema
+check, manager setup, ...) and then serves a few pages through the Flask test
+client, reporting:
+
+  import       - time to `import app`
+  first_page   - first render of a cached article page (/)
+  first_war    - first render of a page that reads g.user (/war/new)
+  total        - process launch to the last of those responses
+
+Runs share one scratch SQLite database (the first run creates it, like a
+deploy would) and one Jinja cache directory unless --cold-cache is given.
+Environment variables set on the Procfile's web line are applied too, so
+the numbers match how dynos boot.
+Prints the median and min of each over --runs runs, or JSON with --json.
+
+    python bin/cold_start_benchmark.py --runs 7
+"""
+import argparse
+import json
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+first_page = time.perf_counter()
+client.get('/war/new')
+first_war = time.perf_counter()
+sys.stdout.write('RESULT ' + json.dumps({
+    'import': imported - started,
+    'first_page': first_page - imported,
+    'first_war': first_war - first_page,
+}) + '\n')
+sys.stdout.flush()
+import os
+os._exit(0) # Skip interpreter teardown (background threads, atexit flushes)
+"""
+
+
+def procfile_env():
+    """NAME=value assignments that prefix the Procfile's web command."""
+    try:
+        with open(os.path.join(ROOT, 'Procfile')) as f:
+            line = next((line for line in f if line.startswith('web:')), '')
+    except FileNotFoundError:
+        return {}
+    env = {}
+    for word in shlex.split(line[len('web:'):]):
+        match = re.fullmatch(r'([A-Z_][A-Z0-9_]*)=(.*)', word)
+        if not match:
+            break
+        env[match.group(1)] = match.group(2)
+    return env
+
+
+def run_once(env):
+    launched = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - launched
+    line = next(line for line in out.splitlines() if line.startswith('RESULT '))
+    result = json.loads(line[len('RESULT '):])
+    result['total'] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure worker cold-start time.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--cold-cache', action='store_true', help="Fresh Jinja cache directory for every run")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='wescoup-bench-')
+    env = dict(os.environ)
+    env.update(procfile_env())
+    env.pop('SOCKETIO_MESSAGE_QUEUE', None)
+    env.update(DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+               JINJA_CACHE_DIR=os.path.join(scratch, 'jinja'),
+               USER_PRUNE_DAYS='0', PYTHONDONTWRITEBYTECODE='')
+
+    results = []
+    for run in range(args.runs):
+        if args.cold_cache:
+            env['JINJA_CACHE_DIR'] = os.path.join(scratch, f'jinja-{run}')
+        results.append(run_once(env))
+
+    keys = ('import', 'first_page', 'first_war', 'total')
+    summary = {key: {'median': statistics.median(r[key] for r in results),
+                     'min': min(r[key] for r in results)} for key in keys}
+    if args.json:
+        print(json.dumps({'runs': args.runs, 'results': results, 'summary': summary}, indent=1))
+        return
+    print(f"{args.runs} runs (scratch: {scratch})")
+    for key in keys:
+        print(f"  {key:<11} median {summary[key]['median'] * 1000:7.1f} ms   min {summary[key]['min'] * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+"""
+Room hosting backends.
+
+A backend decides which worker owns a room and carries messages between
+workers, so several eventlet workers (or several dynos) can host War rooms:
+
+  * InMemoryBackend - one process owns every room (the default, -w 1).
+  * RespBackend     - workers coordinate through any server that speaks the
+                      Redis protocol (Redis itself, or the stand-in in
+                      game_logic/resp_standin.py for local development).
+
+Rooms are sharded by room code: each worker claims one of ROOM_SHARDS shard
+slots and only hands out codes whose index falls in its shard, so any worker
+can tell who owns a room from the code alone. Socket events for a room that
+lives elsewhere are forwarded to the owner's shard channel, and the owner's
+emits reach the player's worker through the Socket.IO message queue
+(RespSocketIOManager below, passed to SocketIO as its client_manager).
+
+Either way, room emits go through EncodeOnceManager, which serializes each
+emit once and sends the same frame to every socket in the room, so a room with
+hundreds of spectators costs one JSON encode per state update, not hundreds.
+"""
+import json
+import logging
+import os
+import pickle
+import socket
+import threading
+import uuid
+from urllib.parse import urlparse
+
+import socketio
+from socketio import packet
+
+from game_logic.room_codes import code_to_index
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_SHARDS = 16
+SHARD_LEASE_SECONDS = 30 # A worker's claim on its shard expires unless renewed
+KEY_PREFIX = 'wescoup:war'
+
+# Extends the lease only while this worker holds it (or takes it back if it lapsed
+# unclaimed); returns 0 once another worker owns the shard
+RENEW_LEASE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+if not owner then
+    return redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) and 1 or 0
+end
+return 0
+"""
+
+
+# --- Redis Protocol (RESP) Client ---
+
+class RespError(Exception):
+    """An error reply from the server."""
+
+
+class RespClient:
+    """
+    Minimal Redis-protocol client (just what the backends need).
+    Uses plain sockets, so under eventlet.monkey_patch() it is green automatically.
+    """
+
+    def __init__(self, url, timeout=5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock() # One command in flight per connection
+        self._subscribers = set() # Connections of the running listen() calls
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile('rb')
+        if self.password:
+            self._command('AUTH', self.password)
+        if self.db:
+            self._command('SELECT', self.db)
+
+    def close(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._reader = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server.")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise RespError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RespError(f"Unexpected reply: {line!r}")
+
+    def _command(self, *args):
+        self._sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """Sends one command and returns its reply. Reconnects once if the connection dropped."""
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._command(*args)
+                except (ConnectionError, OSError):
+                    self.close()
+                    if attempt == 2:
+                        raise
+
+    def listen(self, *channels):
+        """
+        Subscribes on a dedicated connection and yields (channel, data) forever.
+        Call from a background task; the connection is used only for this subscription.
+        """
+        subscriber = RespClient(f"redis://{self.host}:{self.port}/{self.db}", timeout=None)
+        subscriber.password = self.password
+        subscriber._connect()
+        subscriber._sock.sendall(self._encode(('SUBSCRIBE',) + channels))
+        self._subscribers.add(subscriber)
+        try:
+            while True:
+                reply = subscriber._read_reply()
+                if isinstance(reply, list) and len(reply) == 3 and reply[0] == b'message':
+                    yield reply[1].decode('utf-8'), reply[2]
+        finally:
+            self._subscribers.discard(subscriber)
+            subscriber.close()
+
+    def close_subscriptions(self):
+        """Ends every running listen() (its reader sees the connection close)."""
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber._sock.shutdown(socket.SHUT_RDWR)
+            except (AttributeError, OSError):
+                pass
+
+
+# --- Room Backends ---
+
+class InMemoryBackend:
+    """Single-process backend: this worker owns every room."""
+    shard_count = 1
+    shard_index = 0
+
+    def __init__(self):
+        self._handler = None
+
+    def start(self, handler, sio, on_lost=None):
+        """Registers handler(message) for messages routed to this worker."""
+        self._handler = handler
+
+    def owns(self, room_code):
+        return True
+
+    def accepts_index(self, code_index):
+        return True
+
+    def shard_for_code(self, room_code):
+        return 0
+
+    def send_to_shard(self, shard, message):
+        # Only reachable if a caller routes to itself; deliver directly
+        if self._handler:
+            self._handler(message)
+
+
+class RespBackend:
+    """
+    Multi-worker backend over the Redis protocol.
+
+    Each worker claims a shard slot (a leased key) at start-up, subscribes to its
+    shard's channel and renews the lease in the background. Room codes are
+    allocated per shard, so shard_for_code() needs no lookup.
+
+    If the lease is ever lost to another worker (say this one stalled past
+    SHARD_LEASE_SECONDS), the worker stops serving that shard - on_lost(shard)
+    closes its rooms - and claims a free shard instead of taking the old one back.
+    """
+
+    def __init__(self, url, shard_count=None, prefix=KEY_PREFIX):
+        self.client = RespClient(url)
+        self.shard_count = shard_count or int(os.environ.get('ROOM_SHARDS', DEFAULT_SHARDS))
+        self.prefix = prefix
+        self.worker_id = uuid.uuid4().hex
+        self.shard_index = None
+        self._handler = None
+        self._sio = None
+        self._on_lost = None
+
+    def _shard_key(self, shard):
+        return f"{self.prefix}:shard:{shard}"
+
+    def _channel(self, shard):
+        return f"{self.prefix}:shard:{shard}:inbox"
+
+    def claim_shard(self):
+        """Leases the first free shard slot. Raises RuntimeError if every slot is taken."""
+        for shard in range(self.shard_count):
+            if self.client.execute('SET', self._shard_key(shard), self.worker_id,
+                                   'NX', 'EX', SHARD_LEASE_SECONDS) == 'OK':
+                self.shard_index = shard
+                log.info(f"Worker {self.worker_id} claimed room shard {shard}/{self.shard_count}")
+                return shard
+        raise RuntimeError(f"All {self.shard_count} room shards are taken; raise ROOM_SHARDS.")
+
+    def start(self, handler, sio, on_lost=None):
+        """
+        Claims a shard, then starts the inbox listener and lease renewal as
+        background tasks. on_lost(shard) is called if the shard's lease is lost.
+        """
+        self._handler = handler
+        self._sio = sio
+        self._on_lost = on_lost
+        if self.shard_index is None:
+            self.claim_shard()
+        sio.start_background_task(self._listen)
+        sio.start_background_task(self._renew_lease)
+
+    def _listen(self):
+        while True:
+            shard = self.shard_index
+            if shard is None: # Lost our shard and none was free; wait for _renew_lease to claim one
+                self._sio.sleep(1)
+                continue
+            try:
+                for _, data in self.client.listen(self._channel(shard)):
+                    if shard != self.shard_index:
+                        break # No longer ours: leave its inbox to the new owner
+                    try:
+                        self._handler(json.loads(data))
+                    except Exception as e:
+                        log.error(f"Error handling routed room message: {e}", exc_info=True)
+            except Exception as e:
+                if shard == self.shard_index:
+                    log.error(f"Room inbox connection lost, reconnecting: {e}")
+                    self._sio.sleep(1)
+
+    def _renew_lease(self):
+        while True:
+            self._sio.sleep(SHARD_LEASE_SECONDS / 3)
+            try:
+                if self.shard_index is None:
+                    self.claim_shard()
+                elif not self.renew_lease():
+                    self._lose_shard()
+            except Exception as e:
+                log.error(f"Failed to renew room shard lease: {e}")
+
+    def renew_lease(self):
+        """Extends this worker's lease (compare-and-set). Returns False if another worker holds it."""
+        return bool(self.client.execute('EVAL', RENEW_LEASE_SCRIPT, 1, self._shard_key(self.shard_index),
+                                        self.worker_id, SHARD_LEASE_SECONDS))
+
+    def _lose_shard(self):
+        lost = self.shard_index
+        log.error(f"Lost room shard {lost} to another worker; closing its rooms here.")
+        self.shard_index = None
+        self.client.close_subscriptions() # The listener moves on to whichever shard is claimed next
+        if self._on_lost is not None:
+            self._on_lost(lost)
+        self.claim_shard()
+
+    def shard_for_code(self, room_code):
+        try:
+            return code_to_index(room_code) % self.shard_count
+        except ValueError:
+            # Not a valid code: handle it locally (it will simply be "not found")
+            return self.shard_index
+
+    def owns(self, room_code):
+        return self.shard_for_code(room_code) == self.shard_index
+
+    def accepts_index(self, code_index):
+        return code_index % self.shard_count == self.shard_index
+
+    def send_to_shard(self, shard, message):
+        """Publishes a JSON message to the worker that owns shard."""
+        self.client.execute('PUBLISH', self._channel(shard), json.dumps(message))
+
+
+# --- Socket.IO Fan-out ---
+
+class _EncodeOncePacket(packet.Packet):
+    """A packet that serializes itself on first use and reuses the result for every recipient."""
+    _encoded = None
+
+    def encode(self):
+        if self._encoded is None:
+            self._encoded = super().encode()
+        return self._encoded
+
+
+class EncodeOnceManager(socketio.BaseManager):
+    """
+    Client manager whose emits encode the packet once per emit instead of once per
+    recipient (python-socketio's default). Emits with ack callbacks carry a
+    per-recipient id, so those still go through the default path.
+
+    Keeps per-event counts of emits, frames sent and payload bytes for /metrics.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.emit_stats = {} # event -> [emits, frames, payload bytes]
+
+    def _count_emit(self, event, frames, payload_bytes):
+        stats = self.emit_stats.get(event)
+        if stats is None:
+            stats = self.emit_stats[event] = [0, 0, 0]
+        stats[0] += 1
+        stats[1] += frames
+        stats[2] += payload_bytes
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs):
+        # Relies on python-socketio internals (pinned in requirements.txt); anything else takes the public path
+        if (callback is not None or getattr(self.server, 'packet_class', None) is not packet.Packet
+                or not hasattr(self.server, '_send_packet')):
+            self._count_emit(event, 0, 0)
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, **kwargs)
+        if namespace not in self.rooms:
+            return
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+        recipients = [eio_sid for sid, eio_sid in self.get_participants(namespace, room)
+                      if sid not in skip_sid]
+        if not recipients:
+            return
+
+        # Same argument handling as Server._emit_internal
+        if isinstance(data, tuple):
+            data = list(data)
+        elif data is not None:
+            data = [data]
+        else:
+            data = []
+        pkt = _EncodeOncePacket(packet.EVENT, namespace=namespace, data=[event] + data)
+        send_packet = self.server._send_packet
+        for eio_sid in recipients:
+            send_packet(eio_sid, pkt)
+        encoded = pkt._encoded
+        size = len(encoded) if isinstance(encoded, (str, bytes)) else sum(len(part) for part in encoded)
+        self._count_emit(event, len(recipients), size)
+
+    def collect_metrics(self, writer):
+        for event, (emits, frames, payload_bytes) in sorted(self.emit_stats.items()):
+            writer.counter('wescoup_socketio_emits_total', "Socket.IO emits by event", emits, event=event)
+            writer.counter('wescoup_socketio_frames_total', "Socket.IO frames sent (emits x recipients) by event",
+                           frames, event=event)
+            writer.counter('wescoup_socketio_payload_bytes_total', "Encoded payload bytes by event (once per emit)",
+                           payload_bytes, event=event)
+
+
+# --- Socket.IO Message Queue ---
+
+class RespSocketIOManager(socketio.PubSubManager, EncodeOnceManager):
+    """
+    python-socketio client manager over the Redis protocol, so emits from the
+    worker that owns a room reach players connected to any other worker.
+    Same wire format as socketio.RedisManager, without needing the redis package.
+    Messages arriving from the queue are fanned out by EncodeOnceManager.emit.
+    """
+    name = 'resp'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.url = url
+        self.client = RespClient(url)
+
+    def _publish(self, data):
+        return self.client.execute('PUBLISH', self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        while True:
+            try:
+                for _, data in self.client.listen(self.channel):
+                    yield data
+            except Exception as e:
+                log.error(f"Socket.IO message queue connection lost, reconnecting: {e}")
+                self.server.sleep(1)
+
+
+def backend_from_env():
+    """Returns a RespBackend if SOCKETIO_MESSAGE_QUEUE is set, otherwise an InMemoryBackend."""
+    url = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    if url:
+        return RespBackend(url)
+    return InMemoryBackend()
+
+
+def check_worker_count(workers):
+    """
+    Raises RuntimeError if several workers would run without SOCKETIO_MESSAGE_QUEUE:
+    each would get an InMemoryBackend that believes it owns every room, and players
+    would land on workers that can't see each other's rooms.
+    """
+    if workers > 1 and not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        raise RuntimeError(f"{workers} workers need SOCKETIO_MESSAGE_QUEUE (a redis:// URL) to share "
+                           f"War rooms; set it or run one worker (WAR_WORKERS=1).")
@@ -0,0 +1,114 @@
+import random
+from collections import deque
+
+from game_logic.rules import SUITS, VALUES, VALUE_MAP
+
+# --- Card and Deck Classes ---
+# There are exactly 52 Card objects per process (see CARDS below). Every Deck,
+# hand and pile just holds references to them, and each card's client payload
+# is built once, so dealing and broadcasting never create new card objects.
+
+class Card:
+    __slots__ = ('suit', 'value_str', 'rank', 'index', '_payload')
+
+    def __init__(self, suit, value, index):
+        set_attr = object.__setattr__
+        set_attr(self, 'suit', suit)
+        set_attr(self, 'value_str', value) # "2", "J", "K", "A"
+        set_attr(self, 'rank', VALUE_MAP[value]) # 2, 11, 13, 14
+        set_attr(self, 'index', index) # 0-51, position in a fresh deck
+        # Send the string value "J", "Q", "K", "A" to the client
+        set_attr(self, '_payload', {"suit": suit, "value": value, "rank": VALUE_MAP[value]})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card objects are shared and immutable.")
+
+    def __reduce__(self):
+        # Pickling (e.g. into a process pool) resolves back to the interned card
+        return (card_from_index, (self.index,))
+
+    def __repr__(self):
+        return f"Card({self.value_str}{self.suit})"
+
+    def to_dict(self):
+        """Returns the card's pre-built dictionary. Shared by every caller - do not mutate it."""
+        return self._payload
+
+
+# The only Card instances; CARDS[card.index] is card
+CARDS = tuple(Card(s, v, i) for i, (s, v) in enumerate((s, v) for s in SUITS for v in VALUES))
+CARD_LOOKUP = {(card.suit, card.value_str): card for card in CARDS}
+
+
+def card_from_index(index):
+    """Returns the interned card at a fresh-deck position (0-51)."""
+    return CARDS[index]
+
+
+def get_card(suit, value):
+    """Returns the interned card for a suit and value string, e.g. get_card("♠", "A")."""
+    return CARD_LOOKUP[(suit, value)]
+
+
+class Hand:
+    """
+    A player's hand: a deque of cards (top card on the left) plus a per-rank
+    histogram that is kept up to date as cards move, so stats such as
+    "aces held" are O(1) no matter how many cards the hand holds.
+    """
+    __slots__ = ('_cards', 'rank_counts')
+
+    def __init__(self, cards=()):
+        self._cards = deque()
+        self.rank_counts = [0] * (max(VALUE_MAP.values()) + 1) # Indexed by rank, 0/1 unused
+        self.extend(cards)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __iter__(self):
+        return iter(self._cards)
+
+    def __getitem__(self, position):
+        return self._cards[position]
+
+    def draw(self):
+        """Removes and returns the top card."""
+        card = self._cards.popleft()
+        self.rank_counts[card.rank] -= 1
+        return card
+
+    def append(self, card):
+        """Adds a card to the bottom of the hand."""
+        self._cards.append(card)
+        self.rank_counts[card.rank] += 1
+
+    def extend(self, cards):
+        """Adds cards to the bottom of the hand, in order."""
+        counts = self.rank_counts
+        add = self._cards.append
+        for card in cards:
+            add(card)
+            counts[card.rank] += 1
+
+    def clear(self):
+        self._cards.clear()
+        self.rank_counts = [0] * len(self.rank_counts)
+
+    def count_rank(self, rank):
+        return self.rank_counts[rank]
+
+
+class Deck:
+    def __init__(self):
+        # A fresh deck is just a list of references to the interned cards
+        self.cards = list(CARDS)
+
+    def shuffle(self, rng=None):
+        """Shuffles in place. Pass random.Random(seed) for a reproducible deal."""
+        (rng or random).shuffle(self.cards)
+
+    def deal(self, num_hands):
+        """Deals round-robin into Hands (O(1) draws from the top)."""
+        return [Hand(self.cards[i::num_hands]) for i in range(num_hands)]
+
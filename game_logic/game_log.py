@@ -0,0 +1,195 @@
+"""
+Append-only log of finished War games, for replays.
+
+A game is fully determined by its deck seed (WarGame.seed: the deck is
+shuffled with random.Random(seed), exactly like simulator.deal_seed), so a
+record only holds what the seed can't tell us: the names, the events (the
+starting speed, speed changes and disconnects, each tagged with the number of
+game steps played before it) and a short result summary. That is ~30 bytes
+per game.
+
+Turn-by-turn states are rebuilt on demand by manager.ReplayGame, and the
+outcome of any fully played game can be checked with simulator.play_seed(seed).
+
+  * FileGameLog - length-prefixed records appended to one file.
+  * SqlGameLog  - one row per game in a SQLAlchemy table.
+"""
+import logging
+import os
+import struct
+import time
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Format ---
+MAGIC = b'WL'
+FORMAT_VERSION = 1
+
+# Event kinds: (step, kind, arg)
+EVENT_SPEED = 1 # arg = new base delay in tenths of a second
+EVENT_LEFT = 2 # arg = index of the player who disconnected (ends the game)
+
+# Results
+RESULT_P0_WINS = 0
+RESULT_P1_WINS = 1
+RESULT_DRAW = 2 # MAX_ROUNDS reached
+RESULT_ABANDONED = 3 # A player disconnected
+RESULT_ERROR = 4
+
+_HEADER = struct.Struct('<2sBQIHHBH') # magic, version, seed, finished_at, turns, wars, result, event count
+_EVENT = struct.Struct('<IBB') # step, kind, arg
+_LENGTH = struct.Struct('<H') # Record length prefix in FileGameLog
+
+
+def game_id_for_seed(seed):
+    """Game ids are the deck seed in hex (seeds are random 64-bit numbers)."""
+    return f"{seed:016x}"
+
+
+def pack_events(events):
+    """Packs [(step, kind, arg), ...] into bytes."""
+    return b''.join(_EVENT.pack(*event) for event in events)
+
+
+def unpack_events(data, offset, count):
+    """Unpacks count events starting at offset. Returns (events, new offset)."""
+    events = []
+    for _ in range(count):
+        events.append(_EVENT.unpack_from(data, offset))
+        offset += _EVENT.size
+    return events, offset
+
+
+def encode_name(username):
+    """A username as at most 255 bytes of UTF-8, cut on a character boundary."""
+    return username.encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+
+
+def encode_record(record):
+    """Encodes a finished game (see decode_record for the fields) to bytes."""
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, record['seed'], int(record.get('finished_at', time.time())),
+                          record['turns'], record['wars'], record['result'], len(record['events']))]
+    for username in record['usernames']:
+        name = encode_name(username)
+        parts.append(bytes((len(name),)))
+        parts.append(name)
+    parts.append(pack_events(record['events']))
+    return b''.join(parts)
+
+
+def decode_record(data):
+    """Decodes bytes from encode_record() into a dict."""
+    magic, version, seed, finished_at, turns, wars, result, event_count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported game record (magic {magic!r}, version {version}).")
+    offset = _HEADER.size
+    usernames = []
+    for _ in range(2):
+        length = data[offset]
+        usernames.append(data[offset + 1:offset + 1 + length].decode('utf-8', errors='replace'))
+        offset += 1 + length
+    events, _ = unpack_events(data, offset, event_count)
+    return {
+        'game_id': game_id_for_seed(seed),
+        'seed': seed,
+        'finished_at': finished_at,
+        'turns': turns,
+        'wars': wars,
+        'result': result,
+        'usernames': usernames,
+        'events': events,
+    }
+
+
+# --- Stores ---
+
+class FileGameLog:
+    """
+    Appends records to a single file as <u16 length><record>. Several workers may
+    append to the same file; lookups rescan whatever was appended since the last scan.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._index = {} # game_id -> offset of the record body
+        self._scanned = 0 # Bytes of the file already indexed
+
+    def append(self, data):
+        with open(self.path, 'ab') as f:
+            # One write per record, so concurrent appenders never interleave
+            f.write(_LENGTH.pack(len(data)) + data)
+
+    def _scan(self):
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._scanned)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        offset = 0
+        while offset + _LENGTH.size <= len(chunk):
+            (length,) = _LENGTH.unpack_from(chunk, offset)
+            body_start = offset + _LENGTH.size
+            if body_start + length > len(chunk):
+                break # A record still being written
+            seed = _HEADER.unpack_from(chunk, body_start)[2]
+            self._index[game_id_for_seed(seed)] = self._scanned + body_start
+            offset = body_start + length
+        self._scanned += offset
+
+    def get(self, game_id):
+        """Returns a record's bytes, or None."""
+        if game_id not in self._index:
+            self._scan()
+        body_offset = self._index.get(game_id)
+        if body_offset is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(body_offset - _LENGTH.size)
+            (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+            return f.read(length)
+
+
+class SqlGameLog:
+    """Keeps records in a 'war_game_log' table through a SQLAlchemy engine (e.g. db.engine)."""
+
+    def __init__(self, engine, table_name='war_game_log'):
+        import sqlalchemy as sa
+        self.sa = sa
+        self.engine = engine
+        metadata = sa.MetaData()
+        self.table = sa.Table(
+            table_name, metadata,
+            sa.Column('game_id', sa.String(16), primary_key=True),
+            sa.Column('data', sa.LargeBinary, nullable=False),
+        )
+        metadata.create_all(engine, checkfirst=True)
+
+    def append(self, data):
+        seed = _HEADER.unpack_from(data, 0)[2]
+        with self.engine.begin() as conn:
+            conn.execute(self.table.insert(), {'game_id': game_id_for_seed(seed), 'data': data})
+
+    def get(self, game_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(self.sa.select(self.table.c.data).where(self.table.c.game_id == game_id)).first()
+            return bytes(row.data) if row else None
+
+
+def game_log_from_env(engine=None):
+    """
+    Picks a game log from WAR_GAME_LOG: a file path, 'db' (needs engine), or unset for none.
+    """
+    target = os.environ.get('WAR_GAME_LOG')
+    if not target:
+        return None
+    if target == 'db':
+        if engine is None:
+            log.error("WAR_GAME_LOG=db but no database engine was provided.")
+            return None
+        return SqlGameLog(engine)
+    return FileGameLog(target)
@@ -1,78 +1,182 @@
 import logging
-import time
+import os
 import random
+import time
+from collections import deque
 from flask_socketio import emit, join_room, leave_room, close_room
 from flask import request # Import request directly
+from game_logic.rules import VALUE_MAP, MAX_ROUNDS, WAR_SPOIL_CARDS, WAR_CARDS_NEEDED
+from game_logic.cards import CARDS, Deck, Hand
+from game_logic.scheduler import TurnScheduler
+from game_logic.room_codes import RoomCodePool
+from game_logic.backend import InMemoryBackend
+from game_logic import snapshots
+from game_logic import game_log as game_records
+from web_logic.identity import materialize_user, user_id_from_cookies
 
 # --- Global In-Memory Storage ---
 # games = { 'room_code': WarGame() }
 games = {} 
+# Reverse indexes so lookups never scan every game:
+# sid_rooms = { 'sid': 'room_code' } (players and spectators), user_rooms = { 'user_id': 'room_code' }
+sid_rooms = {}
+user_rooms = {}
+# Shuffled pool of unused room codes (codes are recycled when a room is removed)
+room_code_pool = RoomCodePool()
+# Room hosting backend (decides which worker owns a room; see backend.py)
+backend = None
+# Sockets connected to this worker that are seated in a room owned by another worker
+# remote_sids = { 'sid': 'room_code' }
+remote_sids = {}
 # socketio instance (will be set by app.py)
 sio = None 
+# Shared scheduler that drives every room's game loop (created with sio)
+scheduler = None
+# Where room snapshots are written (see configure_snapshots); None disables them
+snapshot_store = None
+# Rooms whose state changed since the last snapshot flush, and rooms to drop from the store
+_dirty_rooms = set()
+_deleted_rooms = set()
+# Append-only log of finished games (see configure_game_log); None disables it
+game_log = None
+# Replays being streamed from this worker: replays = { 'viewer sid': ReplayGame() }
+replays = {}
 
 # --- Constants ---
-SUITS = ["♠", "♥", "♦", "♣"]
-VALUES = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
-VALUE_MAP = {val: i + 2 for i, val in enumerate(VALUES)}
+# Card and rule constants live in rules.py (shared with simulator.py)
 DRAMATIC_DELAY_THRESHOLD = 3
 MAX_SPEED_DELAY = 1.5
 MIN_SPEED_DELAY = 0.5
 DEFAULT_SPEED_DELAY = 1.0
 DRAMATIC_SPEED_DELAY = 1.5
+ACE_RANK = VALUE_MAP['A']
+KING_RANK = VALUE_MAP['K']
+CLEANUP_DELAY = 10 # Seconds a finished game lingers so clients can see the final message
+SNAPSHOT_INTERVAL = 5 # Seconds between write-behind snapshot flushes (a few turns at normal speed)
+# Spectators watch one of two views: 'full' shares the players' stream; 'results'
+# gets only the frame kinds below (see broadcast_state), with its own delta baseline
+SPECTATOR_VIEWS = ('full', 'results')
+SPECTATOR_FRAME_KINDS = frozenset(os.environ.get('WAR_SPECTATOR_FRAMES', 'result,war_battle,game_over').split(','))
+SPECTATOR_MIN_INTERVAL = float(os.environ.get('WAR_SPECTATOR_MIN_INTERVAL', 0)) # Seconds between 'results' frames
+MAX_REPLAY_SPEED = 50 # Replays run at most this many times faster than the original delays
+MIN_REPLAY_SPEED = 0.25
+
+# Turn phases (WarGame.phase). Each phase is one step between two pauses.
+PHASE_TURN = 'turn' # Turn counter, winner check, "Turn N" message
+PHASE_DRAW = 'draw' # Both players flip their top card
+PHASE_COMPARE = 'compare' # Award the hand, or declare WAR
+PHASE_WAR = 'war' # Forfeit check, then the first spoil pair
+PHASE_WAR_SPOIL = 'war_spoil' # Remaining spoil pairs
+PHASE_WAR_BATTLE = 'war_battle' # Battle cards
+PHASE_WAR_RESOLVE = 'war_resolve' # Award the war, or go to ANOTHER WAR
+
+# Frame kinds (what a broadcast shows), used to thin out the spectators' 'results' view
+FRAME_INFO = 'info' # Speed changes and other notices
+FRAME_TURN = 'turn'
+FRAME_DRAW = 'draw'
+FRAME_RESULT = 'result' # A hand or a war was won
+FRAME_WAR = 'war' # It's WAR / ANOTHER WAR
+FRAME_WAR_SPOIL = 'war_spoil'
+FRAME_WAR_BATTLE = 'war_battle' # The war's climax: battle cards revealed
+FRAME_GAME_OVER = 'game_over'
 
 # Configure logging
 log = logging.getLogger(__name__)
 
-# --- Card and Deck Classes ---
-class Card:
-    def __init__(self, suit, value):
-        self.suit = suit
-        self.value_str = value # "2", "J", "K", "A"
-        self.rank = VALUE_MAP[value] # 2, 11, 13, 14
-    
-    def to_dict(self):
-        """Returns a dictionary representation of the card."""
-        # Send the string value "J", "Q", "K", "A" to the client
-        return {"suit": self.suit, "value": self.value_str, "rank": self.rank}
-
-class Deck:
-    def __init__(self):
-        # Create deck using the string values
-        self.cards = [Card(s, v) for s in SUITS for v in VALUES]
-    
-    def shuffle(self):
-        random.shuffle(self.cards)
-    
-    def deal(self, num_hands):
-        hands = [[] for _ in range(num_hands)]
-        for i, card in enumerate(self.cards):
-            hands[i % num_hands].append(card)
-        return hands
-
 # --- WarGame Class ---
 class WarGame:
     def __init__(self, room_code):
         self.room_code = room_code
         # MODIFIED: self.players now stores {'sid': {'index': 0/1, 'username': 'Name'}}
         self.players = {} 
-        self.player_hands = {0: [], 1: []}
+        self.player_hands = {0: Hand(), 1: Hand()} # Hands track their own rank histograms
         # ADDED: Structure to hold permanent player data (names, sids) by index
         self.player_data = {0: {'sid': None, 'username': 'Player 1'}, 
                             1: {'sid': None, 'username': 'Player 2'}}
         self.base_delay = DEFAULT_SPEED_DELAY
         self.game_in_progress = False
         self.game_over = False
-        self.game_loop_task = None # To hold the background task
+        self.game_loop_task = None # Scheduler handle for the next step
+
+        # Turn state machine (see advance())
+        self.phase = None
+        self.turn_delay = self.base_delay # Pause length chosen at the start of the current turn
+        self.play_pile = [] # The two cards flipped this turn
+        self.war_spoils = [] # Everything at stake in the current war
+        self.war_round = [] # Cards laid down in the current war round, P0,P1 interleaved
+
+        # --- Replay record (see game_log.py) ---
+        self.seed = None # Deck seed, chosen when the game starts
+        self.step_count = 0 # advance() steps played so far
+        self.events = [] # (step, kind, arg): the starting speed, speed changes and disconnects
         
         # *** ADDED: Stats tracking ***
-        self.stats = {
-            0: {'hands_won': 0, 'wars_won': 0},
-            1: {'hands_won': 0, 'wars_won': 0}
-        }
+        # Kept up to date as hands are played, so broadcast_state never recomputes them
+        self.stats = self._new_stats()
         self.total_hands_played = 0
 
+        # --- Delta protocol state ---
+        # Room emits are sent as 'game_state_delta' (only the fields that changed since
+        # the previous emit, plus a sequence number). Clients that miss a sequence number
+        # ask for a full 'game_state_update' snapshot via 'request_state_sync'.
+        self.state_seq = 0
+        self.last_state = None # Last full state sent to the room (the delta baseline)
+        self._pile_cache = {} # 'play_pile'/'war_pile' -> (cards tuple, serialized list)
+
+        # --- Spectators ---
+        # { 'sid': 'full' | 'results' }. Spectators sit in the socket.io rooms
+        # '<code>:watch:full' and '<code>:watch:results'; every emit is encoded once
+        # and fanned out to the whole room (see backend.EncodeOnceManager).
+        self.spectators = {}
+        self.spectator_counts = {view: 0 for view in SPECTATOR_VIEWS}
+        self.watch_seq = 0 # Sequence numbers of the 'results' view
+        self.watch_last_state = None # Delta baseline of the 'results' view
+        self._last_watch_frame = 0.0
+
+    @staticmethod
+    def _new_stats():
+        return {
+            0: {'hands_won': 0, 'wars_won': 0, 'win_pct': 0},
+            1: {'hands_won': 0, 'wars_won': 0, 'win_pct': 0}
+        }
+
+    def _refresh_win_pct(self):
+        """Recomputes both players' win percentages (call when hands_won or the turn count changes)."""
+        total = self.total_hands_played
+        for player_stats in self.stats.values():
+            # Rounded to the precision the client displays, so unchanged values drop out of deltas
+            player_stats['win_pct'] = round((player_stats['hands_won'] / total) * 100, 1) if total > 0 else 0
+
+    def _next_turn(self):
+        """Advances the turn counter and returns the new turn number."""
+        self.total_hands_played += 1
+        self._refresh_win_pct()
+        return self.total_hands_played
+
+    def _record_win(self, player_index, war=False):
+        """Credits player_index with a won hand (and a won war, if war=True)."""
+        player_stats = self.stats[player_index]
+        player_stats['hands_won'] += 1
+        if war:
+            player_stats['wars_won'] += 1
+        self._refresh_win_pct()
+
+    def _player_stats(self, player_index):
+        """Builds one player's stats block for the client. O(1) regardless of hand size."""
+        rank_counts = self.player_hands[player_index].rank_counts
+        player_stats = self.stats[player_index]
+        return {
+            "aces_count": rank_counts[ACE_RANK],
+            "kings_count": rank_counts[KING_RANK],
+            "hands_won": player_stats['hands_won'],
+            "wars_won": player_stats['wars_won'],
+            "win_pct": player_stats['win_pct'],
+            # Cards held per rank, ranks 2 (index 0) through Ace (index 12)
+            "rank_counts": rank_counts[2:]
+        }
+
     # MODIFIED: add username argument
-    def add_player(self, sid, username):
+    def add_player(self, sid, username, user_id=None):
         """Adds a player SID to the game, returns player_index (0 or 1) or None if full."""
         if len(self.players) >= 2 and sid not in self.players:
             return None # Game is full
@@ -83,24 +187,56 @@ class WarGame:
             self.player_data[self.players[sid]['index']]['username'] = username
             return self.players[sid]['index'] 
 
-        player_index = 0
-        if len(self.players) == 1:
-            player_index = 1
+        # Take a free seat, preferring the one that already carries this name
+        # (a restored room keeps its names while its players reconnect)
+        free_seats = [i for i in (0, 1) if self.player_data[i]['sid'] is None]
+        player_index = next((i for i in free_seats if self.player_data[i]['username'] == username), free_seats[0])
             
         # Store comprehensive player data
-        self.players[sid] = {'index': player_index, 'username': username}
+        self.players[sid] = {'index': player_index, 'username': username, 'user_id': user_id}
         self.player_data[player_index]['sid'] = sid
         self.player_data[player_index]['username'] = username
+        sid_rooms[sid] = self.room_code
+        if user_id:
+            user_rooms[user_id] = self.room_code
+        _mark_dirty(self.room_code)
 
         log.info(f"Player {username} ({sid}) joined {self.room_code} as Player {player_index + 1}")
         return player_index
 
+    def watch_room(self, view):
+        """The socket.io room for one spectator view."""
+        return f"{self.room_code}:watch:{view}"
+
+    def audience(self):
+        """Every socket.io room that follows this game (players and both spectator views)."""
+        return [self.room_code] + [self.watch_room(view) for view in SPECTATOR_VIEWS]
+
+    def add_spectator(self, sid, view):
+        """Adds (or moves) a spectator. Spectators never take a seat."""
+        previous_view = self.spectators.get(sid)
+        if previous_view:
+            self.spectator_counts[previous_view] -= 1
+        self.spectators[sid] = view
+        self.spectator_counts[view] += 1
+        sid_rooms[sid] = self.room_code
+        log.info(f"Spectator {sid} watching {self.room_code} ({view} view, {len(self.spectators)} watching)")
+
+    def remove_spectator(self, sid):
+        view = self.spectators.pop(sid, None)
+        if view is None:
+            return False
+        self.spectator_counts[view] -= 1
+        _unindex_player(sid, None, self.room_code)
+        return True
+
     # MODIFIED: use the username in the log message and end_game
     def remove_player(self, sid):
         """Removes a player. If game in progress, ends it."""
         if sid in self.players:
             player_data = self.players.pop(sid)
             player_index = player_data['index']
+            _unindex_player(sid, player_data.get('user_id'), self.room_code)
             
             # Clear the SID but keep the name until cleanup
             self.player_data[player_index]['sid'] = None 
@@ -110,6 +246,7 @@ class WarGame:
             # MODIFIED: Use the username in the end_game message
             message = f"{player_data['username']} disconnected."
             if self.game_in_progress and not self.game_over:
+                self._record_event(game_records.EVENT_LEFT, player_index)
                 self.end_game(message)
             return True
         return False
@@ -124,18 +261,22 @@ class WarGame:
         self.game_in_progress = True
         self.game_over = False
         # *** ADDED: Reset stats on new game start ***
-        self.stats = { 0: {'hands_won': 0, 'wars_won': 0}, 1: {'hands_won': 0, 'wars_won': 0} }
+        self.stats = self._new_stats()
         self.total_hands_played = 0
+        # Every deal comes from a seed, so the whole game can be replayed from its log record
+        self.seed = random.getrandbits(64)
+        self._deal()
+        # A new game starts a new baseline: the first broadcast goes out as a full state
+        self.last_state = None
+        self.watch_last_state = None
         
-        deck = Deck()
-        deck.shuffle()
-        hands = deck.deal(2)
-        self.player_hands[0] = hands[0]
-        self.player_hands[1] = hands[1]
-        
-        # Spawn the game loop as a background task
-        global sio
-        self.game_loop_task = sio.start_background_task(self.game_loop)
+        # Hand the game loop to the shared scheduler
+        log.info(f"Game loop started for {self.room_code}")
+        self.phase = PHASE_TURN
+        self.step_count = 0
+        self.events = []
+        self._record_speed()
+        self.game_loop_task = scheduler.run_game(self)
 
     def end_game(self, message):
         """Stops the game and notifies clients."""
@@ -150,302 +291,715 @@ class WarGame:
         self.game_in_progress = False
         self.game_over = True
         self.broadcast_state(message, game_over=True)
-        # Clean up game object after a short delay
-        sio.start_background_task(self.cleanup_game)
+        self._log_result()
+        if self.game_loop_task:
+            self.game_loop_task.cancel()
+            self.game_loop_task = None
+        # Clean up game object after a short delay (a scheduled task, not a sleeping greenlet)
+        scheduler.call_later(CLEANUP_DELAY, self.cleanup_game)
 
     def cleanup_game(self):
-        """Waits and then removes the game from global dict."""
+        """Removes the game from global dict (scheduled CLEANUP_DELAY seconds after the game ends)."""
         global sio # ADD THIS LINE TO MAKE THE GLOBAL SIO OBJECT VISIBLE
 
-        sio.sleep(10) # Wait 10s for clients to see final message
-        if self.room_code in games:
+        if games.get(self.room_code) is self:
             log.info(f"Cleaning up game object {self.room_code}")
-            try:
-                log.info(f"Closing socket.io room {self.room_code}")
-                # This closes the room on the server, forcing disconnects for anyone lingering
-                close_room(self.room_code) 
-            except Exception as e:
-                log.error(f"Error closing room {self.room_code}: {e}")
-            # Delete from global dictionary
-            del games[self.room_code]
+            remove_game(self.room_code)
 
     def change_speed(self, change):
         """Adjusts the game speed, respecting limits."""
         new_delay = self.base_delay + change
         # Use max/min to clamp the value within bounds, then round it
-        self.base_delay = round(max(MIN_SPEED_DELAY, min(new_delay, MAX_SPEED_DELAY)), 1)
-        log.info(f"Game {self.room_code} speed changed to {self.base_delay}s")
+        new_delay = round(max(MIN_SPEED_DELAY, min(new_delay, MAX_SPEED_DELAY)), 1)
+        if new_delay != self.base_delay:
+            self.base_delay = new_delay
+            log.info(f"Game {self.room_code} speed changed to {self.base_delay}s")
+            if self.game_in_progress:
+                self._record_speed()
         # Notify players of new speed
         self.broadcast_state(f"Speed set to {self.base_delay}s")
 
+    def _deal(self):
+        """Deals both hands from self.seed (the same deal simulator.deal_seed() produces)."""
+        deck = Deck()
+        deck.shuffle(random.Random(self.seed))
+        hands = deck.deal(2)
+        self.player_hands[0] = hands[0]
+        self.player_hands[1] = hands[1]
+
+    def _record_speed(self):
+        """Records the current speed; changes within one step collapse into a single event."""
+        tenths = int(round(self.base_delay * 10))
+        if self.events and self.events[-1][:2] == (self.step_count, game_records.EVENT_SPEED):
+            self.events[-1] = (self.step_count, game_records.EVENT_SPEED, tenths)
+        else:
+            self._record_event(game_records.EVENT_SPEED, tenths)
+
+    def _record_event(self, kind, arg):
+        """Notes an input the seed can't reproduce, tagged with the step it happened before."""
+        self.events.append((self.step_count, kind, arg))
+
+    def _result(self):
+        if self.events and self.events[-1][1] == game_records.EVENT_LEFT:
+            return game_records.RESULT_ABANDONED
+        if len(self.player_hands[0]) == 0:
+            return game_records.RESULT_P1_WINS
+        if len(self.player_hands[1]) == 0:
+            return game_records.RESULT_P0_WINS
+        if self.total_hands_played > MAX_ROUNDS:
+            return game_records.RESULT_DRAW
+        return game_records.RESULT_ERROR
+
+    def _log_result(self):
+        """Appends the finished game to the game log (seed + events, ~30 bytes)."""
+        if game_log is None or self.seed is None:
+            return
+        result = self._result()
+        turns = self.total_hands_played
+        if result in (game_records.RESULT_P0_WINS, game_records.RESULT_P1_WINS, game_records.RESULT_DRAW):
+            turns -= 1 # The final turn counter tick found the game already decided
+        try:
+            record = game_records.encode_record({
+                'seed': self.seed,
+                'turns': turns,
+                'wars': self.stats[0]['wars_won'] + self.stats[1]['wars_won'],
+                'result': result,
+                'usernames': [self.player_data[0]['username'], self.player_data[1]['username']],
+                'events': self.events,
+            })
+            game_log.append(record)
+        except Exception as e:
+            log.error(f"Failed to log finished game {self.room_code}: {e}")
+
+    def _serialize_pile(self, name, pile):
+        """Returns the client list for a pile, reusing the previous list if the pile hasn't changed."""
+        key = tuple(pile)
+        cached = self._pile_cache.get(name)
+        if cached and cached[0] == key:
+            return cached[1]
+        serialized = [card.to_dict() for card in key]
+        self._pile_cache[name] = (key, serialized)
+        return serialized
+
+    @staticmethod
+    def _state_delta(old, new):
+        """Returns the fields of new that differ from old. Stats blocks are diffed one level deep."""
+        delta = {}
+        for key, value in new.items():
+            old_value = old.get(key)
+            if value == old_value:
+                continue
+            if isinstance(value, dict) and isinstance(old_value, dict):
+                delta[key] = {k: v for k, v in value.items() if old_value.get(k) != v}
+            else:
+                delta[key] = value
+        # The message is the narration of every step, so always send it
+        delta["message"] = new["message"]
+        return delta
+
     # MODIFIED: Added to_sid=None for single-player state sync
-    def broadcast_state(self, message, play_pile=None, war_pile=None, game_over=False, to_sid=None):
-        """Emits the current game state to all players in the room or a single player."""
+    def broadcast_state(self, message, play_pile=None, war_pile=None, game_over=False, to_sid=None, kind=FRAME_INFO):
+        """
+        Emits the current game state. Room broadcasts go out as a 'game_state_delta'
+        against the previous broadcast; to_sid gets a full 'game_state_update' snapshot.
+        kind (a FRAME_* constant) decides whether 'results' spectators see this frame.
+        """
         global sio # ADD THIS LINE TO MAKE THE GLOBAL SIO OBJECT VISIBLE
 
         if not sio:
             log.error("Socket.IO instance (sio) not registered in manager.")
             return
-            
-        play_pile = play_pile if play_pile is not None else []
-        war_pile = war_pile if war_pile is not None else []
 
-        # *** ADDED: Calculate all stats ***
-        p0_hand = self.player_hands[0]
-        p1_hand = self.player_hands[1]
-        
-        # Calculate win percentages
-        if self.total_hands_played > 0:
-            p0_win_pct = (self.stats[0]['hands_won'] / self.total_hands_played) * 100
-            p1_win_pct = (self.stats[1]['hands_won'] / self.total_hands_played) * 100
-        else:
-            p0_win_pct = 0
-            p1_win_pct = 0
-
-        player_0_stats = {
-            "aces_count": sum(1 for card in p0_hand if card.rank == 14),
-            "kings_count": sum(1 for card in p0_hand if card.rank == 13),
-            "hands_won": self.stats[0]['hands_won'],
-            "wars_won": self.stats[0]['wars_won'],
-            "win_pct": p0_win_pct
-        }
-        
-        player_1_stats = {
-            "aces_count": sum(1 for card in p1_hand if card.rank == 14),
-            "kings_count": sum(1 for card in p1_hand if card.rank == 13),
-            "hands_won": self.stats[1]['hands_won'],
-            "wars_won": self.stats[1]['wars_won'],
-            "win_pct": p1_win_pct
-        }
+        if to_sid:
+            # A single client (re)joining: give it the room's current baseline so
+            # the deltas that follow apply cleanly, with its own message on top.
+            self.send_full_state(to_sid, message)
+            return
+
+        state = self._build_state(message, play_pile, war_pile, game_over)
+        previous_state = self.last_state
+        self.state_seq += 1
+        self.last_state = state
+        _mark_dirty(self.room_code)
+        # 'full' spectators share the players' stream: one emit (one encode) for both rooms
+        to = [self.room_code, self.watch_room('full')] if self.spectator_counts['full'] else self.room_code
+        try:
+            # Inside a scheduler tick these are queued and sent with the rest of the tick's emits
+            if previous_state is None:
+                scheduler.emit('game_state_update', {**state, "seq": self.state_seq}, to=to)
+            else:
+                delta = {"seq": self.state_seq, "changes": self._state_delta(previous_state, state)}
+                scheduler.emit('game_state_delta', delta, to=to)
+        except Exception as e:
+             log.error(f"Error emitting game state for {self.room_code}: {e}")
+
+        if self.spectator_counts['results']:
+            self._broadcast_watch_frame(state, FRAME_GAME_OVER if state["game_over"] else kind)
 
-        state = {
-            "player_0_count": len(p0_hand),
-            "player_1_count": len(p1_hand),
-            "play_pile": [card.to_dict() for card in play_pile],
-            "war_pile": [card.to_dict() for card in war_pile],
+    def _build_state(self, message, play_pile=None, war_pile=None, game_over=False):
+        play_pile = play_pile if play_pile is not None else []
+        war_pile = war_pile if war_pile is not None else []
+        return {
+            "player_0_count": len(self.player_hands[0]),
+            "player_1_count": len(self.player_hands[1]),
+            "play_pile": self._serialize_pile("play_pile", play_pile),
+            "war_pile": self._serialize_pile("war_pile", war_pile),
             "message": message,
             "current_delay": self.base_delay,
             "game_over": game_over or self.game_over,
             # *** ADDED: Pass stats to client ***
-            "player_0_stats": player_0_stats,
-            "player_1_stats": player_1_stats,
+            "player_0_stats": self._player_stats(0),
+            "player_1_stats": self._player_stats(1),
             "total_hands_played": self.total_hands_played
         }
+
+    def _ensure_baseline(self):
+        """
+        Nothing broadcast yet: makes the current state the baseline (at the current seq)
+        without sending it to the room. Everyone who joins gets it through
+        send_full_state(), so the first room broadcast can already be a delta.
+        """
+        if self.last_state is None:
+            self.last_state = self._build_state("Waiting for the game to start...")
+
+    def _broadcast_watch_frame(self, state, kind):
+        """Sends the 'results' spectator view a frame, if it is a kind that view shows."""
+        if kind not in SPECTATOR_FRAME_KINDS:
+            return
+        now = time.monotonic()
+        if kind != FRAME_GAME_OVER and now - self._last_watch_frame < SPECTATOR_MIN_INTERVAL:
+            return
+        self._last_watch_frame = now
+        previous_state = self.watch_last_state
+        self.watch_seq += 1
+        self.watch_last_state = state
+        room = self.watch_room('results')
         try:
-            # Use to_sid if provided, otherwise broadcast to the whole room
-            sio.emit('game_state_update', state, to=to_sid if to_sid else self.room_code)
+            if previous_state is None:
+                scheduler.emit('game_state_update', {**state, "seq": self.watch_seq}, to=room)
+            else:
+                delta = {"seq": self.watch_seq, "changes": self._state_delta(previous_state, state)}
+                scheduler.emit('game_state_delta', delta, to=room)
         except Exception as e:
-             log.error(f"Error emitting game state for {self.room_code}: {e}")
-
-    def game_loop(self):
-        """Main server-side game loop."""
-        global sio # ADD THIS LINE TO MAKE THE GLOBAL SIO OBJECT VISIBLE
-        
-        log.info(f"Game loop started for {self.room_code}")
+            log.error(f"Error emitting spectator frame for {self.room_code}: {e}")
+
+    def send_full_state(self, sid, message=None):
+        """Sends one client a full snapshot of the current baseline (used on join and on sequence gaps)."""
+        self._ensure_baseline()
+        snapshot = {**self.last_state, "seq": self.state_seq}
+        if message:
+            snapshot["message"] = message
+        try:
+            sio.emit('game_state_update', snapshot, to=sid)
+        except Exception as e:
+            log.error(f"Error sending state sync for {self.room_code} to {sid}: {e}")
+
+    def send_watch_state(self, sid):
+        """Sends a 'results' spectator the baseline of that view (the last frame it was shown)."""
+        self._ensure_baseline()
+        if self.watch_last_state is None:
+            # No frame shown yet: the current state becomes the view's baseline
+            self.watch_last_state = self.last_state
+        try:
+            sio.emit('game_state_update', {**self.watch_last_state, "seq": self.watch_seq}, to=sid)
+        except Exception as e:
+            log.error(f"Error sending spectator state for {self.room_code} to {sid}: {e}")
+
+    # --- Snapshots ---
+    # Games are written to the snapshot store between steps (see _flush_snapshots),
+    # so the phase and in-flight piles always describe a consistent pause point.
+
+    def snapshot(self):
+        """Encodes the game's durable state (no sockets, no delta baseline) as compact bytes."""
+        return snapshots.encode({
+            'room_code': self.room_code,
+            'game_in_progress': self.game_in_progress,
+            'game_over': self.game_over,
+            'base_delay': self.base_delay,
+            'turn_delay': self.turn_delay,
+            'total_hands_played': self.total_hands_played,
+            'state_seq': self.state_seq,
+            'phase': self.phase,
+            'stats': self.stats,
+            'usernames': [self.player_data[0]['username'], self.player_data[1]['username']],
+            'hand_0': [card.index for card in self.player_hands[0]],
+            'hand_1': [card.index for card in self.player_hands[1]],
+            'play_pile': [card.index for card in self.play_pile],
+            'war_spoils': [card.index for card in self.war_spoils],
+            'war_round': [card.index for card in self.war_round],
+            'seed': self.seed,
+            'step_count': self.step_count,
+            'events': self.events,
+        })
+
+    @classmethod
+    def from_snapshot(cls, data):
+        """Rebuilds a game from snapshot() bytes. Seats are empty until the players reconnect."""
+        state = snapshots.decode(data)
+        game = cls(state['room_code'])
+        game.game_in_progress = state['game_in_progress']
+        game.game_over = state['game_over']
+        game.base_delay = state['base_delay']
+        game.turn_delay = state['turn_delay']
+        game.total_hands_played = state['total_hands_played']
+        # Keep counting from the old sequence; clients resync on the first broadcast anyway
+        game.state_seq = state['state_seq']
+        game.phase = state['phase']
+        game.seed = state['seed']
+        game.step_count = state['step_count']
+        game.events = state['events']
+        for i in (0, 1):
+            game.player_data[i]['username'] = state['usernames'][i]
+            game.stats[i].update(state['stats'][i])
+            game.player_hands[i] = Hand(map(CARDS.__getitem__, state[f'hand_{i}']))
+        game._refresh_win_pct()
+        game.play_pile = [CARDS[c] for c in state['play_pile']]
+        game.war_spoils = [CARDS[c] for c in state['war_spoils']]
+        game.war_round = [CARDS[c] for c in state['war_round']]
+        return game
+
+    # --- Turn State Machine ---
+    # The game no longer runs in its own greenlet. The shared TurnScheduler calls
+    # advance() whenever this room's next step is due; each call performs one step
+    # (one broadcast) and returns how long to wait before the next one. The phase
+    # and the in-flight piles live on the object, so a game can be paused between
+    # any two steps.
+
+    def advance(self):
+        """Runs the current step of the game. Returns the delay until the next step, or None when finished."""
+        if not self.game_in_progress or self.game_over:
+            self.phase = None
+            return None
+        try:
+            step = getattr(self, f"_step_{self.phase}")
+            self.step_count += 1
+            return step()
+        except Exception as e:
+            log.error(f"Error in game loop for {self.room_code}: {e}", exc_info=True)
+            self.end_game("An unexpected error occurred.")
+            self.phase = None
+            return None
+
+    def _finish_turn(self):
+        """Pause to show the result, then start the next turn."""
+        self.play_pile = []
+        self.war_spoils = []
+        self.war_round = []
+        self.phase = PHASE_TURN
+        return self.turn_delay
+
+    def _step_turn(self):
         # Note: self.total_hands_played is now the turn counter
-        while self.game_in_progress and not self.game_over:
-            try:
-                # Check for disconnect, which sets game_in_progress to False
-                if not self.game_in_progress:
-                    break
-
-                # *** MODIFIED: Use class variable for turn count ***
-                self.total_hands_played += 1
-                current_turn = self.total_hands_played
-                
-                if current_turn > 2000: # Safety break for endless games
-                    self.end_game("Game timed out (2000 rounds). It's a draw!")
-                    return
-
-                # --- 1. Check for Winner ---
-                p0_cards_total = len(self.player_hands[0])
-                p1_cards_total = len(self.player_hands[1])
-                
-                if p0_cards_total == 0:
-                    self.end_game(f"{self.player_data[1]['username']} wins the game!")
-                    return
-                if p1_cards_total == 0:
-                    self.end_game(f"{self.player_data[0]['username']} wins the game!")
-                    return
-
-                # --- 2. Determine Speed ---
-                is_dramatic = p0_cards_total <= DRAMATIC_DELAY_THRESHOLD or p1_cards_total <= DRAMATIC_DELAY_THRESHOLD
-                current_delay = DRAMATIC_SPEED_DELAY if is_dramatic else self.base_delay
-                msg = "Tension builds... low card warning!" if is_dramatic else f"Turn {current_turn}"
-                
-                self.broadcast_state(msg)
-                sio.sleep(current_delay) # Use sio.sleep for cooperative multitasking
-                if not self.game_in_progress: break # Check again after sleep
-
-                # --- 3. Play Hand ---
-                p0_card = self.player_hands[0].pop(0)
-                p1_card = self.player_hands[1].pop(0)
-                play_pile = [p0_card, p1_card]
-                
-                self.broadcast_state("Players draw...", play_pile=play_pile)
-                sio.sleep(current_delay)
-                if not self.game_in_progress: break
-
-                # --- 4. Compare Cards ---
-                if p0_card.rank > p1_card.rank:
-                    self.player_hands[0].extend(play_pile)
-                    self.stats[0]['hands_won'] += 1 # *** ADDED ***
-                    self.broadcast_state(f"{self.player_data[0]['username']} wins the hand!", play_pile=play_pile)
-                elif p1_card.rank > p0_card.rank:
-                    self.player_hands[1].extend(play_pile)
-                    self.stats[1]['hands_won'] += 1 # *** ADDED ***
-                    self.broadcast_state(f"{self.player_data[1]['username']} wins the hand!", play_pile=play_pile)
-                else:
-                    # --- 5. Handle War ---
-                    self.broadcast_state("It's WAR!", play_pile=play_pile)
-                    sio.sleep(current_delay)
-                    if not self.game_in_progress: break
-                    # *** MODIFIED: Pass stats dict to handle_war ***
-                    self.handle_war(play_pile) 
-                
-                sio.sleep(current_delay) # Pause to show result before next turn
-            
-            except Exception as e:
-                log.error(f"Error in game loop for {self.room_code}: {e}", exc_info=True)
-                self.end_game("An unexpected error occurred.")
-                return # Exit loop on error
-
-        log.info(f"Game loop finished for {self.room_code}. In progress: {self.game_in_progress}, Over: {self.game_over}")
-
-    def handle_war(self, current_spoils):
+        current_turn = self._next_turn()
+
+        if current_turn > MAX_ROUNDS: # Safety break for endless games
+            self.end_game(f"Game timed out ({MAX_ROUNDS} rounds). It's a draw!")
+            return None
+
+        # --- 1. Check for Winner ---
+        p0_cards_total = len(self.player_hands[0])
+        p1_cards_total = len(self.player_hands[1])
+
+        if p0_cards_total == 0:
+            self.end_game(f"{self.player_data[1]['username']} wins the game!")
+            return None
+        if p1_cards_total == 0:
+            self.end_game(f"{self.player_data[0]['username']} wins the game!")
+            return None
+
+        # --- 2. Determine Speed (fixed for the rest of this turn) ---
+        is_dramatic = p0_cards_total <= DRAMATIC_DELAY_THRESHOLD or p1_cards_total <= DRAMATIC_DELAY_THRESHOLD
+        self.turn_delay = DRAMATIC_SPEED_DELAY if is_dramatic else self.base_delay
+        msg = "Tension builds... low card warning!" if is_dramatic else f"Turn {current_turn}"
+
+        self.broadcast_state(msg, kind=FRAME_TURN)
+        self.phase = PHASE_DRAW
+        return self.turn_delay
+
+    def _step_draw(self):
+        # --- 3. Play Hand ---
+        p0_card = self.player_hands[0].draw()
+        p1_card = self.player_hands[1].draw()
+        self.play_pile = [p0_card, p1_card]
+
+        self.broadcast_state("Players draw...", play_pile=self.play_pile, kind=FRAME_DRAW)
+        self.phase = PHASE_COMPARE
+        return self.turn_delay
+
+    def _step_compare(self):
+        # --- 4. Compare Cards ---
+        p0_card, p1_card = self.play_pile
+        if p0_card.rank > p1_card.rank:
+            self.player_hands[0].extend(self.play_pile)
+            self._record_win(0)
+            self.broadcast_state(f"{self.player_data[0]['username']} wins the hand!", play_pile=self.play_pile, kind=FRAME_RESULT)
+        elif p1_card.rank > p0_card.rank:
+            self.player_hands[1].extend(self.play_pile)
+            self._record_win(1)
+            self.broadcast_state(f"{self.player_data[1]['username']} wins the hand!", play_pile=self.play_pile, kind=FRAME_RESULT)
+        else:
+            # --- 5. Handle War ---
+            self.broadcast_state("It's WAR!", play_pile=self.play_pile, kind=FRAME_WAR)
+            self.war_spoils = list(self.play_pile)
+            self.phase = PHASE_WAR
+            return self.turn_delay
+        return self._finish_turn()
+
+    def _step_war(self):
         """
-        Recursive function to handle a War.
-        current_spoils contains all cards from the tie (and any prior wars).
+        Starts a War (or a repeat War).
+        self.war_spoils contains all cards from the tie (and any prior wars).
         New rule: 3 spoil cards (face-up visually) + 1 battle card per player.
         """
-        war_pile_this_round = []
+        current_spoils = self.war_spoils
+        self.war_round = []
 
         p0_name = self.player_data[0]['username']
         p1_name = self.player_data[1]['username']
 
         # --- 1. Check if players have enough cards for war ---
         # Need 4 cards: 3 spoil cards + 1 battle card
-        if len(self.player_hands[0]) < 4:
+        if len(self.player_hands[0]) < WAR_CARDS_NEEDED:
             # Player 0 cannot continue → Player 1 wins by default
             self.player_hands[1].extend(current_spoils)
             self.player_hands[1].extend(self.player_hands[0])
-            self.player_hands[0] = []
-            self.stats[1]['hands_won'] += 1
-            self.stats[1]['wars_won'] += 1
+            self.player_hands[0].clear()
+            self._record_win(1, war=True)
             self.broadcast_state(
                 f"{p0_name} doesn't have enough cards for war! {p1_name} wins!",
                 play_pile=[],
-                war_pile=current_spoils
+                war_pile=current_spoils,
+                kind=FRAME_RESULT
             )
-            return
+            return self._finish_turn()
 
-        if len(self.player_hands[1]) < 4:
+        if len(self.player_hands[1]) < WAR_CARDS_NEEDED:
             # Player 1 cannot continue → Player 0 wins by default
             self.player_hands[0].extend(current_spoils)
             self.player_hands[0].extend(self.player_hands[1])
-            self.player_hands[1] = []
-            self.stats[0]['hands_won'] += 1
-            self.stats[0]['wars_won'] += 1
+            self.player_hands[1].clear()
+            self._record_win(0, war=True)
             self.broadcast_state(
                 f"{p1_name} doesn't have enough cards for war! {p0_name} wins!",
                 play_pile=[],
-                war_pile=current_spoils
-            )
-            return
-
-        global sio
-
-        # --- 2. Draw and reveal the 3 SPOIL cards (face-up visually) ---
-        # We draw one card from each player per spoil step and broadcast between each.
-        p0_war_cards = []
-        p1_war_cards = []
-
-        for i in range(3):
-            p0_card = self.player_hands[0].pop(0)
-            p1_card = self.player_hands[1].pop(0)
-
-            p0_war_cards.append(p0_card)
-            p1_war_cards.append(p1_card)
-
-            # Maintain P0,P1,P0,P1 order so even indices belong to P0, odd to P1
-            war_pile_this_round.extend([p0_card, p1_card])
-            all_cards_in_play = war_pile_this_round
-
-            # Message + slight pause for each spoil card pair
-            self.broadcast_state(
-                f"War: Spoil card {i + 1}...",
-                play_pile=current_spoils,
-                war_pile=all_cards_in_play
+                war_pile=current_spoils,
+                kind=FRAME_RESULT
             )
-            sio.sleep(self.base_delay * 2)
-            if not self.game_in_progress:
-                return
-
+            return self._finish_turn()
+
+        self.phase = PHASE_WAR_SPOIL
+        return self._step_war_spoil()
+
+    def _step_war_spoil(self):
+        # --- 2. Draw and reveal the 3 SPOIL cards (face-up visually), one pair per step ---
+        p0_card = self.player_hands[0].draw()
+        p1_card = self.player_hands[1].draw()
+
+        # Maintain P0,P1,P0,P1 order so even indices belong to P0, odd to P1
+        self.war_round.extend([p0_card, p1_card])
+        spoil_number = len(self.war_round) // 2
+
+        # Message + slight pause for each spoil card pair
+        self.broadcast_state(
+            f"War: Spoil card {spoil_number}...",
+            play_pile=self.war_spoils,
+            war_pile=self.war_round,
+            kind=FRAME_WAR_SPOIL
+        )
+        if spoil_number >= WAR_SPOIL_CARDS:
+            self.phase = PHASE_WAR_BATTLE
+        return self.base_delay * 2
+
+    def _step_war_battle(self):
         # --- 3. Draw and reveal the BATTLE card (4th card) ---
-        p0_battle_card = self.player_hands[0].pop(0)
-        p1_battle_card = self.player_hands[1].pop(0)
-
-        p0_war_cards.append(p0_battle_card)
-        p1_war_cards.append(p1_battle_card)
-
-        war_pile_this_round.extend([p0_battle_card, p1_battle_card])
-        all_cards_in_play = war_pile_this_round
+        self.war_round.extend([self.player_hands[0].draw(), self.player_hands[1].draw()])
 
         # Show the battle cards with a longer dramatic pause
-        self.broadcast_state("War: BATTLE cards!", play_pile=current_spoils, war_pile=all_cards_in_play)
-        sio.sleep(self.base_delay * 3)
-        if not self.game_in_progress:
-            return
+        self.broadcast_state("War: BATTLE cards!", play_pile=self.war_spoils, war_pile=self.war_round, kind=FRAME_WAR_BATTLE)
+        self.phase = PHASE_WAR_RESOLVE
+        return self.base_delay * 3
 
+    def _step_war_resolve(self):
         # --- 4. Compare battle cards and award spoils ---
+        current_spoils = self.war_spoils
+        war_pile_this_round = self.war_round
+        p0_battle_card, p1_battle_card = war_pile_this_round[-2:]
+        p0_name = self.player_data[0]['username']
+        p1_name = self.player_data[1]['username']
+
         if p0_battle_card.rank > p1_battle_card.rank:
             self.player_hands[0].extend(current_spoils)
             self.player_hands[0].extend(war_pile_this_round)
-            self.stats[0]['hands_won'] += 1
-            self.stats[0]['wars_won'] += 1
+            self._record_win(0, war=True)
             self.broadcast_state(
                 f"{p0_name} wins the WAR!",
                 play_pile=current_spoils,
-                war_pile=all_cards_in_play
+                war_pile=war_pile_this_round,
+                kind=FRAME_RESULT
             )
         elif p1_battle_card.rank > p0_battle_card.rank:
             self.player_hands[1].extend(current_spoils)
             self.player_hands[1].extend(war_pile_this_round)
-            self.stats[1]['hands_won'] += 1
-            self.stats[1]['wars_won'] += 1
+            self._record_win(1, war=True)
             self.broadcast_state(
                 f"{p1_name} wins the WAR!",
                 play_pile=current_spoils,
-                war_pile=all_cards_in_play
+                war_pile=war_pile_this_round,
+                kind=FRAME_RESULT
             )
         else:
             # --- 5. Another WAR! (battle cards tied again) ---
-            self.broadcast_state("ANOTHER WAR!", play_pile=[], war_pile=all_cards_in_play)
-            sio.sleep(self.base_delay)
-            if not self.game_in_progress:
-                return
-            # Recurse with EVERYTHING currently at stake
-            self.handle_war(all_cards_in_play)
+            self.broadcast_state("ANOTHER WAR!", play_pile=[], war_pile=war_pile_this_round, kind=FRAME_WAR)
+            # Go again with EVERYTHING currently at stake (earlier spoils + this round)
+            self.war_spoils = current_spoils + war_pile_this_round
+            self.phase = PHASE_WAR
+            return self.base_delay
+        return self._finish_turn()
+
+
+# --- Replays ---
+class ReplayGame(WarGame):
+    """
+    Re-plays a logged game for one viewer. The deck is re-dealt from the record's
+    seed and the logged events are applied before the step they preceded, so every
+    broadcast matches the original game. Its "room" is the viewer's sid; replays are
+    not kept in `games`, logged or snapshotted.
+    """
+
+    def __init__(self, record, viewer_sid, speed=1.0):
+        super().__init__(viewer_sid)
+        self.game_id = record['game_id']
+        self.record = record
+        self.speed = speed
+        self.seed = record['seed']
+        for i in (0, 1):
+            self.player_data[i]['username'] = record['usernames'][i]
+        self._pending_events = deque(record['events'])
+        if self._pending_events and self._pending_events[0][1] == game_records.EVENT_SPEED:
+            self.base_delay = self._pending_events.popleft()[2] / 10 # Speed at the start
+        self._silent = False
+        self._deal()
+        self.game_in_progress = True
+        self.phase = PHASE_TURN
+
+    def set_speed(self, speed):
+        self.speed = max(MIN_REPLAY_SPEED, min(float(speed), MAX_REPLAY_SPEED))
+
+    def start(self, turn=0):
+        """Starts streaming, first jumping straight to turn if given."""
+        if turn and turn > 1:
+            self.seek(turn)
+        self.game_loop_task = scheduler.run_game(self)
+
+    def seek(self, turn):
+        """Plays silently up to the start of turn (nothing is emitted while seeking)."""
+        self._silent = True
+        try:
+            while self.game_in_progress and not (self.phase == PHASE_TURN and self.total_hands_played >= turn - 1):
+                if self.advance() is None:
+                    break
+        finally:
+            self._silent = False
+        # The viewer has seen none of the skipped steps: start again from a full state
+        self.last_state = None
+
+    def advance(self):
+        # Apply speed changes and disconnects that happened before this step
+        events = self._pending_events
+        while events and events[0][0] == self.step_count:
+            _, kind, arg = events.popleft()
+            if kind == game_records.EVENT_SPEED:
+                self.base_delay = arg / 10
+                self.broadcast_state(f"Speed set to {self.base_delay}s")
+            elif kind == game_records.EVENT_LEFT:
+                self.end_game(f"{self.player_data[arg]['username']} disconnected.")
+                return None
+        delay = super().advance()
+        if delay is None or self._silent:
+            return delay
+        return delay / self.speed
+
+    def broadcast_state(self, message, play_pile=None, war_pile=None, game_over=False, to_sid=None, kind=FRAME_INFO):
+        if not self._silent:
+            super().broadcast_state(message, play_pile, war_pile, game_over, to_sid, kind)
+
+    def end_game(self, message):
+        if self._silent and self.game_in_progress:
+            # Seeking past the end: stop, and show the final state once streaming resumes
+            self._silent = False
+        super().end_game(message)
+
+    def cleanup_game(self):
+        if replays.get(self.room_code) is self:
+            del replays[self.room_code]
+
+    def _log_result(self):
+        pass # Already in the log
 
 
 # --- Public Manager Functions ---
 
 def register_socketio_instance(socketio_instance):
     """Allows app.py to pass its 'socketio' object to this manager."""
-    global sio
+    global sio, scheduler
     sio = socketio_instance
+    scheduler = TurnScheduler(sio)
     log.info("Socket.IO instance registered with manager.")
 
+def start_backend(room_backend=None):
+    """
+    Starts hosting rooms through room_backend (default: this process owns every
+    room). Web workers only: a RespBackend leases a room shard here.
+    """
+    global backend
+    backend = room_backend or InMemoryBackend()
+    backend.start(handle_routed_message, sio, on_lost=_close_lost_shard)
+    log.info(f"Hosting War rooms as shard {backend.shard_index}/{backend.shard_count}.")
+
+def configure_snapshots(store, interval=SNAPSHOT_INTERVAL):
+    """
+    Enables write-behind snapshots to store (see snapshots.py): restores this worker's
+    rooms from it, then flushes changed rooms every interval seconds.
+    """
+    global snapshot_store
+    snapshot_store = store
+    if store is None:
+        return
+    restore_games()
+    scheduler.call_later(interval, _flush_snapshots, interval)
+
+def configure_game_log(log_store):
+    """Enables the finished-game log (see game_log.py); log_store=None disables it."""
+    global game_log
+    game_log = log_store
+
+def get_game_record(game_id):
+    """Returns a logged game's record (seed, events, result, names), or None."""
+    if game_log is None:
+        return None
+    try:
+        data = game_log.get(game_id)
+        return game_records.decode_record(data) if data else None
+    except Exception as e:
+        log.error(f"Failed to read game record {game_id}: {e}")
+        return None
+
+def start_replay(sid, game_id, speed=1.0, turn=0):
+    """Streams a logged game to sid at speed x the original pace, starting at turn. Returns the replay or None."""
+    stop_replay(sid)
+    record = get_game_record(game_id)
+    if not record:
+        return None
+    replay = ReplayGame(record, sid)
+    replay.set_speed(speed)
+    replays[sid] = replay
+    log.info(f"Replaying game {game_id} to {sid} at {replay.speed}x from turn {turn or 1}")
+    replay.start(turn)
+    return replay
+
+def stop_replay(sid):
+    replay = replays.pop(sid, None)
+    if replay and replay.game_loop_task:
+        replay.game_loop_task.cancel()
+        replay.game_loop_task = None
+
+def collect_metrics(writer):
+    """Room, player and scheduler gauges for /metrics (see web_logic/metrics.py)."""
+    in_progress = players = spectators = 0
+    for game in games.values():
+        in_progress += game.game_in_progress
+        players += len(game.players)
+        spectators += len(game.spectators)
+    writer.gauge('wescoup_war_rooms', "War rooms hosted by this worker", len(games) - in_progress, state='waiting')
+    writer.gauge('wescoup_war_rooms', "War rooms hosted by this worker", in_progress, state='in_progress')
+    writer.gauge('wescoup_war_players', "Seated War players", players)
+    writer.gauge('wescoup_war_spectators', "War spectators", spectators)
+    writer.gauge('wescoup_war_replays', "War replays being streamed", len(replays))
+    writer.gauge('wescoup_war_remote_players', "Sockets here whose room lives on another worker", len(remote_sids))
+    if scheduler is not None:
+        scheduler.collect_metrics(writer)
+
+def _mark_dirty(room_code):
+    if snapshot_store is not None:
+        _dirty_rooms.add(room_code)
+
+def restore_games():
+    """Rehydrates the rooms this worker owns from the snapshot store and resumes their loops."""
+    started = time.monotonic()
+    try:
+        stored = snapshot_store.load_all()
+    except Exception as e:
+        log.error(f"Failed to load game snapshots: {e}", exc_info=True)
+        return 0
+
+    restored = 0
+    for room_code, data in stored.items():
+        if room_code in games or not backend.owns(room_code):
+            continue
+        try:
+            game = WarGame.from_snapshot(data)
+        except Exception as e:
+            log.error(f"Discarding unreadable snapshot for {room_code}: {e}")
+            _deleted_rooms.add(room_code)
+            continue
+        games[room_code] = game
+        restored += 1
+        if game.game_over:
+            scheduler.call_later(CLEANUP_DELAY, game.cleanup_game)
+        elif game.game_in_progress:
+            # Pick up at the saved phase after the pause it was waiting out
+            game.game_loop_task = scheduler.run_game(game, delay=game.turn_delay)
+
+    log.info(f"Restored {restored} game(s) from snapshots in {(time.monotonic() - started) * 1000:.0f} ms.")
+    return restored
+
+def _flush_snapshots(interval):
+    """
+    Encodes every room that changed since the last flush (on the scheduler greenlet,
+    between steps) and hands the batch to a background task for the store write.
+    """
+    scheduler.call_later(interval, _flush_snapshots, interval)
+    if not _dirty_rooms and not _deleted_rooms:
+        return
+    batch = {}
+    for room_code in _dirty_rooms:
+        game = games.get(room_code)
+        if game is None:
+            continue
+        try:
+            batch[room_code] = game.snapshot()
+        except Exception as e: # Skip this room (its last good snapshot stays), not the whole flush
+            log.error(f"Failed to snapshot room {room_code}: {e}")
+    deleted = set(_deleted_rooms)
+    _dirty_rooms.clear()
+    _deleted_rooms.clear()
+    sio.start_background_task(_write_snapshots, batch, deleted)
+
+def _write_snapshots(batch, deleted):
+    try:
+        snapshot_store.save_many(batch)
+        snapshot_store.delete_many(deleted)
+    except Exception as e:
+        log.error(f"Failed to write game snapshots: {e}", exc_info=True)
+        # Try again on the next flush (unless the room changed or went away meanwhile)
+        for room_code in batch:
+            if room_code in games:
+                _dirty_rooms.add(room_code)
+        _deleted_rooms.update(deleted)
+
 def create_new_game(game_type='war_classic'):
     """Creates a new game instance, stores it, and returns the room code."""
     if not sio:
         log.error("Socket.IO instance not registered before creating game.")
         return None
-    while True:
-        # Using 4 chars for simplicity
-        room_code = ''.join(random.choices('abcdefghjkmnpqrstuvwxyz23456789', k=4))
-        if room_code not in games:
-            break
+    if backend.shard_index is None:
+        log.error("This worker lost its room shard and has not claimed another yet.")
+        return None
+    # Only hand out codes in this worker's shard, so every worker can route to us by code
+    room_code = room_code_pool.allocate(is_taken=games.__contains__, accept=backend.accepts_index)
+    if not room_code:
+        log.error("No free room codes left.")
+        return None
     log.info(f"Creating new {game_type} game with code: {room_code}")
     games[room_code] = WarGame(room_code)
     return room_code
@@ -454,6 +1008,242 @@ def get_game(room_code):
     """Retrieves an active game instance."""
     return games.get(room_code)
 
+def get_room_for_sid(sid):
+    """Returns the room code a socket is seated in, or None. O(1)."""
+    return sid_rooms.get(sid)
+
+def get_room_for_user(user_id):
+    """Returns the room code a user is seated in, or None. O(1)."""
+    return user_rooms.get(user_id)
+
+def _unindex_player(sid, user_id, room_code):
+    """Drops a player's index entries (only if they still point at room_code)."""
+    if sid_rooms.get(sid) == room_code:
+        del sid_rooms[sid]
+    if user_id and user_rooms.get(user_id) == room_code:
+        del user_rooms[user_id]
+
+def remove_game(room_code, lost=False):
+    """
+    Deletes a game, closes its Socket.IO room and recycles its code. lost=True
+    is for rooms whose shard another worker now owns: their snapshot and code
+    are the new owner's, so both are left alone.
+    """
+    game = games.pop(room_code, None)
+    if not game:
+        return
+    for sid, player in list(game.players.items()):
+        _unindex_player(sid, player.get('user_id'), room_code)
+    for sid in list(game.spectators):
+        _unindex_player(sid, None, room_code)
+    if game.game_loop_task:
+        game.game_loop_task.cancel()
+    _dirty_rooms.discard(room_code)
+    if snapshot_store is not None and not lost:
+        _deleted_rooms.add(room_code)
+    try:
+        log.info(f"Closing socket.io room {room_code}")
+        # This closes the room on the server, forcing disconnects for anyone lingering.
+        # Use the server object: this also runs on the scheduler greenlet (no request context).
+        for room in game.audience():
+            sio.close_room(room)
+    except Exception as e:
+        log.error(f"Error closing room {room_code}: {e}")
+    if not lost:
+        room_code_pool.release(room_code)
+
+def _close_lost_shard(shard):
+    """Ends this worker's rooms in a shard whose lease another worker has taken over."""
+    for room_code, game in list(games.items()):
+        if backend.shard_for_code(room_code) != shard:
+            continue
+        game.end_game("This room moved to another server. Please start a new game.")
+        remove_game(room_code, lost=True)
+
+
+# --- Room Event Logic ---
+# These run on the worker that owns the room. They take the sid explicitly and emit
+# with sio.emit(to=sid), so they work both from a local Socket.IO handler and for
+# events forwarded from another worker (reply_shard is then that worker's shard).
+
+def _handle_join(sid, room_code, username, user_id=None, reply_shard=None):
+    def reject(message):
+        sio.emit('join_error', {'message': message}, to=sid)
+        if reply_shard is not None:
+            # The player's worker joined the socket.io room optimistically; undo it
+            backend.send_to_shard(reply_shard, {'op': 'leave_room', 'sid': sid, 'room_code': room_code})
+
+    game = get_game(room_code)
+    if not game:
+        log.warning(f"Player {sid} tried to join non-existent room: {room_code}")
+        reject('Game not found. It may have expired.')
+        return
+
+    if game.game_over:
+         log.warning(f"Player {sid} tried to join finished game: {room_code}")
+         reject('This game has already finished.')
+         return
+
+    # MODIFIED: Pass username (and the cookie identity, for the user index) to add_player
+    player_index = game.add_player(sid, username, user_id=user_id)
+
+    if player_index is None:
+        log.warning(f"Player {sid} tried to join full room: {room_code}")
+        reject(f'This game is already full. You can watch it at /war/watch/{room_code}')
+        return
+
+    if reply_shard is None:
+        sio.server.enter_room(sid, room_code, namespace='/')
+        log.info(f"Added {sid} to socket.io room {room_code}")
+
+    sio.emit('you_joined', {'player_index': player_index}, to=sid)
+
+    # MODIFIED: Broadcast names and handle game state sync
+    if len(game.players) == 2: # Check if room is full
+        names = {
+            'p0': game.player_data[0]['username'],
+            'p1': game.player_data[1]['username']
+        }
+
+        if game.game_in_progress:
+            # CRITICAL FIX: Game is running. Sync Player 2 to the ongoing game.
+            sio.emit('players_ready', {'message': f"Game in progress. {username} reconnected.", 'names': names}, to=game.audience())
+            game.broadcast_state(f"{username} joined running game.", to_sid=sid) # Send state only to the new player
+            log.info(f"Player {username} synced to running game {room_code}.")
+
+        elif not game.game_in_progress:
+            # Game is not running (pre-start). Broadcast to show start button.
+            sio.emit('players_ready', {'message': 'Both players are in the room. Press Start to begin!', 'names': names}, to=game.audience())
+            sio.emit('show_start_button', to=room_code)
+            log.info(f"Two players in {room_code}, ready to start. Names: {names}")
+
+    elif len(game.players) == 1:
+        if game.game_in_progress:
+            # Restored after a restart: the game kept going while its players reconnect
+            game.broadcast_state(f"{username} reconnected.", to_sid=sid)
+        else:
+            sio.emit('status_update', {'message': 'Waiting for Player 2 to join...'}, to=sid)
+    else:
+         if game.game_in_progress:
+            sio.emit('status_update', {'message': 'Player reconnected, waiting for opponent.'}, to=sid)
+
+def _handle_watch(sid, room_code, view='full', reply_shard=None):
+    if view not in SPECTATOR_VIEWS:
+        view = 'full'
+    game = get_game(room_code)
+    if not game:
+        log.warning(f"Spectator {sid} tried to watch non-existent room: {room_code}")
+        sio.emit('join_error', {'message': 'Game not found. It may have expired.'}, to=sid)
+        if reply_shard is not None:
+            backend.send_to_shard(reply_shard, {'op': 'leave_room', 'sid': sid,
+                                                'room_code': f"{room_code}:watch:{view}"})
+        return
+
+    game.add_spectator(sid, view)
+    if reply_shard is None:
+        sio.server.enter_room(sid, game.watch_room(view), namespace='/')
+
+    sio.emit('you_joined', {'player_index': None, 'spectator': True, 'view': view}, to=sid)
+    names = {'p0': game.player_data[0]['username'], 'p1': game.player_data[1]['username']}
+    sio.emit('players_ready', {'message': f"Watching ({len(game.spectators)} watching).", 'names': names}, to=sid)
+    if view == 'results':
+        game.send_watch_state(sid)
+    else:
+        game.send_full_state(sid)
+
+def _handle_leave(sid, room_code):
+    game = games.get(room_code)
+    if not game:
+        log.warning(f"Disconnected SID {sid} was not found in any active game.")
+        return
+
+    if game.remove_spectator(sid):
+        log.info(f"Spectator {sid} stopped watching {room_code}")
+        return
+
+    player_left = game.remove_player(sid)
+    if player_left and not game.players and not game.game_in_progress:
+        log.info(f"Room {room_code} is empty after disconnect, cleaning up immediately.")
+        remove_game(room_code)
+
+def _handle_state_sync(sid, room_code, seq=None):
+    game = get_game(room_code)
+    if game and game.spectators.get(sid) == 'results':
+        game.send_watch_state(sid)
+        return
+    if not game or (sid not in game.players and sid not in game.spectators):
+        log.warning(f"Player {sid} requested state sync for game {room_code} they aren't in.")
+        return
+
+    log.info(f"Sending full state to {sid} for room {room_code} (client had seq {seq})")
+    game.send_full_state(sid)
+
+def _handle_change_speed(sid, room_code, change):
+    game = get_game(room_code)
+    if game:
+        if sid in game.players:
+            game.change_speed(change)
+        else:
+            log.warning(f"Player {sid} tried to change speed for game {room_code} they aren't in.")
+    else:
+        log.warning(f"Player {sid} tried to change speed for non-existent game: {room_code}")
+
+def _handle_start(sid, room_code):
+    game = get_game(room_code)
+    if not game:
+        log.warning(f"Start_game error: Game {room_code} not found for {sid}.")
+        return
+
+    if sid not in game.players:
+        log.warning(f"Start_game error: Player {sid} not in game {room_code}.")
+        return
+
+    if not game.game_in_progress:
+        log.info(f"Game {room_code} started by {sid}.")
+        game.start_game()
+    else:
+        log.warning(f"Player {sid} sent start_game but game {room_code} already in progress.")
+
+
+# --- Cross-Worker Routing ---
+
+ROUTED_OPS = {
+    'join_game': _handle_join,
+    'watch_game': _handle_watch,
+    'leave_game': _handle_leave,
+    'request_state_sync': _handle_state_sync,
+    'change_speed': _handle_change_speed,
+    'start_game': _handle_start,
+}
+
+def _route_to_owner(room_code, op, sid, **kwargs):
+    """Forwards a room event to the worker that owns room_code."""
+    shard = backend.shard_for_code(room_code)
+    log.info(f"Routing {op} from {sid} for room {room_code} to shard {shard}")
+    backend.send_to_shard(shard, {'op': op, 'sid': sid, 'room_code': room_code,
+                                  'reply_shard': backend.shard_index, 'kwargs': kwargs})
+
+def handle_routed_message(message):
+    """Runs a room event forwarded by another worker (called by the backend listener)."""
+    op = message.get('op')
+    sid = message.get('sid')
+    room_code = message.get('room_code')
+
+    if op == 'leave_room':
+        # The owner rejected a join we had optimistically entered into the room
+        remote_sids.pop(sid, None)
+        sio.server.leave_room(sid, room_code, namespace='/')
+        return
+
+    handler = ROUTED_OPS.get(op)
+    if not handler:
+        log.warning(f"Ignoring unknown routed op: {op}")
+        return
+    kwargs = message.get('kwargs') or {}
+    if op in ('join_game', 'watch_game'):
+        kwargs['reply_shard'] = message.get('reply_shard')
+    handler(sid, room_code, **kwargs)
+
 
 # --- Socket Event Handlers (Moved to end) ---
 
@@ -475,25 +1265,13 @@ def register_handlers(socketio):
     def on_disconnect():
         sid = request.sid 
         log.info(f"Client disconnected: {sid}")
-        
-        game_found = False
-        for room_code, game in list(games.items()):
-            if sid in game.players:
-                game_found = True
-                player_left = game.remove_player(sid) 
-                
-                if player_left and not game.players and not game.game_in_progress:
-                    log.info(f"Room {room_code} is empty after disconnect, cleaning up immediately.")
-                    if room_code in games: 
-                         del games[room_code]
-                         try:
-                             close_room(room_code)
-                         except Exception as e:
-                             log.error(f"Error closing room {room_code} on disconnect cleanup: {e}")
-                break 
-        
-        if not game_found:
-             log.warning(f"Disconnected SID {sid} was not found in any active game.")
+
+        stop_replay(sid)
+        remote_room = remote_sids.pop(sid, None)
+        if remote_room:
+            _route_to_owner(remote_room, 'leave_game', sid)
+            return
+        _handle_leave(sid, sid_rooms.get(sid))
 
 
     @socketio.on('create_game')
@@ -519,56 +1297,57 @@ def register_handlers(socketio):
 
         room_code = data.get('room_code').lower()
         username = data.get('username') # <-- Retrieve username
+        user_id = user_id_from_cookies(request.cookies) # Identity cookie from the Socket.IO handshake
+        materialize_user(request.cookies) # Players get a User row (written in the next batch)
         log.info(f"Received join_game request from {sid} for room {room_code}, user: {username}")
 
-        game = get_game(room_code)
-        if not game:
-            log.warning(f"Player {sid} tried to join non-existent room: {room_code}")
-            emit('join_error', {'message': 'Game not found. It may have expired.'}, to=sid)
+        if not backend.owns(room_code):
+            # Another worker hosts this room. Join the socket.io room here (where the
+            # socket lives) so its broadcasts reach us, and let the owner seat the player.
+            join_room(room_code)
+            remote_sids[sid] = room_code
+            _route_to_owner(room_code, 'join_game', sid, username=username, user_id=user_id)
             return
 
-        if game.game_over:
-             log.warning(f"Player {sid} tried to join finished game: {room_code}")
-             emit('join_error', {'message': 'This game has already finished.'}, to=sid)
-             return
-        
-        # MODIFIED: Pass username to add_player
-        player_index = game.add_player(sid, username) 
-        
-        if player_index is None:
-            log.warning(f"Player {sid} tried to join full room: {room_code}")
-            emit('join_error', {'message': 'This game is already full.'}, to=sid)
+        _handle_join(sid, room_code, username, user_id=user_id)
+
+    @socketio.on('watch_game')
+    def on_watch_game(data):
+        """Joins a room as a spectator: {room_code, view: 'full' | 'results'}."""
+        sid = request.sid
+        if not data or 'room_code' not in data:
+            log.warning(f"Watch request from {sid} missing room_code.")
             return
 
-        join_room(room_code)
-        log.info(f"Added {sid} to socket.io room {room_code}")
+        room_code = data.get('room_code').lower()
+        view = data.get('view') if data.get('view') in SPECTATOR_VIEWS else 'full'
+        log.info(f"Received watch_game request from {sid} for room {room_code} ({view} view)")
 
-        emit('you_joined', {'player_index': player_index}, to=sid)
+        if not backend.owns(room_code):
+            join_room(f"{room_code}:watch:{view}")
+            remote_sids[sid] = room_code
+            _route_to_owner(room_code, 'watch_game', sid, view=view)
+            return
 
-        # MODIFIED: Broadcast names and handle game state sync
-        if len(game.players) == 2: # Check if room is full
-            names = {
-                'p0': game.player_data[0]['username'],
-                'p1': game.player_data[1]['username']
-            }
-            
-            if game.game_in_progress:
-                # CRITICAL FIX: Game is running. Sync Player 2 to the ongoing game.
-                sio.emit('players_ready', {'message': f"Game in progress. {username} reconnected.", 'names': names}, to=room_code)
-                game.broadcast_state(f"{username} joined running game.", to_sid=sid) # Send state only to the new player
-                log.info(f"Player {username} synced to running game {room_code}.")
-                
-            elif not game.game_in_progress:
-                # Game is not running (pre-start). Broadcast to show start button.
-                sio.emit('players_ready', {'message': 'Both players are in the room. Press Start to begin!', 'names': names}, to=room_code)
-                sio.emit('show_start_button', to=room_code)
-                log.info(f"Two players in {room_code}, ready to start. Names: {names}")
-
-        elif len(game.players) == 1:
-            emit('status_update', {'message': 'Waiting for Player 2 to join...'}, to=sid)
-        else:
-             if game.game_in_progress:
-                emit('status_update', {'message': 'Player reconnected, waiting for opponent.'}, to=sid) 
+        _handle_watch(sid, room_code, view)
+
+    @socketio.on('request_state_sync')
+    def on_request_state_sync(data):
+        """A client saw a gap in game_state_delta sequence numbers and needs a full snapshot."""
+        sid = request.sid
+        if not data or 'room_code' not in data:
+            log.warning(f"State sync request from {sid} missing room_code.")
+            return
+
+        room_code = data.get('room_code').lower()
+        replay = replays.get(sid)
+        if replay and replay.game_id == room_code:
+            replay.send_full_state(sid)
+            return
+        if not backend.owns(room_code):
+            _route_to_owner(room_code, 'request_state_sync', sid, seq=data.get('seq'))
+            return
+        _handle_state_sync(sid, room_code, seq=data.get('seq'))
 
     @socketio.on('change_speed')
     def on_change_speed(data):
@@ -581,14 +1360,10 @@ def register_handlers(socketio):
         change = data.get('change', 0.0)
         log.info(f"Received change_speed request from {sid} for room {room_code}, change: {change}")
 
-        game = get_game(room_code)
-        if game:
-            if sid in game.players: 
-                game.change_speed(change)
-            else:
-                log.warning(f"Player {sid} tried to change speed for game {room_code} they aren't in.")
-        else:
-            log.warning(f"Player {sid} tried to change speed for non-existent game: {room_code}")
+        if not backend.owns(room_code):
+            _route_to_owner(room_code, 'change_speed', sid, change=change)
+            return
+        _handle_change_speed(sid, room_code, change)
 
     # (From previous step: Start game handler)
     @socketio.on('start_game')
@@ -600,20 +1375,42 @@ def register_handlers(socketio):
         
         room_code = data.get('room_code').lower()
         log.info(f"Received start_game request from {sid} for room {room_code}")
-        
-        game = get_game(room_code)
-        if not game:
-            log.warning(f"Start_game error: Game {room_code} not found for {sid}.")
-            return
-        
-        if sid not in game.players:
-            log.warning(f"Start_game error: Player {sid} not in game {room_code}.")
+
+        if not backend.owns(room_code):
+            _route_to_owner(room_code, 'start_game', sid)
             return
+        _handle_start(sid, room_code)
 
-        if not game.game_in_progress:
-            log.info(f"Game {room_code} started by {sid}.")
-            game.start_game()
-        else:
-            log.warning(f"Player {sid} sent start_game but game {room_code} already in progress.")
+    @socketio.on('replay_game')
+    def on_replay_game(data):
+        """Streams a logged game to this client: {game_id, speed (x original pace), turn (jump to)}."""
+        sid = request.sid
+        if not data or 'game_id' not in data:
+            log.warning(f"Replay request from {sid} missing game_id.")
+            return
+        try:
+            speed = float(data.get('speed') or 1.0)
+            turn = int(data.get('turn') or 0)
+        except (TypeError, ValueError):
+            speed, turn = 1.0, 0
+
+        replay = start_replay(sid, str(data['game_id']).lower(), speed=speed, turn=turn)
+        if not replay:
+            emit('join_error', {'message': 'Replay not found.'})
+            return
+        record = replay.record
+        emit('players_ready', {'message': f"Replay at {replay.speed}x", 'names': {'p0': record['usernames'][0], 'p1': record['usernames'][1]}})
+        emit('replay_started', {'game_id': replay.game_id, 'turns': record['turns'], 'wars': record['wars'],
+                                'result': record['result'], 'speed': replay.speed})
+
+    @socketio.on('replay_speed')
+    def on_replay_speed(data):
+        replay = replays.get(request.sid)
+        if replay and data and 'speed' in data:
+            try:
+                replay.set_speed(data['speed'])
+            except (TypeError, ValueError):
+                return
+            emit('replay_started', {'game_id': replay.game_id, 'speed': replay.speed})
 
     log.info("Socket.IO event handlers registered successfully.")
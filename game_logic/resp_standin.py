@@ -0,0 +1,238 @@
+"""
+A tiny stand-in for Redis, for running several web workers locally.
+
+Implements only the commands the room backends use (PING, AUTH, SELECT, GET,
+SET with NX/XX/EX/PX, DEL, EXPIRE, EXISTS, PUBLISH, SUBSCRIBE, and EVAL of the
+backends' own scripts, which are emulated in Python - there is no Lua here).
+Everything is held in memory, so it is for development only - use real Redis
+in production.
+
+    python -m game_logic.resp_standin --port 6379
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379 WAR_WORKERS=4 gunicorn ...
+"""
+import argparse
+import logging
+import socketserver
+import threading
+import time
+
+from game_logic.backend import RENEW_LEASE_SCRIPT
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+
+class StandinState:
+    """Shared keyspace and subscriber lists (guarded by one lock)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {} # key -> bytes
+        self.expires = {} # key -> monotonic deadline
+        self.channels = {} # channel -> set of handlers
+
+    def _live(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+
+def _renew_lease(state, keys, argv):
+    """RENEW_LEASE_SCRIPT: extend (or retake a lapsed) lease unless another worker holds it."""
+    key, worker_id, ttl = keys[0], argv[0], float(argv[1])
+    owner = state.values.get(key) if state._live(key) else None
+    if owner not in (None, worker_id):
+        return 0
+    state.values[key] = worker_id
+    state.expires[key] = time.monotonic() + ttl
+    return 1
+
+
+SCRIPTS = {RENEW_LEASE_SCRIPT: _renew_lease} # EVAL script text -> Python equivalent (run under the lock)
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    state = None # Set by serve()
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.subscriptions = set()
+
+    # --- Wire format ---
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.strip().split() # Inline command (e.g. from telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def send(self, payload):
+        with self.write_lock:
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+    @staticmethod
+    def encode(value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, str):
+            return b'+%s\r\n' % value.encode('utf-8')
+        if isinstance(value, (list, tuple)):
+            return b'*%d\r\n' % len(value) + b''.join(RespHandler.encode(v) for v in value)
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    # --- Commands ---
+    def handle(self):
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                break
+            if args is None:
+                break
+            if not args:
+                continue
+            name = args[0].decode('utf-8').upper()
+            method = getattr(self, f"cmd_{name.lower()}", None)
+            try:
+                if method is None:
+                    self.send(b'-ERR unknown command ' + args[0] + b'\r\n')
+                else:
+                    method(args[1:])
+            except (ConnectionError, BrokenPipeError):
+                break
+            except Exception as e:
+                self.send(f"-ERR {e}\r\n".encode('utf-8'))
+        self.unsubscribe_all()
+
+    def cmd_ping(self, args):
+        self.send(self.encode('PONG'))
+
+    def cmd_auth(self, args):
+        self.send(self.encode('OK'))
+
+    def cmd_select(self, args):
+        self.send(self.encode('OK'))
+
+    def cmd_get(self, args):
+        state = self.state
+        with state.lock:
+            value = state.values.get(args[0]) if state._live(args[0]) else None
+        self.send(self.encode(value))
+
+    def cmd_exists(self, args):
+        state = self.state
+        with state.lock:
+            count = sum(1 for key in args if state._live(key))
+        self.send(self.encode(count))
+
+    def cmd_set(self, args):
+        key, value = args[0], args[1]
+        options = [a.decode('utf-8').upper() for a in args[2:]]
+        ttl = None
+        if 'EX' in options:
+            ttl = float(options[options.index('EX') + 1])
+        if 'PX' in options:
+            ttl = float(options[options.index('PX') + 1]) / 1000
+        state = self.state
+        with state.lock:
+            exists = state._live(key)
+            if ('NX' in options and exists) or ('XX' in options and not exists):
+                self.send(self.encode(None))
+                return
+            state.values[key] = value
+            if ttl is None:
+                state.expires.pop(key, None)
+            else:
+                state.expires[key] = time.monotonic() + ttl
+        self.send(self.encode('OK'))
+
+    def cmd_del(self, args):
+        state = self.state
+        removed = 0
+        with state.lock:
+            for key in args:
+                if state._live(key):
+                    removed += 1
+                state.values.pop(key, None)
+                state.expires.pop(key, None)
+        self.send(self.encode(removed))
+
+    def cmd_expire(self, args):
+        state = self.state
+        with state.lock:
+            if not state._live(args[0]):
+                self.send(self.encode(0))
+                return
+            state.expires[args[0]] = time.monotonic() + float(args[1])
+        self.send(self.encode(1))
+
+    def cmd_eval(self, args):
+        script = SCRIPTS.get(args[0].decode('utf-8'))
+        if script is None:
+            raise ValueError("only the room backends' scripts can be run here")
+        numkeys = int(args[1])
+        with self.state.lock:
+            result = script(self.state, args[2:2 + numkeys], args[2 + numkeys:])
+        self.send(self.encode(result))
+
+    def cmd_publish(self, args):
+        channel, message = args
+        with self.state.lock:
+            receivers = list(self.state.channels.get(channel, ()))
+        payload = self.encode([b'message', channel, message])
+        delivered = 0
+        for receiver in receivers:
+            try:
+                receiver.send(payload)
+                delivered += 1
+            except OSError:
+                pass
+        self.send(self.encode(delivered))
+
+    def cmd_subscribe(self, args):
+        for channel in args:
+            with self.state.lock:
+                self.state.channels.setdefault(channel, set()).add(self)
+            self.subscriptions.add(channel)
+            self.send(self.encode([b'subscribe', channel, len(self.subscriptions)]))
+
+    def unsubscribe_all(self):
+        with self.state.lock:
+            for channel in self.subscriptions:
+                self.state.channels.get(channel, set()).discard(self)
+        self.subscriptions.clear()
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(host='127.0.0.1', port=6379):
+    """Runs the stand-in until interrupted."""
+    RespHandler.state = StandinState()
+    with ThreadingServer((host, port), RespHandler) as server:
+        log.info(f"Redis-protocol stand-in listening on {host}:{port}")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol stand-in for local multi-worker runs.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    serve(args.host, args.port)
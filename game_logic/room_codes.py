@@ -0,0 +1,104 @@
+import hashlib
+import os
+from collections import deque
+
+# --- Constants ---
+ROOM_CODE_ALPHABET = 'abcdefghjkmnpqrstuvwxyz23456789' # No 0/o, 1/l/i look-alikes
+ROOM_CODE_LENGTH = 4
+FEISTEL_ROUNDS = 4
+
+
+def code_to_index(code, alphabet=ROOM_CODE_ALPHABET):
+    """Converts a room code to its number in [0, len(alphabet) ** len(code))."""
+    index = 0
+    base = len(alphabet)
+    for char in code:
+        index = index * base + alphabet.index(char)
+    return index
+
+
+class RoomCodePool:
+    """
+    Hands out room codes in a shuffled order without ever retrying.
+
+    The full code space (31^4 = 923,521 codes) is walked in a secret random
+    permutation, so the "shuffled pool" costs O(1) memory instead of a
+    million-entry list. The permutation is a keyed Feistel network over the
+    smallest even-width bit range covering the space, cycle-walked back into
+    [0, size); the key comes from os.urandom, so seeing some codes says
+    nothing about the others. Released codes are recycled, oldest first,
+    once the fresh codes run out.
+    """
+
+    def __init__(self, alphabet=ROOM_CODE_ALPHABET, length=ROOM_CODE_LENGTH, key=None):
+        self.alphabet = alphabet
+        self.length = length
+        self.size = len(alphabet) ** length
+
+        self._key = key or os.urandom(16)
+        self._half_bits = ((self.size - 1).bit_length() + 1) // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._position = 0 # Fresh codes handed out so far
+        self._recycled = deque()
+
+    def _round(self, round_number, value):
+        digest = hashlib.blake2b(value.to_bytes(8, 'little'), digest_size=8, key=self._key,
+                                 salt=round_number.to_bytes(16, 'little')).digest()
+        return int.from_bytes(digest, 'little') & self._half_mask
+
+    def _feistel(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for round_number in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self._half_bits) | right
+
+    def permute(self, position):
+        """The index at position in the shuffled order: a bijection on [0, size)."""
+        index = self._feistel(position)
+        while index >= self.size: # Cycle-walk out of the padding above size
+            index = self._feistel(index)
+        return index
+
+    def __len__(self):
+        """Codes still available (fresh + recycled)."""
+        return self.size - self._position + len(self._recycled)
+
+    def code_to_index(self, code):
+        """Converts a code back to its number in [0, size)."""
+        return code_to_index(code, self.alphabet)
+
+    def index_to_code(self, index):
+        """Converts a number in [0, size) to its code."""
+        base = len(self.alphabet)
+        chars = []
+        for _ in range(self.length):
+            index, digit = divmod(index, base)
+            chars.append(self.alphabet[digit])
+        return ''.join(reversed(chars))
+
+    def allocate(self, is_taken=None, accept=None):
+        """
+        Returns the next free code, or None if the pool is exhausted.
+        is_taken(code) skips codes that are already in use; accept(index)
+        limits the pool to part of the code space (e.g. this worker's shard).
+        """
+        while self._position < self.size:
+            index = self.permute(self._position)
+            self._position += 1
+            if accept and not accept(index):
+                continue
+            code = self.index_to_code(index)
+            if is_taken and is_taken(code):
+                continue
+            return code
+
+        for _ in range(len(self._recycled)):
+            code = self._recycled.popleft()
+            if is_taken and is_taken(code):
+                continue
+            return code
+        return None
+
+    def release(self, code):
+        """Returns a code to the pool once its room is gone."""
+        self._recycled.append(code)
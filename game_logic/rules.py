@@ -0,0 +1,14 @@
+# Shared War rules.
+# Both the live game (manager.py) and the headless simulator (simulator.py)
+# import from here so the two can never drift apart.
+
+# --- Card Constants ---
+SUITS = ["♠", "♥", "♦", "♣"]
+VALUES = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+VALUE_MAP = {val: i + 2 for i, val in enumerate(VALUES)}
+
+# --- Game Rules ---
+NUM_PLAYERS = 2
+MAX_ROUNDS = 2000 # Safety cap: turn 2001 is declared a draw
+WAR_SPOIL_CARDS = 3 # Face-up spoil cards each player lays down in a war
+WAR_CARDS_NEEDED = WAR_SPOIL_CARDS + 1 # Spoils + 1 battle card, or the player forfeits
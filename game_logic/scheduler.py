@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from web_logic.metrics import Histogram
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+YIELD_EVERY = 200 # Give other greenlets a turn after this many callbacks/emits in one tick
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0) # Seconds
+
+
+class ScheduledTask:
+    """Handle returned by TurnScheduler.call_later(); call cancel() to drop the task."""
+    __slots__ = ('due', 'callback', 'args', 'cancelled')
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TurnScheduler:
+    """
+    One background greenlet that drives every War room.
+
+    Instead of each game parking its own greenlet in sio.sleep(), rooms register
+    timed callbacks here (a heap ordered by due time). Every tick the scheduler
+    runs everything that is due, then flushes the emits those callbacks queued,
+    so all rooms that fall due together are served in one batch. Between ticks
+    it sleeps until the earliest due time (indefinitely while the heap is
+    empty); call_later() wakes it when a new task comes due sooner.
+    """
+
+    def __init__(self, sio):
+        self.sio = sio
+        self._heap = []
+        self._wake = threading.Event() # A green Event under eventlet.monkey_patch()
+        self._counter = itertools.count() # Tie-breaker so equal due times never compare tasks
+        self._outbox = []
+        self._in_tick = False
+        self._task = None
+
+        # Lag = how late a task ran compared to its due time (actual vs requested delay)
+        self.last_tick_lag = 0.0
+        self.max_lag = 0.0
+        self.tasks_run = 0
+        self.lag = Histogram(LAG_BUCKETS)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def start(self):
+        """Starts the scheduler greenlet (idempotent)."""
+        if self._task is None:
+            log.info("Starting turn scheduler.")
+            self._task = self.sio.start_background_task(self._run)
+
+    def call_later(self, delay, callback, *args):
+        """Runs callback(*args) on the scheduler greenlet after delay seconds."""
+        task = ScheduledTask(time.monotonic() + delay, callback, args)
+        heapq.heappush(self._heap, (task.due, next(self._counter), task))
+        if self._heap[0][2] is task:
+            self._wake.set() # Due before whatever the scheduler is waiting for
+        self.start()
+        return task
+
+    def run_game(self, game, delay=0):
+        """Steps game.advance() every time it comes due, until it returns None."""
+        return self.call_later(delay, self._step_game, game)
+
+    def _step_game(self, game):
+        delay = game.advance()
+        if delay is not None:
+            game.game_loop_task = self.call_later(delay, self._step_game, game)
+        else:
+            game.game_loop_task = None
+
+    def emit(self, event, data=None, to=None):
+        """Queues an emit for the end of the current tick, or sends it now outside a tick."""
+        if self._in_tick:
+            self._outbox.append((event, data, to))
+        else:
+            self.sio.emit(event, data, to=to)
+
+    def _flush(self):
+        outbox = self._outbox
+        self._outbox = []
+        for i, (event, data, to) in enumerate(outbox, 1):
+            try:
+                self.sio.emit(event, data, to=to)
+            except Exception as e:
+                log.error(f"Error emitting {event} to {to}: {e}")
+            if i % YIELD_EVERY == 0:
+                self.sio.sleep(0)
+
+    def tick(self):
+        """Runs every task that is due, then flushes their emits. Returns the number of tasks run."""
+        heap = self._heap
+        now = time.monotonic()
+        ran = 0
+        lag = 0.0
+        self._in_tick = True
+        try:
+            while heap and heap[0][0] <= now:
+                due, _, task = heapq.heappop(heap)
+                if task.cancelled:
+                    continue
+                self.lag.observe(now - due)
+                lag = max(lag, now - due)
+                try:
+                    task.callback(*task.args)
+                except Exception as e:
+                    log.error(f"Scheduled task {task.callback!r} failed: {e}", exc_info=True)
+                ran += 1
+                if ran % YIELD_EVERY == 0:
+                    # Long batch: let socket greenlets breathe, and pick up anything now due
+                    self._flush()
+                    self.sio.sleep(0)
+                    now = time.monotonic()
+        finally:
+            self._in_tick = False
+        self._flush()
+
+        self.tasks_run += ran
+        self.last_tick_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        return ran
+
+    def collect_metrics(self, writer):
+        writer.histogram('wescoup_scheduler_lag_seconds', "How late War steps ran compared to their requested delay",
+                         self.lag)
+        writer.gauge('wescoup_scheduler_max_lag_seconds', "Largest step lag since start", self.max_lag)
+        writer.gauge('wescoup_scheduler_queued_tasks', "Steps waiting in the scheduler heap", len(self._heap))
+        writer.counter('wescoup_scheduler_tasks_total', "Steps run by the scheduler", self.tasks_run)
+
+    def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                log.error(f"Turn scheduler tick failed: {e}", exc_info=True)
+            # Tasks added from here on set _wake; ones added during the tick are already in the heap
+            self._wake.clear()
+            if not self._heap:
+                self._wake.wait()
+                continue
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wake.wait(delay)
+            else:
+                self.sio.sleep(0) # Already due again: still let other greenlets run first
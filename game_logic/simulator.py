@@ -0,0 +1,221 @@
+"""
+Headless War simulator.
+
+Plays complete games of War with the exact rules used by the live
+multiplayer game in manager.py (3 spoil cards + 1 battle card, recursive
+wars, the MAX_ROUNDS draw and the "not enough cards for war" forfeit),
+but without any Socket.IO, sleeping or broadcasting. Cards are plain ints
+(their rank), so a whole game runs in well under a millisecond.
+
+Typical uses:
+    from game_logic import simulator
+    simulator.play_seed(42)                  # -> (winner, rounds, wars)
+    simulator.run_batch(1_000_000, seed=0)   # -> summary dict
+
+Or from the shell:
+    python -m game_logic.simulator --games 1000000 --processes 8
+
+This module deliberately does not import manager.py (or Flask), so the
+process pool workers stay light. Don't call run_batch() from inside the
+eventlet web worker - it is meant for offline balancing runs.
+"""
+import argparse
+import json
+import random
+import time
+from collections import Counter, deque
+from multiprocessing import Pool, cpu_count
+
+from game_logic.rules import SUITS, VALUES, VALUE_MAP, MAX_ROUNDS, WAR_CARDS_NEEDED
+
+# The ranks of a fresh deck, in the same order Deck() builds its cards
+DECK_RANKS = tuple(VALUE_MAP[v] for s in SUITS for v in VALUES)
+DEFAULT_CHUNK_SIZE = 5000
+
+
+# --- Single Game ---
+
+def deal_seed(seed):
+    """Shuffles a fresh deck with random.Random(seed) and deals it like Deck.deal(2)."""
+    ranks = list(DECK_RANKS)
+    random.Random(seed).shuffle(ranks)
+    return ranks[0::2], ranks[1::2]
+
+
+def play_game(hand0, hand1):
+    """
+    Plays one game to completion from the given hands (lists of ranks, top card first).
+    Returns (winner, rounds, wars): winner is 0, 1 or None for a draw, rounds is the
+    number of hands played and wars counts every tie, including repeat wars.
+    """
+    h0 = deque(hand0)
+    h1 = deque(hand1)
+    rounds = 0
+    wars = 0
+
+    while True:
+        # Same order of checks as WarGame.game_loop: round cap first, then empty hands
+        if rounds + 1 > MAX_ROUNDS:
+            return None, rounds, wars
+        if not h0:
+            return 1, rounds, wars
+        if not h1:
+            return 0, rounds, wars
+        rounds += 1
+
+        c0 = h0.popleft()
+        c1 = h1.popleft()
+        if c0 > c1:
+            h0.append(c0)
+            h0.append(c1)
+            continue
+        if c1 > c0:
+            h1.append(c0)
+            h1.append(c1)
+            continue
+
+        # --- War (loops instead of recursing, spoils keep growing) ---
+        spoils = [c0, c1]
+        while True:
+            wars += 1
+            if len(h0) < WAR_CARDS_NEEDED:
+                h1.extend(spoils)
+                h1.extend(h0)
+                h0.clear()
+                break
+            if len(h1) < WAR_CARDS_NEEDED:
+                h0.extend(spoils)
+                h0.extend(h1)
+                h1.clear()
+                break
+
+            # Spoil cards and the battle card, interleaved P0,P1 like the live game
+            for _ in range(WAR_CARDS_NEEDED):
+                spoils.append(h0.popleft())
+                spoils.append(h1.popleft())
+
+            b0 = spoils[-2]
+            b1 = spoils[-1]
+            if b0 > b1:
+                h0.extend(spoils)
+                break
+            if b1 > b0:
+                h1.extend(spoils)
+                break
+
+
+def play_seed(seed):
+    """Deals with deal_seed(seed) and plays the game. Returns (winner, rounds, wars)."""
+    hand0, hand1 = deal_seed(seed)
+    return play_game(hand0, hand1)
+
+
+# --- Batch Monte Carlo ---
+
+def _simulate_range(seed_range):
+    """Pool worker: plays every seed in [start, stop) and returns partial tallies."""
+    start, stop = seed_range
+    wins = [0, 0, 0] # P0, P1, draws
+    lengths = Counter()
+    war_counts = Counter()
+    for seed in range(start, stop):
+        winner, rounds, wars = play_seed(seed)
+        wins[2 if winner is None else winner] += 1
+        lengths[rounds] += 1
+        war_counts[wars] += 1
+    return wins, lengths, war_counts
+
+
+def _distribution(counter, total):
+    """Summarises a {value: count} histogram (mean, min/max and a few percentiles)."""
+    if not total:
+        return {'mean': 0, 'min': 0, 'max': 0, 'p50': 0, 'p90': 0, 'p99': 0, 'histogram': {}}
+
+    values = sorted(counter)
+    targets = {'p50': 0.50, 'p90': 0.90, 'p99': 0.99}
+    percentiles = {}
+    seen = 0
+    for value in values:
+        seen += counter[value]
+        for name, fraction in targets.items():
+            if name not in percentiles and seen >= fraction * total:
+                percentiles[name] = value
+
+    return {
+        'mean': sum(v * c for v, c in counter.items()) / total,
+        'min': values[0],
+        'max': values[-1],
+        **percentiles,
+        'histogram': {v: counter[v] for v in values},
+    }
+
+
+def run_batch(num_games, seed=0, processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Plays num_games seeded deals (seeds seed .. seed + num_games - 1) across a
+    process pool and returns win rates plus game length and war count distributions.
+    processes=1 runs everything in the calling process.
+    """
+    processes = processes or cpu_count()
+    chunks = [(start, min(start + chunk_size, seed + num_games))
+              for start in range(seed, seed + num_games, chunk_size)]
+
+    wins = [0, 0, 0]
+    lengths = Counter()
+    war_counts = Counter()
+
+    started = time.perf_counter()
+    if processes == 1 or len(chunks) <= 1:
+        results = map(_simulate_range, chunks)
+        pool = None
+    else:
+        pool = Pool(processes)
+        results = pool.imap_unordered(_simulate_range, chunks)
+
+    try:
+        for chunk_wins, chunk_lengths, chunk_wars in results:
+            for i in range(3):
+                wins[i] += chunk_wins[i]
+            lengths.update(chunk_lengths)
+            war_counts.update(chunk_wars)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'games': num_games,
+        'seed': seed,
+        'p0_wins': wins[0],
+        'p1_wins': wins[1],
+        'draws': wins[2],
+        'p0_win_rate': wins[0] / num_games if num_games else 0,
+        'p1_win_rate': wins[1] / num_games if num_games else 0,
+        'draw_rate': wins[2] / num_games if num_games else 0,
+        'rounds': _distribution(lengths, num_games),
+        'wars': _distribution(war_counts, num_games),
+        'elapsed_seconds': elapsed,
+    }
+
+
+# --- Command Line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo War simulator.")
+    parser.add_argument('--games', type=int, default=100000, help="Number of deals to play.")
+    parser.add_argument('--seed', type=int, default=0, help="First seed; games use seed .. seed+games-1.")
+    parser.add_argument('--processes', type=int, default=None, help="Pool size (default: CPU count).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--histograms', action='store_true', help="Include full histograms in the output.")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.games, seed=args.seed, processes=args.processes, chunk_size=args.chunk_size)
+    if not args.histograms:
+        summary['rounds'].pop('histogram')
+        summary['wars'].pop('histogram')
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
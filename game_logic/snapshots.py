@@ -0,0 +1,205 @@
+"""
+Compact binary snapshots of live War games, for surviving restarts and deploys.
+
+A snapshot is ~100 bytes: card positions are single bytes (cards.CARDS index),
+counters are fixed-width ints and names are length-prefixed UTF-8. The manager
+encodes dirty games every few seconds (write-behind) and hands them to a store:
+
+  * FileSnapshotStore - one small file per room in a directory.
+  * SqlSnapshotStore  - one row per room in a SQLAlchemy table.
+"""
+import logging
+import os
+import struct
+import time
+
+from game_logic.game_log import encode_name, pack_events, unpack_events
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Format ---
+MAGIC = b'WG'
+FORMAT_VERSION = 2 # 2 added the deck seed, step counter and replay events
+PHASES = (None, 'turn', 'draw', 'compare', 'war', 'war_spoil', 'war_battle', 'war_resolve')
+
+_HEADER = struct.Struct('<2sBB') # magic, version, flags
+_NUMBERS = struct.Struct('<ffHIB4H') # base_delay, turn_delay, turns, state_seq, phase, 2x(hands_won, wars_won)
+_REPLAY = struct.Struct('<QIH') # seed, step count, event count (version 2+)
+FLAG_IN_PROGRESS = 1
+FLAG_GAME_OVER = 2
+FLAG_SEEDED = 4
+
+
+def _pack_bytes(parts, data):
+    if len(data) > 255:
+        raise ValueError("Snapshot field too long.")
+    parts.append(bytes((len(data),)))
+    parts.append(data)
+
+
+def encode(state):
+    """
+    Encodes a game state dict (as built by WarGame.snapshot_state()) to bytes.
+    Card lists are lists of card indexes (0-51).
+    """
+    flags = (FLAG_IN_PROGRESS if state['game_in_progress'] else 0) | (FLAG_GAME_OVER if state['game_over'] else 0)
+    seed = state.get('seed')
+    if seed is not None:
+        flags |= FLAG_SEEDED
+    events = state.get('events', ())
+    stats = state['stats']
+    parts = [
+        _HEADER.pack(MAGIC, FORMAT_VERSION, flags),
+        _NUMBERS.pack(state['base_delay'], state['turn_delay'], state['total_hands_played'],
+                      state['state_seq'], PHASES.index(state['phase']),
+                      stats[0]['hands_won'], stats[0]['wars_won'],
+                      stats[1]['hands_won'], stats[1]['wars_won']),
+    ]
+    _pack_bytes(parts, state['room_code'].encode('utf-8'))
+    for username in state['usernames']:
+        _pack_bytes(parts, encode_name(username))
+    for pile in ('hand_0', 'hand_1', 'play_pile', 'war_spoils', 'war_round'):
+        _pack_bytes(parts, bytes(state[pile]))
+    parts.append(_REPLAY.pack(seed or 0, state.get('step_count', 0), len(events)))
+    parts.append(pack_events(events))
+    return b''.join(parts)
+
+
+def decode(data):
+    """Decodes bytes from encode() back into a state dict."""
+    magic, version, flags = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or not 1 <= version <= FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot (magic {magic!r}, version {version}).")
+    offset = _HEADER.size
+    (base_delay, turn_delay, turns, state_seq, phase,
+     p0_hands, p0_wars, p1_hands, p1_wars) = _NUMBERS.unpack_from(data, offset)
+    offset += _NUMBERS.size
+
+    def take():
+        nonlocal offset
+        length = data[offset]
+        chunk = data[offset + 1:offset + 1 + length]
+        offset += 1 + length
+        return chunk
+
+    state = {
+        'game_in_progress': bool(flags & FLAG_IN_PROGRESS),
+        'game_over': bool(flags & FLAG_GAME_OVER),
+        # float32 round trip: speeds are always multiples of 0.1
+        'base_delay': round(base_delay, 2),
+        'turn_delay': round(turn_delay, 2),
+        'total_hands_played': turns,
+        'state_seq': state_seq,
+        'phase': PHASES[phase],
+        'stats': {0: {'hands_won': p0_hands, 'wars_won': p0_wars},
+                  1: {'hands_won': p1_hands, 'wars_won': p1_wars}},
+        'room_code': take().decode('utf-8'),
+        'usernames': [take().decode('utf-8', errors='replace'), take().decode('utf-8', errors='replace')],
+    }
+    for pile in ('hand_0', 'hand_1', 'play_pile', 'war_spoils', 'war_round'):
+        state[pile] = list(take())
+
+    state['seed'] = None
+    state['step_count'] = 0
+    state['events'] = []
+    if version >= 2:
+        seed, state['step_count'], event_count = _REPLAY.unpack_from(data, offset)
+        if flags & FLAG_SEEDED:
+            state['seed'] = seed
+        state['events'], offset = unpack_events(data, offset + _REPLAY.size, event_count)
+    return state
+
+
+# --- Stores ---
+
+class FileSnapshotStore:
+    """Keeps each room's snapshot in <directory>/<room_code>.snap (atomic replace on write)."""
+    SUFFIX = '.snap'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, room_code):
+        return os.path.join(self.directory, room_code + self.SUFFIX)
+
+    def save_many(self, snapshots):
+        """snapshots = { 'room_code': bytes }"""
+        for room_code, data in snapshots.items():
+            path = self._path(room_code)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def delete_many(self, room_codes):
+        for room_code in room_codes:
+            try:
+                os.remove(self._path(room_code))
+            except FileNotFoundError:
+                pass
+
+    def load_all(self):
+        """Returns { 'room_code': bytes } for every stored room."""
+        snapshots = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(self.SUFFIX):
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    snapshots[name[:-len(self.SUFFIX)]] = f.read()
+        return snapshots
+
+
+class SqlSnapshotStore:
+    """Keeps snapshots in a 'war_snapshot' table through a SQLAlchemy engine (e.g. db.engine)."""
+
+    def __init__(self, engine, table_name='war_snapshot'):
+        import sqlalchemy as sa
+        self.sa = sa
+        self.engine = engine
+        metadata = sa.MetaData()
+        self.table = sa.Table(
+            table_name, metadata,
+            sa.Column('room_code', sa.String(8), primary_key=True),
+            sa.Column('data', sa.LargeBinary, nullable=False),
+            sa.Column('updated_at', sa.Float, nullable=False),
+        )
+        metadata.create_all(engine, checkfirst=True)
+
+    def save_many(self, snapshots):
+        if not snapshots:
+            return
+        now = time.time()
+        with self.engine.begin() as conn:
+            # Portable upsert: replace the rows in one transaction
+            conn.execute(self.table.delete().where(self.table.c.room_code.in_(list(snapshots))))
+            conn.execute(self.table.insert(), [
+                {'room_code': room_code, 'data': data, 'updated_at': now}
+                for room_code, data in snapshots.items()
+            ])
+
+    def delete_many(self, room_codes):
+        if not room_codes:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.room_code.in_(list(room_codes))))
+
+    def load_all(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(self.sa.select(self.table.c.room_code, self.table.c.data))
+            return {row.room_code: bytes(row.data) for row in rows}
+
+
+def store_from_env(engine=None):
+    """
+    Picks a store from WAR_SNAPSHOTS: a directory path, 'db' (needs engine), or unset for none.
+    """
+    target = os.environ.get('WAR_SNAPSHOTS')
+    if not target:
+        return None
+    if target == 'db':
+        if engine is None:
+            log.error("WAR_SNAPSHOTS=db but no database engine was provided.")
+            return None
+        return SqlSnapshotStore(engine)
+    return FileSnapshotStore(target)
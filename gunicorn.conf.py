@@ -0,0 +1,20 @@
+"""
+Gunicorn hooks (the Procfile passes this file with --config).
+
+Importing app only builds the Flask app. Hosting War rooms (claiming a room
+shard, listening for routed messages, restoring snapshots) starts here, in
+each web worker once it has loaded the app, so one-off processes that import
+app (the release phase's `flask --app app upgrade-db`, other `flask`
+commands) never lease a shard slot away from a real worker.
+"""
+
+
+def on_starting(server):
+    # Refuse to boot several workers that would each host every room in memory
+    from game_logic.backend import check_worker_count
+    check_worker_count(server.cfg.workers)
+
+
+def post_worker_init(worker):
+    import app
+    app.start_war_rooms()
@@ -0,0 +1,3 @@
+# This file can be empty.
+# Its presence tells Python that 'math_logic' is a package,
+# which allows us to import files from it.
@@ -0,0 +1,283 @@
+"""
+Brute-force search for Beal counterexamples: A^x + B^y = C^z with
+A, B, C <= max_base, 3 <= x, y, z <= max_exp and gcd(A, B) = 1.
+
+(If A and B share a prime, that prime divides C^z and so C: such solutions,
+like 3^3 + 6^3 = 3^5, are not counterexamples and are skipped unless
+include_common is set.)
+
+The numbers involved have hundreds of digits, so the search works on
+fingerprints: each power is reduced modulo two primes below 2^31 and the two
+residues are packed into one int64. Every C^z goes into a sorted fingerprint
+index; then, for each (A, x), the fingerprints of A^x + B^y are computed for
+a whole block of B values and all y at once (NumPy, modular addition) and
+looked up with searchsorted. The rare fingerprint hit is verified with exact
+integer arithmetic, so collisions are counted but never reported.
+
+A run splits the A values into BLOCKS interleaved blocks, searched across a
+process pool. After each block the run's checkpoint (a JSON file in BEAL_DIR)
+is updated, so an interrupted run resumes where it stopped. Memory per worker
+is bounded by the index and power tables, O(max_base * max_exp), plus one
+B_CHUNK x max_exp block at a time.
+
+    python -m math_logic.beal run --max-base 10000 --max-exp 100 --workers 8
+    python -m math_logic.beal status
+
+/beal-conjecture/search shows the progress and results of every run.
+"""
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+PRIMES = (2147483647, 2147483629) # Fingerprint moduli: residues < 2^31, so products fit in int64
+BLOCKS = 512 # Work units per run (A values are dealt out round-robin)
+B_CHUNK = 4096 # B values fingerprinted at a time
+CHECKPOINT_SECONDS = 10
+MAX_RECORDED = 1000 # Solutions kept per run when include_common is set
+DEFAULT_DIR = os.path.join('instance', 'beal')
+
+
+# --- Fingerprints ---
+
+def power_tables(max_base, max_exp):
+    """One table per modulus: tables[k][b, e] = b^e mod PRIMES[k], for b <= max_base, e <= max_exp."""
+    bases = np.arange(max_base + 1, dtype=np.int64)
+    tables = []
+    for p in PRIMES:
+        table = np.empty((max_base + 1, max_exp + 1), dtype=np.int64)
+        table[:, 0] = 1
+        for e in range(1, max_exp + 1):
+            table[:, e] = table[:, e - 1] * bases % p
+        tables.append(table)
+    return tables
+
+
+def fingerprint(r0, r1):
+    return (r0 << 31) | r1
+
+
+class PowerIndex:
+    """Sorted fingerprints of every C^z (2 <= C <= max_base, 3 <= z <= max_exp)."""
+
+    def __init__(self, tables, max_base, max_exp):
+        prints = fingerprint(tables[0][2:, 3:], tables[1][2:, 3:]).ravel()
+        self.order = np.argsort(prints, kind='stable')
+        self.prints = prints[self.order]
+        self.width = max_exp - 2 # z values per C
+
+    def contains(self, prints):
+        """Bool mask of the fingerprints that some C^z has."""
+        pos = np.searchsorted(self.prints, prints)
+        return self.prints[np.minimum(pos, len(self.prints) - 1)] == prints
+
+    def candidates(self, value_print):
+        """(C, z) pairs whose fingerprint matches."""
+        lo, hi = np.searchsorted(self.prints, [value_print, value_print + 1])
+        return [(int(i) // self.width + 2, int(i) % self.width + 3) for i in self.order[lo:hi]]
+
+
+# --- Search ---
+
+class Searcher:
+    """Per-process search state: power tables and the C^z index for one (max_base, max_exp)."""
+
+    def __init__(self, max_base, max_exp, include_common=False):
+        self.max_base = max_base
+        self.max_exp = max_exp
+        self.include_common = include_common
+        self.tables = power_tables(max_base, max_exp)
+        self.index = PowerIndex(self.tables, max_base, max_exp)
+
+    def search_block(self, block, blocks):
+        """Searches A = block+1, block+1+blocks, ...; returns the block's result dict."""
+        result = {'block': block, 'pairs': 0, 'collisions': 0, 'counterexamples': [], 'solutions': []}
+        t0, t1 = self.tables
+        p0, p1 = PRIMES
+        for A in range(block + 1, self.max_base + 1, blocks):
+            Bs = np.arange(A, self.max_base + 1, dtype=np.int64)
+            if not self.include_common:
+                Bs = Bs[np.gcd(Bs, A) == 1]
+            exponents = [3] if A == 1 else range(3, self.max_exp + 1) # 1^x is 1 for every x
+            for start in range(0, len(Bs), B_CHUNK):
+                chunk = Bs[start:start + B_CHUNK]
+                b0, b1 = t0[chunk, 3:], t1[chunk, 3:]
+                for x in exponents:
+                    prints = fingerprint((b0 + t0[A, x]) % p0, (b1 + t1[A, x]) % p1)
+                    result['pairs'] += prints.size
+                    for row, col in zip(*np.nonzero(self.index.contains(prints))):
+                        self._verify(result, A, x, int(chunk[row]), int(col) + 3, int(prints[row, col]))
+        return result
+
+    def _verify(self, result, A, x, B, y, value_print):
+        total = A ** x + B ** y
+        verified = False
+        for C, z in self.index.candidates(value_print): # Several when C^z = D^w (e.g. 2^6 = 4^3)
+            if C ** z != total:
+                continue
+            verified = True
+            solution = [A, x, B, y, C, z]
+            if math.gcd(math.gcd(A, B), C) == 1:
+                log.warning(f"Beal counterexample: {A}^{x} + {B}^{y} = {C}^{z}")
+                result['counterexamples'].append(solution)
+            else:
+                result['solutions'].append(solution)
+        if not verified:
+            result['collisions'] += 1
+
+
+_searcher = None
+
+def _init_worker(max_base, max_exp, include_common):
+    global _searcher
+    _searcher = Searcher(max_base, max_exp, include_common)
+
+
+def _search_task(args):
+    block, blocks = args
+    return _searcher.search_block(block, blocks)
+
+
+# --- Runs & Checkpoints ---
+
+def run_name(max_base, max_exp, include_common=False):
+    return f"beal-{max_base}-{max_exp}{'-all' if include_common else ''}"
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def run(max_base, max_exp, workers=1, include_common=False, directory=DEFAULT_DIR):
+    """Runs (or resumes) a search, checkpointing to directory; returns the final state."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, run_name(max_base, max_exp, include_common) + '.json')
+    blocks = min(BLOCKS, max_base)
+    state = load_checkpoint(path) or {
+        'max_base': max_base, 'max_exp': max_exp, 'include_common': include_common, 'blocks': blocks,
+        'done': [], 'pairs': 0, 'collisions': 0, 'counterexamples': [], 'solutions': [],
+        'elapsed': 0.0, 'started_at': time.time(), 'updated_at': None, 'finished': False,
+    }
+    done = set(state['done'])
+    todo = [(block, blocks) for block in range(blocks) if block not in done]
+    if not todo:
+        return state
+    log.info(f"Beal search {os.path.basename(path)}: {len(done)}/{blocks} blocks done, {workers} workers")
+
+    session_started = time.monotonic()
+    elapsed_before = state['elapsed']
+    last_saved = session_started
+
+    def merge(result):
+        nonlocal last_saved
+        state['done'].append(result['block'])
+        state['pairs'] += result['pairs']
+        state['collisions'] += result['collisions']
+        state['counterexamples'].extend(result['counterexamples'])
+        room = MAX_RECORDED - len(state['solutions'])
+        state['solutions'].extend(result['solutions'][:max(0, room)])
+        state['solution_count'] = state.get('solution_count', 0) + len(result['solutions'])
+        now = time.monotonic()
+        state['elapsed'] = elapsed_before + now - session_started
+        state['updated_at'] = time.time()
+        if now - last_saved >= CHECKPOINT_SECONDS or result['counterexamples']:
+            save_checkpoint(path, state)
+            last_saved = now
+
+    try:
+        if workers <= 1:
+            _init_worker(max_base, max_exp, include_common)
+            for task in todo:
+                merge(_search_task(task))
+        else:
+            from multiprocessing import Pool
+            with Pool(workers, initializer=_init_worker, initargs=(max_base, max_exp, include_common)) as pool:
+                for result in pool.imap_unordered(_search_task, todo):
+                    merge(result)
+        state['finished'] = True
+    finally:
+        save_checkpoint(path, state)
+    return state
+
+
+def summarize(state):
+    """The progress view of a checkpoint: percent done, rate, ETA and results."""
+    done = len(state['done'])
+    elapsed = state['elapsed']
+    remaining = state['blocks'] - done
+    return {
+        'max_base': state['max_base'],
+        'max_exp': state['max_exp'],
+        'include_common': state['include_common'],
+        'progress': done / state['blocks'],
+        'pairs_checked': state['pairs'],
+        'pairs_per_second': state['pairs'] / elapsed if elapsed else 0.0,
+        'elapsed_seconds': elapsed,
+        'eta_seconds': elapsed / done * remaining if done and remaining else 0.0,
+        'updated_at': state['updated_at'],
+        'finished': state['finished'],
+        'fingerprint_collisions': state['collisions'],
+        'counterexamples': state['counterexamples'],
+        'solution_count': state.get('solution_count', 0),
+        'solutions': state['solutions'][:20],
+    }
+
+
+def list_runs(directory=DEFAULT_DIR):
+    """summarize() of every checkpoint in directory, largest search first."""
+    runs = []
+    for path in glob.glob(os.path.join(directory, 'beal-*.json')):
+        state = load_checkpoint(path)
+        if state:
+            runs.append(dict(summarize(state), name=os.path.basename(path)[:-5]))
+    return sorted(runs, key=lambda r: (r['max_base'], r['max_exp']), reverse=True)
+
+
+def beal_dir_from_env():
+    return os.environ.get('BEAL_DIR', DEFAULT_DIR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m math_logic.beal', description="Beal counterexample search")
+    commands = parser.add_subparsers(dest='command', required=True)
+    start = commands.add_parser('run', help="run or resume a search")
+    start.add_argument('--max-base', type=int, required=True)
+    start.add_argument('--max-exp', type=int, required=True)
+    start.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    start.add_argument('--include-common', action='store_true',
+                       help="also record solutions whose bases share a prime (a sanity check)")
+    commands.add_parser('status', help="show every run's progress")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'run':
+        if args.max_base < 1 or args.max_exp < 3:
+            parser.error("need --max-base >= 1 and --max-exp >= 3")
+        state = run(args.max_base, args.max_exp, args.workers, args.include_common, beal_dir_from_env())
+        print(json.dumps(summarize(state), indent=2))
+    else:
+        print(json.dumps(list_runs(beal_dir_from_env()), indent=2))
+
+
+if __name__ == '__main__':
+    main()
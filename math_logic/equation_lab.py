@@ -0,0 +1,420 @@
+"""
+Open Equation Lab: Equation Cards graded against Stress Tests.
+
+A card's equation is a single expression in its declared variables (e.g.
+"G*M/r**2"). It is parsed once, checked against a whitelist of AST nodes
+(arithmetic, numbers, the card's variables and the FUNCTIONS below - no
+attribute access, subscripts, keywords or builtins) and compiled into a
+function that evaluates it over NumPy arrays. A stress test supplies arrays
+(or scalars) for the variables plus the expected outputs and a relative
+tolerance; grading evaluates the card on every point at once:
+
+    Pass     every point within tolerance
+    Partial  at least PARTIAL_SHARE of the points
+    Fail     fewer, or the equation errors / returns non-finite values
+    Untested the test is outside the card's domain (no result is stored),
+             or it doesn't supply all of the card's variables
+
+Results are stored per (card, test) with the card and test versions they
+were graded at; editing either bumps its version, and EquationLab.regrade()
+only re-runs pairs whose stored versions are stale. The grading itself is
+pure (dicts in, dicts out), so it runs inline, on a thread (run=run_cpu) or
+across a process pool, where each worker receives the tests once and then
+grades whole cards against them:
+
+    flask --app app regrade-equations --workers 8
+"""
+import ast
+import logging
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+import sqlalchemy as sa
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+PASS, PARTIAL, FAIL, UNTESTED = 'Pass', 'Partial', 'Fail', 'Untested'
+PARTIAL_SHARE = 0.5
+UNIVERSAL = 'universal' # Test domain that applies to every card
+MAX_EXPRESSION = 1000 # Characters
+MAX_DEPTH = 200 # Nesting levels of the parsed equation (the validator and compile() recurse per level)
+MAX_POINTS = 10000 # Points per stress test
+COMPILED_CACHE_SIZE = 4096 # Compiled cards kept per process
+WRITE_BATCH = 1000 # Results written per statement
+
+FUNCTIONS = {
+    'sin': np.sin, 'cos': np.cos, 'tan': np.tan,
+    'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan, 'atan2': np.arctan2,
+    'sinh': np.sinh, 'cosh': np.cosh, 'tanh': np.tanh,
+    'exp': np.exp, 'log': np.log, 'ln': np.log, 'log10': np.log10, 'log2': np.log2,
+    'sqrt': np.sqrt, 'abs': np.abs, 'min': np.minimum, 'max': np.maximum,
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd)
+
+
+# --- Compiling Equations ---
+
+class _Validator(ast.NodeTransformer):
+    """Rejects anything but arithmetic over known names; turns numbers into floats."""
+
+    def __init__(self, variables):
+        self.variables = set(variables)
+        self.used = set()
+        self.depth = 0
+
+    def visit(self, node):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ValueError(f"Equations are limited to {MAX_DEPTH} levels of nesting")
+        try:
+            return super().visit(node)
+        finally:
+            self.depth -= 1
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ValueError(f"Only numbers are allowed, not {node.value!r}")
+        # Float arithmetic overflows instead of building huge ints (9**9**9)
+        return ast.copy_location(ast.Constant(float(node.value)), node)
+
+    def visit_Name(self, node):
+        if node.id in self.variables:
+            self.used.add(node.id)
+        elif node.id not in CONSTANTS:
+            raise ValueError(f"Unknown name '{node.id}' (declare it as a variable)")
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError(f"Only these functions are allowed: {', '.join(sorted(FUNCTIONS))}")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Load) + _OPERATORS):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in an equation")
+        return super().generic_visit(node)
+
+
+def compile_expression(expression, variables):
+    """
+    Compiles an equation into f(**arrays) -> array. Raises ValueError if it
+    isn't plain arithmetic over the declared variables. Returns (f, names used).
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise ValueError("The equation is empty")
+    if len(expression) > MAX_EXPRESSION:
+        raise ValueError(f"Equations are limited to {MAX_EXPRESSION} characters")
+    for name in variables:
+        if not name.isidentifier() or name in FUNCTIONS or name in CONSTANTS:
+            raise ValueError(f"'{name}' can't be used as a variable name")
+    validator = _Validator(variables)
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+        tree = ast.fix_missing_locations(validator.visit(tree))
+        code = compile(tree, '<equation>', 'eval')
+    except (SyntaxError, RecursionError, MemoryError):
+        raise ValueError("The equation isn't valid arithmetic")
+    namespace = {'__builtins__': {}, **FUNCTIONS, **CONSTANTS}
+
+    def evaluate(**arrays):
+        with np.errstate(all='ignore'):
+            return eval(code, namespace, arrays)
+    return evaluate, validator.used
+
+
+_compiled = OrderedDict() # (card id, version) -> (f, used), least recently used first
+_compiled_lock = threading.Lock() # Grading runs on several tpool threads at once
+
+def _compiled_card(card):
+    key = (card['id'], card['version'])
+    with _compiled_lock:
+        if key in _compiled:
+            _compiled.move_to_end(key)
+            return _compiled[key]
+    compiled = compile_expression(card['expression'], card['variables'])
+    with _compiled_lock:
+        _compiled[key] = compiled
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+# --- Grading ---
+
+def parse_test_data(inputs, expected, tolerance):
+    """Validates a stress test's data, raising ValueError with a message fit for the client."""
+    if not isinstance(inputs, dict) or not inputs:
+        raise ValueError("inputs must map variable names to numbers or lists of numbers")
+    try:
+        points = np.atleast_1d(np.asarray(expected, dtype=np.float64))
+        arrays = {name: np.asarray(values, dtype=np.float64) for name, values in inputs.items()}
+        tolerance = float(tolerance)
+    except (TypeError, ValueError):
+        raise ValueError("inputs, expected and tolerance must be numbers (or lists of numbers)")
+    if points.ndim != 1 or len(points) > MAX_POINTS:
+        raise ValueError(f"expected must be a list of at most {MAX_POINTS} numbers")
+    for name, values in arrays.items():
+        if values.ndim > 1 or (values.ndim == 1 and len(values) != len(points)):
+            raise ValueError(f"inputs['{name}'] must be a number or a list as long as expected")
+    if not (0 < tolerance < math.inf):
+        raise ValueError("tolerance must be a positive number")
+    return arrays, points, tolerance
+
+
+def applies(card_domains, test_domain):
+    return test_domain == UNIVERSAL or test_domain in card_domains
+
+
+def domains(domain):
+    """A card's comma-separated domain string as a set of lowercase names."""
+    return {part.strip().lower() for part in (domain or '').split(',') if part.strip()}
+
+
+def grade(card, test):
+    """Grades one card (dict) against one test (dict with parsed arrays). Returns a result dict."""
+    result = {'card_id': card['id'], 'card_version': card['version'],
+              'test_id': test['id'], 'test_version': test['version'],
+              'score': 0.0, 'max_error': None, 'detail': ''}
+    try:
+        evaluate, used = _compiled_card(card)
+    except ValueError as e:
+        return dict(result, grade=FAIL, detail=str(e))
+    missing = used - set(test['arrays'])
+    if missing:
+        return dict(result, grade=UNTESTED, detail=f"Test doesn't supply {', '.join(sorted(missing))}")
+
+    expected = test['expected']
+    try:
+        output = np.broadcast_to(evaluate(**{name: test['arrays'][name] for name in used}), expected.shape)
+        output = output.astype(np.float64)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        return dict(result, grade=FAIL, detail=f"Evaluation failed: {e}")
+    finite = np.isfinite(output)
+    with np.errstate(all='ignore'):
+        errors = np.abs(output - expected) / np.maximum(np.abs(expected), np.finfo(np.float64).tiny)
+    share = float(np.mean(finite & (errors <= test['tolerance'])))
+    max_error = float(np.max(errors)) if finite.all() else None
+    if share == 1.0:
+        verdict = PASS
+    elif share >= PARTIAL_SHARE:
+        verdict = PARTIAL
+    else:
+        verdict = FAIL
+    detail = '' if finite.all() else f"{int((~finite).sum())} non-finite outputs"
+    return dict(result, grade=verdict, score=share, max_error=max_error, detail=detail)
+
+
+def grade_card(card, tests):
+    return [grade(card, test) for test in tests]
+
+
+_tests = None # Set in each pool worker
+
+def _init_worker(tests):
+    global _tests
+    _tests = tests
+
+
+def _grade_task(args):
+    card, test_ids = args
+    return grade_card(card, [_tests[test_id] for test_id in test_ids])
+
+
+def grade_pairs(cards, tests, todo, workers=1):
+    """Grades todo ({card id: [test ids]}) and returns the result dicts."""
+    tasks = [(cards[card_id], test_ids) for card_id, test_ids in todo.items()]
+    if workers <= 1 or len(tasks) <= 1:
+        _init_worker(tests)
+        return [result for task in tasks for result in _grade_task(task)]
+    # ProcessPoolExecutor rather than multiprocessing.Pool: the app is eventlet
+    # monkey-patched, and Pool's result-handler threads deadlock under it
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tests,)) as pool:
+        return [result for results in pool.map(_grade_task, tasks, chunksize=4) for result in results]
+
+
+# --- Storage ---
+
+class EquationLab:
+    def __init__(self, db, Card, Test, Result):
+        self.db = db
+        self.Card = Card
+        self.Test = Test
+        self.Result = Result
+
+        # Counters
+        self.graded = 0
+        self.regrades = 0
+
+    def save_card(self, data, user_id=None):
+        """
+        Creates a card, or updates data['id'] (bumping its version). Raises
+        ValueError on bad input and PermissionError if user_id didn't submit it.
+        """
+        variables = data.get('variables') or {}
+        if not isinstance(variables, dict):
+            raise ValueError("variables must map each name to its units")
+        compile_expression(data.get('expression'), variables)
+        card = self._load(self.Card, data.get('id'), user_id)
+        card.title = str(data.get('title') or 'Untitled equation')[:200]
+        card.expression = data['expression'].strip()
+        card.variables = {str(name): str(units) for name, units in variables.items()}
+        card.domain = ', '.join(sorted(domains(data.get('domain'))))[:200]
+        return self._commit(card)
+
+    def save_test(self, data, user_id=None):
+        """Creates a stress test, or updates data['id'] (bumping its version), as save_card."""
+        arrays, expected, tolerance = parse_test_data(data.get('inputs'), data.get('expected'),
+                                                      data.get('tolerance', 0.01))
+        test = self._load(self.Test, data.get('id'), user_id)
+        test.title = str(data.get('title') or 'Untitled test')[:200]
+        test.domain = (str(data.get('domain') or UNIVERSAL).strip().lower() or UNIVERSAL)[:100]
+        test.inputs = {name: values.tolist() for name, values in arrays.items()}
+        test.expected = expected.tolist()
+        test.tolerance = tolerance
+        return self._commit(test)
+
+    def _load(self, Model, id, user_id):
+        if id is None:
+            return Model(version=0, submitted_by=user_id)
+        row = self.db.session.get(Model, id)
+        if row is None:
+            raise ValueError(f"No {Model.__name__} with id {id}")
+        if row.submitted_by is None or row.submitted_by != user_id:
+            raise PermissionError(f"Only the author of {Model.__name__} {id} can edit it")
+        return row
+
+    def _commit(self, row):
+        row.version = (row.version or 0) + 1
+        row.updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.db.session.add(row)
+        self.db.session.commit()
+        return row
+
+    def regrade(self, card_ids=None, test_ids=None, workers=1, run=None):
+        """
+        Grades every stale (card, test) pair among the given cards/tests (default
+        all): pairs with no result, or one from an older card or test version.
+        run(func, *args) runs the grading (e.g. run_cpu), default inline.
+        Returns the number of pairs graded.
+        """
+        session = self.db.session
+        card_query = sa.select(self.Card)
+        if card_ids is not None:
+            card_query = card_query.where(self.Card.id.in_(card_ids))
+        test_query = sa.select(self.Test)
+        if test_ids is not None:
+            test_query = test_query.where(self.Test.id.in_(test_ids))
+        cards = {c.id: {'id': c.id, 'version': c.version, 'expression': c.expression,
+                        'variables': c.variables, 'domains': domains(c.domain)}
+                 for c in session.scalars(card_query)}
+        tests = {}
+        for t in session.scalars(test_query):
+            arrays, expected, tolerance = parse_test_data(t.inputs, t.expected, t.tolerance)
+            tests[t.id] = {'id': t.id, 'version': t.version, 'domain': t.domain,
+                           'arrays': arrays, 'expected': expected, 'tolerance': tolerance}
+
+        stored = {}
+        result_query = sa.select(self.Result.card_id, self.Result.test_id,
+                                 self.Result.card_version, self.Result.test_version)
+        if card_ids is not None:
+            result_query = result_query.where(self.Result.card_id.in_(card_ids))
+        if test_ids is not None:
+            result_query = result_query.where(self.Result.test_id.in_(test_ids))
+        for card_id, test_id, card_version, test_version in session.execute(result_query):
+            stored[card_id, test_id] = (card_version, test_version)
+
+        todo = {}
+        relevant = set()
+        for card in cards.values():
+            for test in tests.values():
+                if not applies(card['domains'], test['domain']):
+                    continue
+                relevant.add((card['id'], test['id']))
+                if stored.get((card['id'], test['id'])) != (card['version'], test['version']):
+                    todo.setdefault(card['id'], []).append(test['id'])
+        # Results for pairs that no longer apply (a card or test changed domain)
+        orphans = [pair for pair in stored if pair not in relevant]
+
+        results = []
+        if todo:
+            args = (grade_pairs, cards, tests, todo, workers)
+            results = run(*args) if run else grade_pairs(*args[1:])
+        self._write(results, orphans)
+        self.graded += len(results)
+        self.regrades += 1
+        log.info(f"Equation Lab regrade: {len(results)} pairs graded, {len(orphans)} dropped.")
+        return len(results)
+
+    def _write(self, results, orphans):
+        table = self.Result.__table__
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        pairs = [(r['card_id'], r['test_id']) for r in results] + orphans
+        for start in range(0, len(pairs), WRITE_BATCH):
+            batch = pairs[start:start + WRITE_BATCH]
+            self.db.session.execute(table.delete().where(sa.tuple_(table.c.card_id, table.c.test_id).in_(batch)))
+        for start in range(0, len(results), WRITE_BATCH):
+            self.db.session.execute(table.insert(), [dict(r, graded_at=now)
+                                                     for r in results[start:start + WRITE_BATCH]])
+        self.db.session.commit()
+
+    def profile(self, card):
+        """{test id: result dict} for every test that applies to the card (Untested if not graded yet)."""
+        rows = {r.test_id: r for r in self.db.session.scalars(
+            sa.select(self.Result).where(self.Result.card_id == card.id))}
+        profile = {}
+        for test in self.db.session.scalars(sa.select(self.Test)):
+            if not applies(domains(card.domain), test.domain):
+                continue
+            row = rows.get(test.id)
+            current = row is not None and (row.card_version, row.test_version) == (card.version, test.version)
+            profile[test.id] = {
+                'test': test.title,
+                'grade': row.grade if current else UNTESTED,
+                'score': row.score if current else None,
+                'max_error': row.max_error if current else None,
+                'detail': row.detail if current else 'Not graded yet',
+            }
+        return profile
+
+    def summaries(self):
+        """[{card fields + counts of each grade}] for every card, with one query per table."""
+        tests = [(t.domain, t.version, t.id) for t in self.db.session.scalars(sa.select(self.Test))]
+        counts = {}
+        for card_id, test_id, card_version, test_version, verdict in self.db.session.execute(
+                sa.select(self.Result.card_id, self.Result.test_id, self.Result.card_version,
+                          self.Result.test_version, self.Result.grade)):
+            counts[card_id, test_id] = (card_version, test_version, verdict)
+        test_versions = {test_id: version for _, version, test_id in tests}
+        summaries = []
+        for card in self.db.session.scalars(sa.select(self.Card).order_by(self.Card.id)):
+            card_domains = domains(card.domain)
+            grades = {PASS: 0, PARTIAL: 0, FAIL: 0, UNTESTED: 0}
+            for domain, _, test_id in tests:
+                if not applies(card_domains, domain):
+                    continue
+                stored = counts.get((card.id, test_id))
+                current = stored and stored[:2] == (card.version, test_versions[test_id])
+                grades[stored[2] if current else UNTESTED] += 1
+            summaries.append(dict(card_json(card), grades=grades))
+        return summaries
+
+    def stats(self):
+        return {'graded': self.graded, 'regrades': self.regrades, 'compiled': len(_compiled)}
+
+
+def card_json(card):
+    return {'id': card.id, 'title': card.title, 'expression': card.expression, 'variables': card.variables,
+            'domain': card.domain, 'version': card.version}
+
+
+def test_json(test):
+    return {'id': test.id, 'title': test.title, 'domain': test.domain, 'points': len(test.expected),
+            'tolerance': test.tolerance, 'version': test.version}
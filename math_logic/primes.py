@@ -0,0 +1,348 @@
+"""
+Prime engine for /prime-number-generation.
+
+The article's method builds the set of composite numbers up to a limit and
+takes the primes as its complement. This module does the same, a segment at
+a time: each segment of SEGMENT_NUMBERS numbers starts as "all prime", every
+odd multiple of each base prime p <= sqrt(segment end) is struck out (from
+p*p on), and what is left is packed one bit per odd number (bit i = 2i+1).
+
+Segments are appended to a PrimeTable: a bit-packed file memory-mapped for
+reads, plus a small JSON file holding the limit it covers. The table grows
+on demand (a flock keeps workers from growing it twice) and never shrinks,
+so a range is sieved once and every later query is a slice of the map.
+Growing it past PRIME_ONLINE_LIMIT is left to the CLI, which sieves segments
+in parallel across processes:
+
+    python -m math_logic.primes extend 10000000000 --workers 8
+    python -m math_logic.primes count 1000000000 1000001000
+    python -m math_logic.primes bench --limit 20000000
+
+`bench` times the four levels of the article's method (see LEVELS) against
+a standard Sieve of Eratosthenes.
+"""
+import argparse
+import fcntl
+import json
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+SEGMENT_NUMBERS = 1 << 24 # Numbers per sieved segment (1 MB of packed bits)
+READ_CHUNK_BYTES = 1 << 20 # Table bytes unpacked at a time when counting/streaming
+DEFAULT_TABLE_PATH = os.path.join('instance', 'primes') # .bits/.json/.lock are added
+DEFAULT_ONLINE_LIMIT = 10 ** 8 # Requests may grow the table this far; beyond, use the CLI
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+# --- Sieving ---
+
+def base_primes(limit):
+    """Odd primes <= limit, from a plain odds-only sieve (used to strike out segments)."""
+    if limit < 3:
+        return np.zeros(0, dtype=np.int64)
+    odd = np.ones((limit + 1) // 2, dtype=bool) # odd[i] -> 2i+1
+    odd[0] = False
+    for i in range(1, (math.isqrt(limit) - 1) // 2 + 1):
+        if odd[i]:
+            p = 2 * i + 1
+            odd[p * p // 2::p] = False
+    return 2 * np.flatnonzero(odd) + 1
+
+
+def sieve_segment(lo, hi, primes=None):
+    """
+    The packed bits for the odd numbers in [lo, hi) (lo, hi multiples of 16):
+    bit i of the result is set when lo + 2i + 1 is prime.
+    """
+    if primes is None:
+        primes = base_primes(math.isqrt(hi))
+    odd = np.ones((hi - lo) // 2, dtype=bool) # odd[i] -> lo + 2i + 1
+    for p in primes.tolist():
+        first = p * p
+        if first >= hi:
+            break
+        if first < lo:
+            first = (lo + p - 1) // p * p
+            if first % 2 == 0:
+                first += p
+        odd[(first - lo) // 2::p] = False
+    if lo == 0:
+        odd[0] = False # 1 is not prime
+    return np.packbits(odd, bitorder='little').tobytes()
+
+
+def _sieve_task(bounds):
+    lo, hi = bounds
+    return sieve_segment(lo, hi)
+
+
+# --- Persistent Table ---
+
+class PrimeTable:
+    def __init__(self, path=DEFAULT_TABLE_PATH, online_limit=DEFAULT_ONLINE_LIMIT):
+        self.path = path
+        self.online_limit = online_limit
+        self._limit = None # The published limit, as of the last read under ensure()
+        self._map = None
+        self._map_limit = 0
+
+        # Counters
+        self.queries = 0
+        self.segments_sieved = 0
+
+    @property
+    def limit(self):
+        """
+        Every number below this is in the table. Read from disk once, then only
+        re-read by ensure(), so a table another worker grew is picked up the
+        first time a query needs the extra range.
+        """
+        if self._limit is None:
+            self._limit = self._read_limit()
+        return self._limit
+
+    def _read_limit(self):
+        try:
+            with open(self.path + '.json') as f:
+                return json.load(f)['limit']
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def _bits(self, limit):
+        """The table's bytes covering [0, limit), memory-mapped read-only (remapped as it grows)."""
+        if self._map is None or self._map_limit < limit:
+            size = self.limit // 16
+            self._map = np.memmap(self.path + '.bits', dtype=np.uint8, mode='r', shape=(size,)) if size else None
+            self._map_limit = size * 16
+        return self._map
+
+    def ensure(self, limit, workers=1):
+        """Grows the table to cover [0, limit), sieving only the segments it is missing."""
+        if limit <= self.limit:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX) # Another worker may be growing it right now
+            start = self._limit = self._read_limit()
+            if limit <= start:
+                return
+            stop = -(-limit // SEGMENT_NUMBERS) * SEGMENT_NUMBERS
+            segments = [(lo, lo + SEGMENT_NUMBERS) for lo in range(start, stop, SEGMENT_NUMBERS)]
+            log.info(f"Growing prime table from {start:,} to {stop:,} ({len(segments)} segments, {workers} workers)")
+            with open(self.path + '.bits', 'r+b' if start else 'wb') as bits:
+                bits.truncate(start // 16) # Drop any tail an interrupted run left behind
+                bits.seek(start // 16)
+                for packed in self._sieve(segments, workers):
+                    bits.write(packed)
+                    self.segments_sieved += 1
+                bits.flush()
+                os.fsync(bits.fileno())
+            # Publish the new limit only once its bits are on disk
+            tmp = self.path + '.json.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'limit': stop}, f)
+            os.replace(tmp, self.path + '.json')
+            self._limit = stop
+
+    def _sieve(self, segments, workers):
+        if workers <= 1 or len(segments) <= 1:
+            primes = base_primes(math.isqrt(segments[-1][1]))
+            return (sieve_segment(lo, hi, primes) for lo, hi in segments)
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(workers)
+        return _ordered_then_shutdown(pool, pool.map(_sieve_task, segments, chunksize=1))
+
+    def check_range(self, start, stop):
+        """Makes sure [start, stop) is servable: valid, and in the table (growing it up to online_limit)."""
+        if start < 0 or stop < start:
+            raise ValueError("Need 0 <= start <= stop")
+        if stop > self.limit:
+            if stop > max(self.online_limit, self.limit):
+                raise ValueError(f"Primes are precomputed up to {max(self.online_limit, self.limit):,}; "
+                                 f"run `python -m math_logic.primes extend {stop}` to go further")
+            self.ensure(stop)
+
+    def _odd_slice(self, start, stop):
+        """(bytes, offset, length): the packed bits for the odd numbers in [start, stop)."""
+        first, end = start // 2, stop // 2 # Odd indexes: 2i+1 in [start, stop)
+        if end <= first:
+            return np.zeros(0, dtype=np.uint8), 0, 0
+        bits = self._bits(stop)
+        return bits[first // 8:-(-end // 8)], first % 8, end - first
+
+    def count(self, start, stop):
+        """Number of primes in [start, stop)."""
+        self.check_range(start, stop)
+        self.queries += 1
+        total = int(start <= 2 < stop)
+        data, offset, length = self._odd_slice(start, stop)
+        if length <= 0:
+            return total
+        head = np.unpackbits(data[:1], bitorder='little')[offset:offset + length]
+        total += int(head.sum())
+        rest = length - len(head)
+        if rest:
+            whole, tail = divmod(rest, 8)
+            for i in range(1, 1 + whole, READ_CHUNK_BYTES):
+                total += int(_POPCOUNT[data[i:min(i + READ_CHUNK_BYTES, 1 + whole)]].sum(dtype=np.int64))
+            if tail:
+                total += int(np.unpackbits(data[1 + whole:2 + whole], bitorder='little')[:tail].sum())
+        return total
+
+    def iter_primes(self, start, stop, chunk=READ_CHUNK_BYTES * 16):
+        """Yields NumPy arrays of the primes in [start, stop), chunk numbers at a time."""
+        self.check_range(start, stop)
+        self.queries += 1
+        if start <= 2 < stop:
+            yield np.array([2], dtype=np.int64)
+        for lo in range(start, stop, chunk):
+            hi = min(lo + chunk, stop)
+            data, offset, length = self._odd_slice(lo, hi)
+            odd = np.unpackbits(np.asarray(data), bitorder='little')[offset:offset + length]
+            primes = 2 * (np.flatnonzero(odd) + lo // 2) + 1
+            if len(primes):
+                yield primes
+
+    def primes(self, start, stop):
+        """The primes in [start, stop) as one NumPy array."""
+        return np.concatenate([np.zeros(0, dtype=np.int64), *self.iter_primes(start, stop)])
+
+    def stats(self):
+        return {'limit': self.limit, 'queries': self.queries, 'segments_sieved': self.segments_sieved}
+
+
+def _ordered_then_shutdown(pool, results):
+    try:
+        yield from results
+    finally:
+        pool.shutdown()
+
+
+def prime_table_from_env():
+    """PrimeTable configured from PRIME_TABLE_PATH and PRIME_ONLINE_LIMIT."""
+    return PrimeTable(os.environ.get('PRIME_TABLE_PATH', DEFAULT_TABLE_PATH),
+                      int(os.environ.get('PRIME_ONLINE_LIMIT', DEFAULT_ONLINE_LIMIT)))
+
+
+# --- Benchmark ---
+# The article refines its complement method through four levels; as implemented
+# here, each level keeps the previous one's savings. All return a bool array of primality.
+
+def level_1(limit):
+    """Complement of every product a*b (a, b >= 2): strike out all multiples of every a."""
+    composite = np.zeros(limit + 1, dtype=bool)
+    for a in range(2, limit // 2 + 1):
+        composite[2 * a::a] = True
+    composite[:2] = True
+    return ~composite
+
+
+def level_2(limit):
+    """Only a <= sqrt(limit), striking from a*a (smaller products were struck by a smaller factor)."""
+    composite = np.zeros(limit + 1, dtype=bool)
+    for a in range(2, math.isqrt(limit) + 1):
+        composite[a * a::a] = True
+    composite[:2] = True
+    return ~composite
+
+
+def level_3(limit):
+    """Odd numbers only: even composites need no marking, and odd * odd products step by 2a."""
+    odd = np.ones((limit + 1) // 2, dtype=bool)
+    odd[0] = False
+    for a in range(3, math.isqrt(limit) + 1, 2):
+        odd[a * a // 2::a] = False
+    return _from_odd(odd, limit)
+
+
+def level_4(limit):
+    """Prime factors only, sieved segment by segment into packed bits (the PrimeTable engine)."""
+    stop = -(-(limit + 1) // 16) * 16
+    primes = base_primes(math.isqrt(stop))
+    packed = b''.join(sieve_segment(lo, min(lo + SEGMENT_NUMBERS, stop), primes)
+                      for lo in range(0, stop, SEGMENT_NUMBERS))
+    odd = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), bitorder='little')[:(limit + 1) // 2]
+    return _from_odd(odd.astype(bool), limit)
+
+
+def standard_sieve(limit):
+    """Textbook Sieve of Eratosthenes over every number."""
+    prime = np.ones(limit + 1, dtype=bool)
+    prime[:2] = False
+    for p in range(2, math.isqrt(limit) + 1):
+        if prime[p]:
+            prime[p * p::p] = False
+    return prime
+
+
+def _from_odd(odd, limit):
+    prime = np.zeros(limit + 1, dtype=bool)
+    prime[1::2] = odd
+    if limit >= 2:
+        prime[2] = True
+    return prime
+
+
+LEVELS = [('level 1', level_1), ('level 2', level_2), ('level 3', level_3), ('level 4', level_4),
+          ('standard sieve', standard_sieve)]
+
+
+def benchmark(limit, runs=3, max_level_1=2 * 10 ** 6):
+    """{name: best seconds} for each LEVELS entry; level 1 is skipped above max_level_1 (it is O(n log n) loops)."""
+    expected = None
+    timings = {}
+    for name, func in LEVELS:
+        if func is level_1 and limit > max_level_1:
+            continue
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = func(limit)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        if expected is None:
+            expected = result
+        elif not np.array_equal(result, expected):
+            raise AssertionError(f"{name} disagrees with the other methods")
+        timings[name] = best
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m math_logic.primes', description="Prime table tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    extend = commands.add_parser('extend', help="grow the table to cover [0, LIMIT)")
+    extend.add_argument('limit', type=int)
+    extend.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    count = commands.add_parser('count', help="count the primes in [START, STOP)")
+    count.add_argument('start', type=int)
+    count.add_argument('stop', type=int)
+    bench = commands.add_parser('bench', help="time the article's four levels against a standard sieve")
+    bench.add_argument('--limit', type=int, default=20 * 10 ** 6)
+    bench.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    table = prime_table_from_env()
+    if args.command == 'extend':
+        started = time.perf_counter()
+        table.ensure(args.limit, workers=args.workers)
+        print(f"Table covers [0, {table.limit:,}) ({time.perf_counter() - started:.1f}s)")
+    elif args.command == 'count':
+        table.online_limit = max(table.online_limit, args.stop)
+        print(table.count(args.start, args.stop))
+    else:
+        for name, seconds in benchmark(args.limit, args.runs).items():
+            print(f"{name:<16} {seconds * 1000:10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Exact mixed-strategy solver for the strategy calculators.
+
+A payoff matrix holds the row player's payoff (in the calculators: the % of
+points Player 1 wins) for each pair of options; the row player maximizes it
+and the column player minimizes it, so the game is zero-sum. Its equilibrium
+is the solution of a linear program, solved here with a dense NumPy simplex:
+
+    shift the matrix so every payoff is positive (M = A + shift), then
+    maximize sum(y) subject to M y <= 1, y >= 0
+
+The column player's mix is y / sum(y), the row player's is the dual (read off
+the slack columns of the final tableau), and the game value is
+1 / sum(y) - shift. This is exact up to floating point for any m x n matrix,
+unlike the pairwise 2x2 averaging the NxN page used to do in the browser.
+
+StrategySolver memoizes results by a hash of the matrix (shape + float64
+bytes) in an LRU of STRATEGY_CACHE_SIZE entries. solve_batch() answers a
+whole list of matrices, solving each distinct uncached one once; pass
+run=web_logic.offload.run_cpu to keep the solving off the eventlet hub.
+"""
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_CACHE_SIZE = 5000
+MAX_SIZE = 200 # Options per player
+MAX_BATCH = 100 # Matrices per solve_batch() call
+TOLERANCE = 1e-9
+
+
+# --- Simplex ---
+
+def _pivot(tableau, row, col):
+    tableau[row] /= tableau[row, col]
+    column = tableau[:, col].copy()
+    column[row] = 0.0
+    tableau -= np.outer(column, tableau[row])
+
+
+def solve_zero_sum(payoffs):
+    """
+    Solves the zero-sum game with this (m x n) row-player payoff matrix.
+    Returns {'row': [...], 'col': [...], 'value': v}: each player's equilibrium
+    mix (probabilities) and the expected payoff when both play them.
+    """
+    A = np.asarray(payoffs, dtype=np.float64)
+    m, n = A.shape
+    shift = 1.0 - A.min()
+    # Tableau: [M | I | 1] for the constraints, [-1 ... -1 | 0 | 0] for the objective
+    tableau = np.zeros((m + 1, n + m + 1))
+    tableau[:m, :n] = A + shift
+    tableau[:m, n:n + m] = np.eye(m)
+    tableau[:m, -1] = 1.0
+    tableau[m, :n] = -1.0
+    basis = np.arange(n, n + m)
+
+    # The origin is feasible and the objective is bounded (M > 0), so this always ends.
+    # Dantzig's rule normally; Bland's (lowest index) after a degenerate pivot, against cycling.
+    degenerate = False
+    for _ in range(50 * (m + n)):
+        costs = tableau[m, :-1]
+        if degenerate:
+            candidates = np.flatnonzero(costs < -TOLERANCE)
+            if not len(candidates):
+                break
+            col = candidates[0]
+        else:
+            col = int(np.argmin(costs))
+            if costs[col] >= -TOLERANCE:
+                break
+        column = tableau[:m, col]
+        rows = np.flatnonzero(column > TOLERANCE)
+        ratios = tableau[rows, -1] / column[rows]
+        best = rows[ratios <= ratios.min() + TOLERANCE]
+        row = best[np.argmin(basis[best])]
+        degenerate = tableau[row, -1] <= TOLERANCE
+        _pivot(tableau, row, col)
+        basis[row] = col
+    else:
+        raise RuntimeError(f"Simplex did not converge on a {m}x{n} game")
+
+    y = np.zeros(n)
+    in_basis = basis < n
+    y[basis[in_basis]] = tableau[:m, -1][in_basis]
+    x = tableau[m, n:n + m]
+    total = tableau[m, -1] # = sum(y) = sum(x) = 1 / value of the shifted game
+    return {
+        'row': _clean(x / total),
+        'col': _clean(y / total),
+        'value': float(1.0 / total - shift),
+    }
+
+
+def _clean(mix):
+    mix = np.where(mix > TOLERANCE, mix, 0.0)
+    return (mix / mix.sum()).tolist()
+
+
+def _solve_all(matrices):
+    return [solve_zero_sum(A) for A in matrices]
+
+
+# --- Memoizing Solver ---
+
+def parse_matrix(payoffs):
+    """A validated float64 payoff matrix, or ValueError with a message fit for the client."""
+    try:
+        A = np.array(payoffs, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("Payoffs must be a rectangular list of lists of numbers")
+    if A.ndim != 2 or 0 in A.shape:
+        raise ValueError("Payoffs must be a non-empty rectangular list of lists of numbers")
+    if max(A.shape) > MAX_SIZE:
+        raise ValueError(f"At most {MAX_SIZE} options per player")
+    if not np.isfinite(A).all():
+        raise ValueError("Payoffs must be finite numbers")
+    return A + 0.0 # Folds -0.0 into 0.0 so equal matrices hash equal
+
+
+def matrix_key(A):
+    """Canonical cache key for a parsed matrix: its shape and float64 bytes."""
+    digest = hashlib.sha1(np.array(A.shape, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(A).tobytes())
+    return digest.hexdigest()
+
+
+class StrategySolver:
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._results = OrderedDict() # matrix key -> result, least recently used first
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.solved = 0
+
+    def solve(self, payoffs, run=None):
+        return self.solve_batch([payoffs], run=run)[0]
+
+    def solve_batch(self, batch, run=None):
+        """
+        Solves a list of payoff matrices, returning one result per matrix (in order).
+        Cached and duplicate matrices are only solved once; run(func, arg) runs
+        the solving step (e.g. web_logic.offload.run_cpu), default inline.
+        """
+        if len(batch) > MAX_BATCH:
+            raise ValueError(f"At most {MAX_BATCH} matrices per batch")
+        matrices = [parse_matrix(payoffs) for payoffs in batch]
+        keys = [matrix_key(A) for A in matrices]
+
+        results = {}
+        todo = {}
+        for key, A in zip(keys, matrices):
+            if key in results or key in todo:
+                continue
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                results[key] = cached
+                self.hits += 1
+            else:
+                todo[key] = A
+                self.misses += 1
+
+        if todo:
+            solved = (run or (lambda func, arg: func(arg)))(_solve_all, list(todo.values()))
+            self.solved += len(solved)
+            for key, result in zip(todo, solved):
+                results[key] = result
+                self._put(key, result)
+        return [results[key] for key in keys]
+
+    def _put(self, key, result):
+        if self.cache_size <= 0:
+            return
+        self._results[key] = result
+        while len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'solved': self.solved,
+                'size': len(self._results)}
+
+
+def strategy_solver_from_env():
+    """StrategySolver configured from STRATEGY_CACHE_SIZE (0 disables memoization)."""
+    return StrategySolver(int(os.environ.get('STRATEGY_CACHE_SIZE', DEFAULT_CACHE_SIZE)))
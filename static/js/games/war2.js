@@ -9,7 +9,9 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- LOBBY LOGIC (war_lobby.html) ---
     const createBtn = document.getElementById('create-game-btn');
     // NOTE: Socket initialized only once per logical page (lobby OR game room)
-    const socket = io();
+    // WebSocket only: with several server workers, long-polling requests could land on
+    // a worker that doesn't hold the session (there are no sticky sessions).
+    const socket = io({ transports: ['websocket'] });
     const joinBtn = document.getElementById('join-game-btn');
     const codeInput = document.getElementById('game-code-input');
     
@@ -35,7 +37,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const roomCode = data.room_code;
             gameRoomUrl = `${window.location.origin}/war/game/${roomCode}`; 
             
-            const invitationMessage = `Let's play War!\n\nJoin Link: ${gameRoomUrl}\n\nOr go to ${window.location.origin}/war/new and enter code: ${roomCode}`;
+            const invitationMessage = `Let's play War!\n\nJoin Link: ${gameRoomUrl}\n\nOr go to ${window.location.origin}/war/new and enter code: ${roomCode}\n\nJust watching? ${window.location.origin}/war/watch/${roomCode}`;
             
             invitationTextEl.textContent = invitationMessage;
             modal.style.display = "block";
@@ -91,6 +93,12 @@ document.addEventListener('DOMContentLoaded', () => {
     if (gameBoard) {
         // The socket variable is initialized above, so we use it here.
         const roomCode = gameBoard.dataset.roomCode;
+        // Replay mode (/war/replay/<id>): the server streams a logged game to us alone
+        const replayId = gameBoard.dataset.replayId || null;
+        const replayParams = new URLSearchParams(window.location.search);
+        let replaySpeed = parseFloat(replayParams.get('speed')) || 1;
+        // Spectator mode (/war/watch/<code>): 'full' or 'results' (turn results and war climaxes)
+        const spectateView = gameBoard.dataset.spectate || null;
 
         // --- Element Refs ---
         const p0NameEl = document.getElementById('player-0-name');
@@ -133,8 +141,21 @@ document.addEventListener('DOMContentLoaded', () => {
         const speedDownBtn   = document.getElementById('speed-down-btn');
         const startBtn       = document.getElementById('start-game-btn');
 
+        // Spectators can't change the speed (the server ignores them anyway)
+        if (spectateView) {
+            [speedUpBtn, speedDownBtn].forEach((btn) => { if (btn) btn.style.display = 'none'; });
+        }
+
         let isProcessingUpdate = false;
 
+        // Delta protocol: the server sends a full 'game_state_update' snapshot
+        // (with a seq number) and then 'game_state_delta' events that only carry
+        // changed fields. We merge deltas into currentState and ask for a fresh
+        // snapshot whenever a seq number is skipped.
+        let currentState = null;
+        let lastSeq = null;
+        let syncRequested = false;
+
         // --- Helper functions ---
 
         function updateMessage(msg) {
@@ -293,6 +314,24 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // Ensure join_game is sent ONLY when socket is connected
         socket.on('connect', () => {
+            if (replayId) {
+                console.log(`Connected to server. Requesting replay of game ${replayId}`);
+                lastSeq = null;
+                currentState = null;
+                socket.emit('replay_game', {
+                    game_id: replayId,
+                    speed: replaySpeed,
+                    turn: parseInt(replayParams.get('turn'), 10) || 0
+                });
+                return;
+            }
+            if (spectateView) {
+                console.log(`Connected to server. Watching game room: ${roomCode} (${spectateView})`);
+                lastSeq = null;
+                currentState = null;
+                socket.emit('watch_game', { room_code: roomCode, view: spectateView });
+                return;
+            }
             console.log(`Connected to server. Joining game room: ${roomCode}`);
             if (typeof PLAYER_USERNAME === 'undefined' || !PLAYER_USERNAME) {
                 updateMessage("FATAL ERROR: Identity not loaded. Please check browser cookies.");
@@ -312,6 +351,10 @@ document.addEventListener('DOMContentLoaded', () => {
         });
 
         // Status messages before both players join / reconnect scenarios
+        socket.on('replay_started', (data) => {
+            if (data && typeof data.speed === 'number') replaySpeed = data.speed;
+        });
+
         socket.on('status_update', (data) => {
             if (data && data.message) {
                 updateMessage(data.message);
@@ -361,15 +404,55 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         });
 
-        // Main game state updater
-        socket.on('game_state_update', (state) => {
-            if (!state) return;
+        function renderCurrentState() {
             isProcessingUpdate = true;
             try {
-                applyState(state);
+                applyState(currentState);
             } finally {
                 isProcessingUpdate = false;
             }
+        }
+
+        function requestStateSync() {
+            if (syncRequested) return;
+            syncRequested = true;
+            console.warn(`Missed a state update (last seq ${lastSeq}); requesting full state.`);
+            socket.emit('request_state_sync', { room_code: roomCode, seq: lastSeq });
+        }
+
+        function mergeDelta(changes) {
+            Object.keys(changes).forEach((key) => {
+                const value = changes[key];
+                const current = currentState[key];
+                // Stats blocks arrive as partial objects; everything else replaces outright
+                if (value && current && typeof value === 'object' && !Array.isArray(value)) {
+                    currentState[key] = Object.assign({}, current, value);
+                } else {
+                    currentState[key] = value;
+                }
+            });
+        }
+
+        // Full snapshot (first state of a game, joining mid-game, or after a sync request)
+        socket.on('game_state_update', (state) => {
+            if (!state) return;
+            currentState = state;
+            if (typeof state.seq === 'number') lastSeq = state.seq;
+            syncRequested = false;
+            renderCurrentState();
+        });
+
+        // Incremental update: only the fields that changed since seq - 1
+        socket.on('game_state_delta', (delta) => {
+            if (!delta || typeof delta.seq !== 'number') return;
+            if (lastSeq !== null && delta.seq <= lastSeq) return; // Already covered by a snapshot
+            if (currentState === null || delta.seq !== lastSeq + 1) {
+                requestStateSync();
+                return;
+            }
+            mergeDelta(delta.changes || {});
+            lastSeq = delta.seq;
+            renderCurrentState();
         });
 
         // --- Button Event Listeners ---
@@ -385,6 +468,10 @@ document.addEventListener('DOMContentLoaded', () => {
 
         if (speedUpBtn) {
             speedUpBtn.addEventListener('click', () => {
+                if (replayId) {
+                    socket.emit('replay_speed', { speed: replaySpeed * 2 });
+                    return;
+                }
                 if (isProcessingUpdate) return;
                 console.log('Emitting speed change: -0.1');
                 socket.emit('change_speed', { room_code: roomCode, change: -0.1 });
@@ -393,6 +480,10 @@ document.addEventListener('DOMContentLoaded', () => {
 
         if (speedDownBtn) {
             speedDownBtn.addEventListener('click', () => {
+                if (replayId) {
+                    socket.emit('replay_speed', { speed: replaySpeed / 2 });
+                    return;
+                }
                 if (isProcessingUpdate) return;
                 console.log('Emitting speed change: +0.1');
                 socket.emit('change_speed', { room_code: roomCode, change: 0.1 });
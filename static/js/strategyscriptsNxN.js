@@ -2,6 +2,7 @@
 let calculationData = {};
 let allCalculations = [];
 let currentView = 'options-setup';
+const MAX_OPTIONS = 12;
 
 document.addEventListener('DOMContentLoaded', init);
 
@@ -48,8 +49,8 @@ function addOption() {
     const p2OptionsContainer = document.getElementById('player2-options-container');
     const existingOptions = p1OptionsContainer.querySelectorAll('.option-group').length;
 
-    if (existingOptions >= 6) {
-        alert("You can only have up to 6 options per player.");
+    if (existingOptions >= MAX_OPTIONS) {
+        alert(`You can only have up to ${MAX_OPTIONS} options per player.`);
         return;
     }
 
@@ -97,7 +98,7 @@ function updateOptionButtons() {
     const addBtn = document.getElementById('add-option-btn');
     const removeBtn = document.getElementById('remove-option-btn');
 
-    if (existingOptions >= 6) {
+    if (existingOptions >= MAX_OPTIONS) {
         addBtn.disabled = true;
         addBtn.style.opacity = 0.5;
     } else {
@@ -171,7 +172,7 @@ function showMatrixView() {
 }
 
 
-function showResultsView() {
+async function showResultsView() {
     const p1Options = getOptions('player1');
     const p2Options = getOptions('player2');
     const size = p1Options.length;
@@ -190,7 +191,7 @@ function showResultsView() {
         }
     }
     
-    const result = calculateNxNNash(payoffs, size);
+    const result = await solveNxNOnServer(payoffs, size);
     
     updateScenarioDate();
 
@@ -210,6 +211,30 @@ function showResultsView() {
     showSection('results');
 }
 
+// Exact equilibrium from the server (math_logic/strategy.py); falls back to the
+// pairwise approximation below if the request fails (e.g. offline)
+async function solveNxNOnServer(payoffs, size) {
+    try {
+        const res = await fetch('/tonys-strategy-calculator-NxN/solve', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ payoffs })
+        });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const { result } = await res.json();
+        const player1 = {};
+        const player2 = {};
+        for (let i = 0; i < size; i++) {
+            player1[`p${i+1}`] = (result.row[i] * 100).toFixed(1);
+            player2[`q${i+1}`] = (result.col[i] * 100).toFixed(1);
+        }
+        return { player1, player2, value: result.value.toFixed(1), exact: true };
+    } catch (err) {
+        console.warn('Server solve failed, using the pairwise approximation:', err);
+        return calculateNxNNash(payoffs, size);
+    }
+}
+
 function calculateNxNNash(payoffs, size) {
     const p1_raw_strategies = new Array(size).fill(0);
     const p2_raw_strategies = new Array(size).fill(0);
@@ -369,8 +394,11 @@ function renderResults() {
                 </div>
             </div>
         </div>
+        ${strat.value !== undefined ? `<p style="text-align:center; margin-top:1rem;">Expected result: <strong>${strat.value}%</strong> of points to ${p1.name}</p>` : ''}
         <p class="subtitle-text" style="text-align:center; margin-top:2rem; font-style: italic;">
-          *Note: This calculator uses a simplified pairwise method to approximate the mixed strategy Nash Equilibrium.
+          ${strat.exact
+            ? '*Note: These are the exact mixed strategy Nash Equilibrium plans for this matrix.'
+            : '*Note: This calculator uses a simplified pairwise method to approximate the mixed strategy Nash Equilibrium.'}
         </p>
     `;
     resultsContainer.innerHTML = html;
@@ -0,0 +1,46 @@
+"""
+Shared fixtures. Tests run without the web app (no `import app`, so nothing is
+monkey-patched); the War manager gets a recording stand-in for Socket.IO.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeSocketIO:
+    """Records emits instead of sending them; background tasks never run."""
+
+    def __init__(self):
+        self.emitted = [] # (event, data, to)
+
+    def emit(self, event, data=None, to=None, **kwargs):
+        self.emitted.append((event, data, to))
+
+    def start_background_task(self, target, *args, **kwargs):
+        return None
+
+    def sleep(self, seconds=0):
+        pass
+
+    def sent_to(self, to):
+        return [(event, data) for event, data, target in self.emitted if target == to]
+
+
+@pytest.fixture
+def war(monkeypatch):
+    """game_logic.manager wired to a FakeSocketIO, a real TurnScheduler and an InMemoryBackend."""
+    from game_logic import manager
+    from game_logic.backend import InMemoryBackend
+    from game_logic.scheduler import TurnScheduler
+
+    sio = FakeSocketIO()
+    monkeypatch.setattr(manager, 'sio', sio)
+    monkeypatch.setattr(manager, 'scheduler', TurnScheduler(sio))
+    monkeypatch.setattr(manager, 'backend', InMemoryBackend())
+    monkeypatch.setattr(manager, 'game_log', None)
+    monkeypatch.setattr(manager, 'snapshot_store', None)
+    monkeypatch.setattr(manager, 'games', {})
+    return manager
@@ -0,0 +1,102 @@
+import pytest
+
+from game_logic.backend import InMemoryBackend, RespBackend, check_worker_count
+from game_logic.room_codes import RoomCodePool
+
+
+def shard(index, count=4):
+    backend = RespBackend('redis://localhost:1', shard_count=count) # Never connects in these tests
+    backend.shard_index = index
+    return backend
+
+
+def test_pool_only_hands_out_codes_the_shard_owns():
+    backends = [shard(i) for i in range(4)]
+    owned = []
+    for backend in backends:
+        pool = RoomCodePool(length=2) # shard_for_code() assumes the default alphabet
+        codes = []
+        while (code := pool.allocate(accept=backend.accepts_index)) is not None:
+            codes.append(code)
+        assert codes and all(backend.owns(code) for code in codes)
+        assert all(other.shard_for_code(code) == backend.shard_index for code in codes for other in backends)
+        owned.append(set(codes))
+
+    everything = set().union(*owned)
+    assert len(everything) == sum(map(len, owned)) == 31 ** 2 # Disjoint, and together the whole space
+
+
+def test_codes_route_to_their_owner():
+    backend = shard(2)
+    pool = RoomCodePool()
+    code = pool.allocate(accept=shard(3).accepts_index)
+    assert backend.shard_for_code(code) == 3
+    assert not backend.owns(code)
+    assert backend.shard_for_code('not a code!') == 2 # Unknown codes are handled locally
+
+
+def test_in_memory_backend_owns_everything():
+    backend = InMemoryBackend()
+    assert backend.owns('abcd') and backend.accepts_index(12345)
+
+
+def test_several_workers_need_a_message_queue(monkeypatch):
+    monkeypatch.delenv('SOCKETIO_MESSAGE_QUEUE', raising=False)
+    check_worker_count(1)
+    with pytest.raises(RuntimeError, match='SOCKETIO_MESSAGE_QUEUE'):
+        check_worker_count(2)
+    monkeypatch.setenv('SOCKETIO_MESSAGE_QUEUE', 'redis://localhost:6379')
+    check_worker_count(4)
+
+
+@pytest.fixture
+def standin():
+    """A Redis-protocol stand-in on a free local port; yields its URL."""
+    import threading
+
+    from game_logic import resp_standin
+    resp_standin.RespHandler.state = resp_standin.StandinState()
+    server = resp_standin.ThreadingServer(('127.0.0.1', 0), resp_standin.RespHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_lease_renewal_never_takes_over_another_workers_shard(standin):
+    first, second = RespBackend(standin, shard_count=4), RespBackend(standin, shard_count=4)
+    assert first.claim_shard() == 0 and second.claim_shard() == 1
+    assert first.renew_lease()
+
+    # The lease lapsed (say first stalled) and a newcomer took the shard over
+    key = first._shard_key(0)
+    first.client.execute('SET', key, 'newcomer', 'EX', 30)
+    assert not first.renew_lease()
+    assert first.client.execute('GET', key) == b'newcomer'
+
+    lost = []
+    first._on_lost = lost.append
+    first._lose_shard()
+    assert lost == [0] and first.shard_index == 2 # Stops serving 0 and claims a free shard instead
+    assert first.client.execute('GET', key) == b'newcomer'
+
+    # A lease that lapsed with nobody else claiming it is simply taken back
+    second.client.execute('DEL', second._shard_key(1))
+    assert second.renew_lease() and second.client.execute('GET', second._shard_key(1)) == second.worker_id.encode()
+
+
+def test_lost_shard_rooms_are_closed(war, monkeypatch):
+    monkeypatch.setattr(war, 'backend', shard(1))
+    codes = [war.create_new_game() for _ in range(3)]
+    game = war.games[codes[0]]
+    game.players = {'sid0': {'index': 0, 'username': 'Ann'}, 'sid1': {'index': 1, 'username': 'Bob'}}
+    game.start_game()
+    recycled = len(war.room_code_pool._recycled)
+
+    war._close_lost_shard(0) # Not ours: nothing happens
+    assert sorted(war.games) == sorted(codes)
+    war.backend.shard_index = None
+    war._close_lost_shard(1)
+    assert war.games == {} and not game.game_in_progress
+    assert len(war.room_code_pool._recycled) == recycled # The codes now belong to the new owner
+    assert war.create_new_game() is None
@@ -0,0 +1,88 @@
+import math
+
+import pytest
+
+from math_logic import beal
+from math_logic.beal import Searcher
+
+
+def brute_force(max_base, max_exp):
+    """Every A^x + B^y = C^z in range with A <= B (A = 1 only with x = 3), by exact arithmetic."""
+    powers = {}
+    for C in range(2, max_base + 1):
+        for z in range(3, max_exp + 1):
+            powers.setdefault(C ** z, []).append((C, z))
+    found = []
+    for A in range(1, max_base + 1):
+        for x in ([3] if A == 1 else range(3, max_exp + 1)):
+            for B in range(A, max_base + 1):
+                for y in range(3, max_exp + 1):
+                    found += [[A, x, B, y, C, z] for C, z in powers.get(A ** x + B ** y, [])]
+    return sorted(found)
+
+
+def search(max_base, max_exp, blocks=3):
+    searcher = Searcher(max_base, max_exp, include_common=True)
+    results = [searcher.search_block(block, blocks) for block in range(blocks)]
+    return sorted(s for r in results for s in r['solutions'] + r['counterexamples']), results
+
+
+def test_search_matches_brute_force():
+    found, results = search(40, 7)
+    assert found == brute_force(40, 7)
+    assert [2, 3, 2, 3, 2, 4] in found and [3, 3, 6, 3, 3, 5] in found
+    assert not any(r['counterexamples'] for r in results)
+
+
+def test_collisions_are_verified_away(monkeypatch):
+    monkeypatch.setattr(beal, 'PRIMES', (13, 17)) # Tiny moduli: most fingerprints collide
+    found, results = search(20, 5)
+    assert found == brute_force(20, 5)
+    assert sum(r['collisions'] for r in results) > 0
+
+
+def test_every_matching_power_is_recorded():
+    searcher = Searcher(8, 6, include_common=True)
+    result = {'collisions': 0, 'counterexamples': [], 'solutions': []}
+    searcher._verify(result, 2, 5, 2, 5, beal.fingerprint(64 % beal.PRIMES[0], 64 % beal.PRIMES[1]))
+    assert sorted(result['solutions']) == [[2, 5, 2, 5, 2, 6], [2, 5, 2, 5, 4, 3]] # 2^6 = 4^3
+    assert result['collisions'] == 0
+
+
+def test_fingerprint_hit_without_a_match_is_a_collision():
+    searcher = Searcher(8, 6)
+    result = {'collisions': 0, 'counterexamples': [], 'solutions': []}
+    searcher._verify(result, 1, 3, 2, 3, beal.fingerprint(64 % beal.PRIMES[0], 64 % beal.PRIMES[1]))
+    assert result == {'collisions': 1, 'counterexamples': [], 'solutions': []}
+
+
+def test_coprime_search_skips_common_factors():
+    searcher = Searcher(40, 7)
+    results = [searcher.search_block(block, 2) for block in range(2)]
+    assert not any(r['solutions'] or r['counterexamples'] for r in results)
+    assert all(math.gcd(s[0], s[2]) > 1 for s in brute_force(40, 7) if s[0] > 1)
+
+
+def test_interrupted_run_resumes(tmp_path, monkeypatch):
+    expected = beal.run(30, 5, include_common=True, directory=str(tmp_path / 'full'))
+    assert expected['finished'] and len(expected['done']) == expected['blocks'] == 30
+
+    search_task = beal._search_task
+    calls = []
+
+    def interrupted(task):
+        calls.append(task)
+        if len(calls) > 12:
+            raise KeyboardInterrupt
+        return search_task(task)
+
+    monkeypatch.setattr(beal, '_search_task', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        beal.run(30, 5, include_common=True, directory=str(tmp_path / 'resumed'))
+    monkeypatch.setattr(beal, '_search_task', search_task)
+    state = beal.run(30, 5, include_common=True, directory=str(tmp_path / 'resumed'))
+
+    assert state['finished'] and sorted(state['done']) == list(range(30))
+    assert state['pairs'] == expected['pairs']
+    assert sorted(state['solutions']) == sorted(expected['solutions'])
+    assert beal.list_runs(str(tmp_path / 'resumed'))[0]['progress'] == 1
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from math_logic.equation_lab import MAX_DEPTH, compile_expression
+
+
+def test_compiles_arithmetic_over_arrays():
+    f, used = compile_expression('G*M/r**2 + sin(pi*0)', ['G', 'M', 'r', 'unused'])
+    assert used == {'G', 'M', 'r'}
+    assert f(G=2.0, M=3.0, r=np.array([1.0, 2.0])).tolist() == [6.0, 1.5]
+
+
+@pytest.mark.parametrize('expression', [
+    '', 'x.real', 'x[0]', '__import__("os")', 'y + 1', '"a"', 'max(x, key=x)', '1 +',
+    '-' * 990 + 'x', # Legal length, but deep enough to overflow a recursive walk
+    '+'.join(['x'] * 250), # Left-nested sum
+    'x' * 1001,
+])
+def test_rejects_anything_else_as_value_error(expression):
+    with pytest.raises(ValueError):
+        compile_expression(expression, ['x'])
+
+
+def test_nesting_up_to_the_limit_compiles():
+    f, _ = compile_expression('-' * (MAX_DEPTH - 2) + 'x', ['x'])
+    assert f(x=1.0) == 1.0
@@ -0,0 +1,106 @@
+import pytest
+import sqlalchemy as sa
+
+from game_logic import game_log as game_records
+from tests.test_state_deltas import new_game
+
+
+def record(seed, **fields):
+    return {'seed': seed, 'finished_at': 1700000000, 'turns': 412, 'wars': 23,
+            'result': game_records.RESULT_P1_WINS, 'usernames': ['Ann', 'Zoë'],
+            'events': [(0, game_records.EVENT_SPEED, 10), (57, game_records.EVENT_SPEED, 6)], **fields}
+
+
+def test_record_round_trip():
+    data = game_records.encode_record(record(0xdeadbeefcafef00d))
+    assert game_records.decode_record(data) == {**record(0xdeadbeefcafef00d), 'game_id': 'deadbeefcafef00d'}
+
+
+def test_record_rejects_other_data():
+    with pytest.raises(ValueError):
+        game_records.decode_record(b'WG' + bytes(40))
+
+
+@pytest.mark.parametrize('make_log', [
+    lambda tmp_path: game_records.FileGameLog(str(tmp_path / 'games.log')),
+    lambda tmp_path: game_records.SqlGameLog(sa.create_engine(f"sqlite:///{tmp_path / 'games.db'}")),
+], ids=['file', 'sql'])
+def test_logs_find_records_by_game_id(tmp_path, make_log):
+    log = make_log(tmp_path)
+    first, second = game_records.encode_record(record(1)), game_records.encode_record(record(2, turns=7))
+    log.append(first)
+    assert log.get(game_records.game_id_for_seed(1)) == first
+    log.append(second) # Appended after the first lookup indexed the file
+    assert log.get(game_records.game_id_for_seed(2)) == second
+    assert log.get(game_records.game_id_for_seed(3)) is None
+
+
+def test_file_log_sees_other_appenders(tmp_path):
+    path = str(tmp_path / 'games.log')
+    reader, writer = game_records.FileGameLog(path), game_records.FileGameLog(path)
+    assert reader.get('0000000000000005') is None
+    writer.append(game_records.encode_record(record(5)))
+    assert game_records.decode_record(reader.get('0000000000000005'))['seed'] == 5
+
+
+def test_replay_reproduces_the_logged_game(war, tmp_path, monkeypatch):
+    monkeypatch.setattr(war, 'game_log', game_records.FileGameLog(str(tmp_path / 'games.log')))
+    game = new_game(war, seed=2024)
+    game._record_event(game_records.EVENT_SPEED, 10)
+    messages = []
+    for step in range(200000):
+        if step == 40:
+            game.change_speed(-0.5) # Logged as an event and replayed at the same step
+        if game.advance() is None:
+            break
+        messages.append(game.last_state['message'])
+
+    logged = war.get_game_record(game_records.game_id_for_seed(2024))
+    assert logged['turns'] == game.total_hands_played - 1
+    assert logged['events'] == game.events
+
+    replay = war.ReplayGame(logged, 'viewer')
+    replayed = []
+    while replay.advance() is not None:
+        replayed.append(replay.last_state['message'])
+    assert replayed == messages
+    assert replay._result() == game._result()
+
+
+def test_speed_spam_records_one_event_per_step(war):
+    game = new_game(war, seed=3)
+    game.events = []
+    for _ in range(1000):
+        game.change_speed(-0.5)
+        game.change_speed(0.5)
+    game.change_speed(war.MIN_SPEED_DELAY - game.base_delay - 1) # Clamped
+    game.change_speed(-0.1) # Already at the minimum: nothing to record
+    assert game.events == [(0, game_records.EVENT_SPEED, int(war.MIN_SPEED_DELAY * 10))]
+    game.advance()
+    game.change_speed(0.2)
+    assert game.events[-1] == (1, game_records.EVENT_SPEED, int(war.MIN_SPEED_DELAY * 10) + 2)
+
+
+def test_unloggable_game_still_ends(war, tmp_path, monkeypatch):
+    monkeypatch.setattr(war, 'game_log', game_records.FileGameLog(str(tmp_path / 'games.log')))
+    game = new_game(war, seed=4)
+    game.events = [(step, game_records.EVENT_SPEED, 10) for step in range(70000)] # Too many to encode
+    game.end_game("Game over")
+    assert not game.game_in_progress
+    assert war.game_log.get(game_records.game_id_for_seed(4)) is None
+
+
+def test_snapshot_failure_skips_only_that_room(war, monkeypatch):
+    saved = []
+    monkeypatch.setattr(war, 'snapshot_store', object())
+    monkeypatch.setattr(war, '_dirty_rooms', {'test', 'good'})
+    monkeypatch.setattr(war, '_deleted_rooms', set())
+    monkeypatch.setattr(war.sio, 'start_background_task',
+                        lambda target, *args: saved.append(args) if target is war._write_snapshots else None)
+    broken = new_game(war, seed=5)
+    broken.events = [(step, game_records.EVENT_SPEED, 10) for step in range(70000)]
+    war.games['good'] = war.WarGame('good')
+
+    war._flush_snapshots(60)
+    batch, deleted = saved[0]
+    assert list(batch) == ['good'] and not war._dirty_rooms
@@ -0,0 +1,103 @@
+import pytest
+from flask import Flask, g
+from flask_sqlalchemy import SQLAlchemy
+
+from web_logic import identity
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """A minimal app with the identity hooks; the UserWriter is flushed by hand."""
+    monkeypatch.setenv('USER_PRUNE_DAYS', '0')
+    monkeypatch.setattr(identity.UserWriter, 'start', lambda self: None)
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test-secret', SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'users.db'}")
+    db = SQLAlchemy(app)
+
+    class User(db.Model):
+        id = db.Column(db.String(36), primary_key=True)
+        username = db.Column(db.String(20), nullable=False, default='Player1')
+        email = db.Column(db.String(120), unique=True, nullable=True)
+        password_hash = db.Column(db.String(60), nullable=True)
+        last_seen = db.Column(db.DateTime, nullable=True, index=True)
+
+    @app.route('/')
+    def whoami():
+        return f"{g.user.id} {g.user.username}"
+
+    @app.route('/email')
+    def email():
+        return g.user.email or ''
+
+    @app.route('/rename/<name>')
+    def rename(name):
+        g.user.username = name
+        return ''
+
+    with app.app_context():
+        db.create_all()
+    identity.init_identity(app, db, User)
+    app.db, app.User = db, User
+    return app
+
+
+def signed_identity(client):
+    cookie = client.get_cookie(identity.IDENTITY_COOKIE_NAME)
+    return cookie and identity.read_identity({identity.IDENTITY_COOKIE_NAME: cookie.value})
+
+
+def test_new_visitor_gets_a_signed_cookie_and_no_row(site):
+    client = site.test_client()
+    user_id, username = client.get('/').text.split()
+    assert username == identity.DEFAULT_USERNAME
+    assert signed_identity(client) == (user_id, username)
+
+    # The cookie is enough to recognise them again, still without a row
+    response = client.get('/')
+    assert response.text == f"{user_id} {username}"
+    assert 'Set-Cookie' not in response.headers
+    with site.app_context():
+        assert site.db.session.get(site.User, user_id) is None
+
+
+def test_tampered_cookie_is_a_new_visitor(site):
+    client = site.test_client()
+    user_id = client.get('/').text.split()[0]
+    token = client.get_cookie(identity.IDENTITY_COOKIE_NAME).value
+    client.set_cookie(identity.IDENTITY_COOKIE_NAME, token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB'))
+    assert client.get('/').text.split()[0] != user_id
+
+
+def test_rename_reissues_the_cookie_and_writes_the_row(site):
+    client = site.test_client()
+    user_id = client.get('/').text.split()[0]
+    client.get('/rename/Ann')
+    assert signed_identity(client) == (user_id, 'Ann')
+    assert client.get('/').text == f"{user_id} Ann"
+
+    assert identity.user_writer.flush() == 1
+    with site.app_context():
+        assert site.db.session.get(site.User, user_id).username == 'Ann'
+
+
+def test_legacy_cookie_is_migrated_to_a_signed_one(site):
+    with site.app_context():
+        site.db.session.add(site.User(id='legacy-user', username='Old', email='old@example.com'))
+        site.db.session.commit()
+    client = site.test_client()
+    client.set_cookie(identity.LEGACY_COOKIE_NAME, 'legacy-user')
+
+    assert client.get('/').text == 'legacy-user Old'
+    assert signed_identity(client) == ('legacy-user', 'Old')
+
+    # From now on the signed cookie alone identifies them, and other columns still load
+    client.delete_cookie(identity.LEGACY_COOKIE_NAME)
+    assert client.get('/').text == 'legacy-user Old'
+    assert client.get('/email').text == 'old@example.com'
+
+
+def test_unknown_legacy_cookie_is_a_new_visitor(site):
+    client = site.test_client()
+    client.set_cookie(identity.LEGACY_COOKIE_NAME, 'no-such-user')
+    user_id, username = client.get('/').text.split()
+    assert user_id != 'no-such-user' and username == identity.DEFAULT_USERNAME
@@ -0,0 +1,39 @@
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+
+from web_logic.metrics import Metrics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    monkeypatch.delenv('METRICS_PUBLIC', raising=False)
+    app = Flask(__name__)
+    metrics = Metrics()
+    metrics.add_collector(lambda writer: writer.gauge('wescoup_rooms', "Rooms", 3))
+    metrics.init_app(app, sa.create_engine('sqlite://'))
+    return app.test_client()
+
+
+REMOTE = {'REMOTE_ADDR': '203.0.113.9'}
+
+
+def test_closed_to_the_public_by_default(client):
+    assert client.get('/metrics', environ_base=REMOTE).status_code == 404
+    assert client.get('/metrics', headers={'X-Forwarded-For': '203.0.113.9'}).status_code == 404
+    local = client.get('/metrics') # The test client connects from 127.0.0.1
+    assert local.status_code == 200 and 'wescoup_rooms 3' in local.text
+
+
+def test_token_is_required_when_set(client, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'sekrit')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', environ_base=REMOTE, headers={'Authorization': 'Bearer nope'}).status_code == 401
+    response = client.get('/metrics', environ_base=REMOTE, headers={'Authorization': 'Bearer sekrit'})
+    assert response.status_code == 200 and response.headers['Cache-Control'] == 'no-store'
+
+
+def test_can_be_opened_explicitly(client, monkeypatch):
+    monkeypatch.setenv('METRICS_PUBLIC', '1')
+    assert client.get('/metrics', environ_base=REMOTE).status_code == 200
@@ -0,0 +1,89 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from web_logic import page_cache
+from web_logic.page_cache import PageCache
+
+BODY = '<html>' + 'War never changes. ' * 100 + '</html>'
+
+
+@pytest.fixture
+def site():
+    app = Flask(__name__)
+    app.cache = PageCache(max_age=60)
+    app.renders = 0
+
+    @app.route('/about')
+    @app.cache.page
+    def about():
+        app.renders += 1
+        return BODY
+
+    @app.route('/tiny')
+    @app.cache.page
+    def tiny():
+        return 'hi'
+
+    return app
+
+
+def test_page_renders_once(site):
+    client = site.test_client()
+    for _ in range(3):
+        response = client.get('/about')
+        assert response.status_code == 200 and response.text == BODY
+    assert site.renders == 1
+    assert site.cache.stats() == {'pages': 1, 'hits': 2, 'misses': 1, 'not_modified': 0}
+    assert response.cache_control.public and response.cache_control.max_age == 60
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_variant_follows_accept_encoding(site, monkeypatch):
+    monkeypatch.setattr(page_cache, 'brotli', None)
+    client = site.test_client()
+    plain = client.get('/about')
+    assert 'Content-Encoding' not in plain.headers
+
+    zipped = client.get('/about', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()).decode() == BODY
+    assert zipped.get_etag()[0] != plain.get_etag()[0]
+
+    refused = client.get('/about', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in refused.headers
+
+
+def test_brotli_is_preferred_when_available(site):
+    brotli = pytest.importorskip('brotli')
+    response = site.test_client().get('/about', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.get_data()).decode() == BODY
+
+
+def test_small_pages_are_not_compressed(site):
+    response = site.test_client().get('/tiny', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in response.headers and response.text == 'hi'
+
+
+def test_matching_etag_gets_a_bare_304(site, monkeypatch):
+    monkeypatch.setattr(page_cache, 'brotli', None)
+    client = site.test_client()
+    etag = client.get('/about', headers={'Accept-Encoding': 'gzip'}).get_etag()[0]
+
+    response = client.get('/about', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304 and response.get_data() == b''
+    assert response.get_etag()[0] == etag
+    assert site.cache.not_modified == 1
+
+    stale = client.get('/about', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"something-else"'})
+    assert stale.status_code == 200 and site.renders == 1
+
+
+def test_debug_mode_bypasses_the_cache(site):
+    site.debug = True
+    client = site.test_client()
+    client.get('/about')
+    client.get('/about')
+    assert site.renders == 2 and site.cache.stats()['pages'] == 0
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from math_logic import primes
+from math_logic.primes import PrimeTable, standard_sieve
+
+LIMIT = 50000
+
+
+@pytest.fixture
+def reference():
+    return np.flatnonzero(standard_sieve(LIMIT))
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    monkeypatch.setattr(primes, 'SEGMENT_NUMBERS', 4096) # Many segments, so ranges cross their edges
+    return PrimeTable(str(tmp_path / 'primes'), online_limit=LIMIT)
+
+
+def test_counts_match_a_reference_sieve(table, reference):
+    rng = np.random.default_rng(22)
+    ranges = [(0, 0), (0, 1), (0, 2), (0, 3), (2, 3), (3, 4), (0, LIMIT), (4095, 4097), (4096, 8192),
+              *(sorted(rng.integers(0, LIMIT, 2)) for _ in range(300))]
+    for start, stop in ranges:
+        expected = reference[(reference >= start) & (reference < stop)]
+        assert table.count(start, stop) == len(expected), (start, stop)
+        assert table.primes(start, stop).tolist() == expected.tolist(), (start, stop)
+
+
+def test_streamed_chunks_cover_the_range(table, reference):
+    chunks = list(table.iter_primes(13, 30011, chunk=1000))
+    assert np.concatenate(chunks).tolist() == reference[(reference >= 13) & (reference < 30011)].tolist()
+
+
+def test_table_grows_only_by_missing_segments(table, tmp_path):
+    table.count(0, 5000)
+    assert table.limit == 8192 and table.segments_sieved == 2
+    table.count(100, 8000)
+    assert table.segments_sieved == 2
+    table.count(0, 10000)
+    assert table.limit == 12288 and table.segments_sieved == 3
+
+    # Another worker's table reads what was published, and sees later growth once it needs the range
+    other = PrimeTable(table.path, online_limit=LIMIT)
+    assert other.limit == 12288 and other.count(0, 12288) == table.count(0, 12288)
+    table.count(0, 20000)
+    assert other.count(0, 20000) == table.count(0, 20000) and other.segments_sieved == 0
+
+
+def test_parallel_extend_matches_serial(tmp_path, monkeypatch, reference):
+    monkeypatch.setattr(primes, 'SEGMENT_NUMBERS', 4096)
+    parallel = PrimeTable(str(tmp_path / 'parallel'), online_limit=0)
+    parallel.ensure(LIMIT, workers=2)
+    assert parallel.count(0, LIMIT) == len(reference)
+
+
+def test_ranges_beyond_the_online_limit_are_refused(table):
+    with pytest.raises(ValueError):
+        table.count(0, LIMIT + 1)
+    with pytest.raises(ValueError):
+        table.count(10, 5)
+    assert table.limit == 0
+
+
+@pytest.mark.parametrize('level', [level for _, level in primes.LEVELS])
+def test_benchmark_levels_agree(level):
+    assert level(10007).tolist() == standard_sieve(10007).tolist()
@@ -0,0 +1,61 @@
+import pytest
+
+from math_logic import redshift
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = str(tmp_path / 'catalog.csv')
+    redshift.synthesize(path, 3000, seed=25)
+    return path
+
+
+def test_byte_ranges_split_lines_exactly_once(tmp_path, monkeypatch):
+    path = tmp_path / 'small.csv'
+    path.write_bytes(b'z,d\n0.1,400\n0.25,1000\n\n0.5,2100\n1,4400\n2,9000')
+    lines = path.read_bytes().decode().splitlines(keepends=True)[1:]
+    size = path.stat().st_size
+    for range_bytes in range(1, size + 2): # Every way a range edge can fall: mid-line, on a newline, on a line start
+        monkeypatch.setattr(redshift, 'RANGE_BYTES', range_bytes)
+        read = [line for start, end in redshift.byte_ranges(str(path))
+                for block in redshift._read_lines(str(path), start, end) for line in block]
+        assert read == lines, range_bytes
+
+
+def test_fit_does_not_depend_on_range_size(catalog, monkeypatch):
+    whole = redshift.fit_file(catalog, replicates=20)
+    monkeypatch.setattr(redshift, 'RANGE_BYTES', 997) # Dozens of ranges, edges mid-line
+    assert len(redshift.byte_ranges(catalog)) > 50
+    split = redshift.fit_file(catalog, replicates=20)
+
+    assert split['rows'] == whole['rows'] == 3000 and split['skipped'] == whole['skipped'] == 0
+    assert split['z_range'] == whole['z_range']
+    assert split['decay']['k_per_mpc'] == pytest.approx(whole['decay']['k_per_mpc'])
+    assert split['expansion']['h0'] == pytest.approx(whole['expansion']['h0'])
+    assert split['expansion']['h0'] == pytest.approx(70, rel=0.01)
+    assert split['delta_aic'] == pytest.approx(whole['delta_aic']) and split['preferred'] == 'expansion'
+
+
+def test_worker_count_does_not_change_the_result(catalog, monkeypatch):
+    monkeypatch.setattr(redshift, 'RANGE_BYTES', 20000)
+    serial = redshift.fit_file(catalog, replicates=20)
+    parallel = redshift.fit_file(catalog, workers=2, replicates=20)
+    serial.pop('seconds'), parallel.pop('seconds')
+    assert parallel == serial
+
+
+def test_unusable_rows_are_skipped(tmp_path):
+    path = tmp_path / 'messy.csv'
+    path.write_text('Z,Distance\n0.1,400\nfoo,bar\n0.2,-5\n30,1\n0.3,1250\n0.4,1700\n')
+    result = redshift.fit_file(str(path), replicates=10)
+    assert result['rows'] == 3 and result['skipped'] == 3 and result['z_range'] == [0.1, 0.4]
+
+
+def test_cached_fit(catalog, tmp_path):
+    cache = redshift.FitCache(str(tmp_path / 'cache'))
+    first, cached = redshift.cached_fit(catalog, cache, replicates=10)
+    assert not cached and first['dataset'] == redshift.file_digest(catalog)
+    again, cached = redshift.cached_fit(catalog, cache, replicates=10)
+    assert cached and again['expansion']['h0'] == first['expansion']['h0']
+    _, cached = redshift.cached_fit(catalog, cache, replicates=11)
+    assert not cached
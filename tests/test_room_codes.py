@@ -0,0 +1,56 @@
+from game_logic.room_codes import ROOM_CODE_ALPHABET, RoomCodePool, code_to_index
+
+
+def small_pool(key=b'k' * 16):
+    return RoomCodePool(alphabet='abcde', length=3, key=key) # 125 codes
+
+
+def test_permutation_covers_the_code_space_once():
+    pool = RoomCodePool(key=b'0123456789abcdef')
+    indexes = [pool.permute(position) for position in range(0, pool.size, 97)]
+    assert len(set(indexes)) == len(indexes)
+    assert all(0 <= index < pool.size for index in indexes)
+
+    pool = small_pool()
+    assert sorted(pool.permute(position) for position in range(pool.size)) == list(range(pool.size))
+
+
+def test_allocates_every_code_then_recycles():
+    pool = small_pool()
+    codes = [pool.allocate() for _ in range(pool.size)]
+    assert len(set(codes)) == pool.size == 125
+    assert pool.allocate() is None
+
+    pool.release(codes[3])
+    pool.release(codes[1])
+    assert len(pool) == 2
+    assert [pool.allocate(), pool.allocate(), pool.allocate()] == [codes[3], codes[1], None]
+
+
+def test_skips_taken_codes():
+    pool = small_pool()
+    first = pool.allocate()
+    other = small_pool()
+    assert other.allocate(is_taken={first}.__contains__) != first
+
+
+def test_code_index_round_trip():
+    pool = RoomCodePool()
+    for index in (0, 1, 30, 31, pool.size - 1):
+        assert pool.code_to_index(pool.index_to_code(index)) == index
+    assert code_to_index('aaab') == 1
+    assert len(pool.index_to_code(pool.size - 1)) == 4
+    assert set(pool.index_to_code(pool.size - 1)) == {ROOM_CODE_ALPHABET[-1]}
+
+
+def test_order_depends_only_on_the_secret_key():
+    codes = lambda pool: [pool.allocate() for _ in range(20)]
+    assert codes(small_pool(b'a' * 16)) == codes(small_pool(b'a' * 16))
+    assert codes(small_pool(b'a' * 16)) != codes(small_pool(b'b' * 16))
+
+
+def test_consecutive_codes_do_not_reveal_a_step():
+    pool = RoomCodePool(key=b'fixed key for ci')
+    indexes = [pool.code_to_index(pool.allocate()) for _ in range(50)]
+    steps = {(b - a) % pool.size for a, b in zip(indexes, indexes[1:])}
+    assert len(steps) > 40 # An affine walk has exactly one
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from game_logic.scheduler import TurnScheduler
+
+
+class ThreadedSocketIO:
+    """Runs background tasks on real threads, like eventlet would on green ones."""
+
+    def __init__(self):
+        self.emitted = []
+
+    def start_background_task(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def sleep(self, seconds=0):
+        time.sleep(seconds)
+
+    def emit(self, event, data=None, to=None):
+        self.emitted.append((event, data, to))
+
+
+def counting_ticks(scheduler):
+    ticks = []
+    tick = scheduler.tick
+
+    def counted():
+        ticks.append(time.monotonic())
+        return tick()
+    scheduler.tick = counted
+    return ticks
+
+
+def test_idle_scheduler_does_not_poll():
+    scheduler = TurnScheduler(ThreadedSocketIO())
+    ticks = counting_ticks(scheduler)
+    done = threading.Event()
+    scheduler.call_later(0, done.set)
+    assert done.wait(1)
+    time.sleep(0.3)
+    assert len(ticks) <= 2 # Ran the task, then slept with nothing to wake for
+
+
+def test_sooner_task_wakes_the_scheduler():
+    scheduler = TurnScheduler(ThreadedSocketIO())
+    ran = []
+    scheduler.call_later(30, ran.append, 'late')
+    time.sleep(0.05) # Now waiting for the 30 s task
+    started = time.monotonic()
+    done = threading.Event()
+    scheduler.call_later(0.05, done.set)
+    assert done.wait(1)
+    assert 0.04 <= time.monotonic() - started < 0.5
+    assert ran == []
+
+
+def test_tasks_run_in_due_order_and_cancelled_ones_are_skipped():
+    scheduler = TurnScheduler(ThreadedSocketIO())
+    ran = []
+    done = threading.Event()
+    scheduler.call_later(0.06, done.set)
+    scheduler.call_later(0.04, ran.append, 2)
+    scheduler.call_later(0.02, ran.append, 1)
+    scheduler.call_later(0.03, ran.append, 'cancelled').cancel()
+    assert done.wait(1)
+    assert ran == [1, 2]
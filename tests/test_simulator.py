@@ -0,0 +1,81 @@
+import pytest
+
+from game_logic import game_log as game_records
+from game_logic import simulator
+from game_logic.cards import Hand, get_card
+from game_logic.rules import MAX_ROUNDS
+
+LIVE_WINNERS = {game_records.RESULT_P0_WINS: 0, game_records.RESULT_P1_WINS: 1, game_records.RESULT_DRAW: None}
+
+
+def play_live(manager, hand0, hand1, seed=None):
+    """Steps a WarGame's state machine to the end, without any scheduling delays."""
+    game = manager.WarGame('test')
+    if seed is None:
+        game.player_hands = {0: Hand(hand0), 1: Hand(hand1)}
+    else:
+        game.seed = seed
+        game._deal()
+    game.game_in_progress = True
+    game.phase = manager.PHASE_TURN
+    steps = 0
+    while game.advance() is not None:
+        steps += 1
+        assert steps < MAX_ROUNDS * 20
+    return game
+
+
+def live_outcome(game):
+    # The last turn tick finds the game already decided (see WarGame._log_result)
+    return LIVE_WINNERS[game._result()], game.total_hands_played - 1
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_live_loop_matches_simulator(war, seed):
+    game = play_live(war, None, None, seed=seed)
+    winner, rounds, _ = simulator.play_seed(seed)
+    assert live_outcome(game) == (winner, rounds)
+
+
+def test_deal_seed_matches_live_deal(war):
+    game = war.WarGame('test')
+    game.seed = 1234
+    game._deal()
+    hand0, hand1 = simulator.deal_seed(1234)
+    assert [card.rank for card in game.player_hands[0]] == hand0
+    assert [card.rank for card in game.player_hands[1]] == hand1
+
+
+def cards(suit, *values):
+    return [get_card(suit, value) for value in values]
+
+
+def test_repeat_war_keeps_the_first_tied_cards(war):
+    # 5 vs 5 is a war; its battle cards (K vs K) tie again; then A beats 2
+    hand0 = cards('♠', '5', '2', '3', '4', 'K', '6', '7', '8', 'A')
+    hand1 = cards('♥', '5', '2', '3', '4', 'K', '6', '7', '8', '2')
+    game = play_live(war, hand0, hand1)
+
+    assert game._result() == game_records.RESULT_P0_WINS
+    assert sorted(game.player_hands[0], key=lambda card: card.index) == sorted(hand0 + hand1, key=lambda card: card.index)
+    assert len(game.player_hands[1]) == 0
+    assert simulator.play_game([card.rank for card in hand0], [card.rank for card in hand1]) == (0, 1, 2)
+
+
+def test_war_forfeit_hands_over_every_card(war):
+    # A tie with only two cards left behind it: player 1 can't lay down a war
+    hand0 = cards('♠', '9', '2', '3', '4', '5')
+    hand1 = cards('♥', '9', '2', '3')
+    game = play_live(war, hand0, hand1)
+
+    assert game._result() == game_records.RESULT_P0_WINS
+    assert len(game.player_hands[0]) == len(hand0) + len(hand1)
+    assert simulator.play_game([card.rank for card in hand0], [card.rank for card in hand1])[0] == 0
+
+
+def test_run_batch_tallies_every_game():
+    summary = simulator.run_batch(300, seed=7, processes=1, chunk_size=100)
+    assert summary['p0_wins'] + summary['p1_wins'] + summary['draws'] == 300
+    assert summary['rounds']['histogram'] == dict(sorted(summary['rounds']['histogram'].items()))
+    assert sum(summary['rounds']['histogram'].values()) == 300
+    assert summary['p0_wins'] == sum(simulator.play_seed(seed)[0] == 0 for seed in range(7, 307))
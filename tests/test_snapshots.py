@@ -0,0 +1,90 @@
+import pytest
+import sqlalchemy as sa
+
+from game_logic import snapshots
+from tests.test_state_deltas import new_game
+
+
+def play(game, steps):
+    """Advances game up to steps times; returns the message broadcast after each step."""
+    messages = []
+    for _ in range(steps):
+        if game.advance() is None:
+            break
+        messages.append(game.last_state['message'])
+    return messages
+
+
+def advance_into_war(war, game):
+    for _ in range(5000):
+        if game.phase in (war.PHASE_WAR_SPOIL, war.PHASE_WAR_BATTLE):
+            return
+        game.advance()
+    pytest.fail("no war in this deal")
+
+
+def test_restored_game_plays_on_identically(war):
+    game = new_game(war, seed=11)
+    advance_into_war(war, game)
+    data = game.snapshot()
+
+    restored = war.WarGame.from_snapshot(data)
+    assert restored.snapshot() == data
+    assert [len(restored.player_hands[i]) for i in (0, 1)] == [len(game.player_hands[i]) for i in (0, 1)]
+    assert restored.war_round == game.war_round and restored.war_spoils == game.war_spoils
+
+    assert play(restored, 10000) == play(game, 10000)
+    assert restored._result() == game._result()
+    assert restored.total_hands_played == game.total_hands_played
+
+
+def test_encode_decode_round_trip():
+    state = {
+        'room_code': 'ab3z', 'game_in_progress': True, 'game_over': False,
+        'base_delay': 0.7, 'turn_delay': 1.5, 'total_hands_played': 321, 'state_seq': 1234,
+        'phase': 'war_battle',
+        'stats': {0: {'hands_won': 150, 'wars_won': 9}, 1: {'hands_won': 170, 'wars_won': 11}},
+        'usernames': ['Ann', 'Zoë'],
+        'hand_0': [0, 51, 7], 'hand_1': list(range(8, 40)), 'play_pile': [1, 2],
+        'war_spoils': [3, 4], 'war_round': [5, 6, 41, 42],
+        'seed': 2 ** 64 - 1, 'step_count': 900, 'events': [(0, 1, 10), (400, 1, 5)],
+    }
+    decoded = snapshots.decode(snapshots.encode(state))
+    assert decoded == {**state, 'events': [tuple(e) for e in state['events']]}
+
+
+def test_unseeded_state_decodes_without_a_seed():
+    state = snapshots.decode(snapshots.encode({
+        'room_code': 'abcd', 'game_in_progress': False, 'game_over': False, 'base_delay': 1.0,
+        'turn_delay': 1.0, 'total_hands_played': 0, 'state_seq': 0, 'phase': None,
+        'stats': {0: {'hands_won': 0, 'wars_won': 0}, 1: {'hands_won': 0, 'wars_won': 0}},
+        'usernames': ['Player 1', 'Player 2'], 'hand_0': [], 'hand_1': [], 'play_pile': [],
+        'war_spoils': [], 'war_round': [], 'seed': None,
+    }))
+    assert state['seed'] is None and state['events'] == [] and state['phase'] is None
+
+
+def test_decode_rejects_other_data():
+    with pytest.raises(ValueError):
+        snapshots.decode(b'XX\x01\x00' + bytes(64))
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda tmp_path: snapshots.FileSnapshotStore(str(tmp_path / 'snaps')),
+    lambda tmp_path: snapshots.SqlSnapshotStore(sa.create_engine(f"sqlite:///{tmp_path / 'snaps.db'}")),
+], ids=['file', 'sql'])
+def test_stores_round_trip(tmp_path, make_store):
+    store = make_store(tmp_path)
+    store.save_many({'abcd': b'one', 'efgh': b'two'})
+    store.save_many({'abcd': b'three'})
+    store.delete_many(['efgh', 'missing'])
+    assert store.load_all() == {'abcd': b'three'}
+
+
+def test_long_names_are_cut_between_characters(war):
+    game = new_game(war, seed=12)
+    game.player_data[0]['username'] = 'é' * 200 # 400 bytes; 255 would split an 'é'
+    game.player_data[1]['username'] = '🂡' * 100
+    restored = war.WarGame.from_snapshot(game.snapshot())
+    assert restored.player_data[0]['username'] == 'é' * 127
+    assert restored.player_data[1]['username'] == '🂡' * 63
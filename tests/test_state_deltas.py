@@ -0,0 +1,113 @@
+import copy
+
+from tests.test_simulator import cards
+from game_logic.cards import Hand
+
+
+class Client:
+    """The seq/delta handling of static/js/games/war2.js, in Python."""
+
+    def __init__(self):
+        self.state = None
+        self.last_seq = None
+        self.sync_requests = []
+
+    def receive(self, event, data):
+        if event == 'game_state_update':
+            self.state = copy.deepcopy(data)
+            self.last_seq = data['seq']
+        elif event == 'game_state_delta':
+            if self.last_seq is not None and data['seq'] <= self.last_seq:
+                return
+            if self.state is None or data['seq'] != self.last_seq + 1:
+                self.sync_requests.append(self.last_seq)
+                return
+            for key, value in data['changes'].items():
+                current = self.state.get(key)
+                if isinstance(value, dict) and isinstance(current, dict):
+                    self.state[key] = {**current, **value}
+                else:
+                    self.state[key] = value
+            self.last_seq = data['seq']
+
+
+def in_sync(client, game):
+    state = dict(client.state)
+    state.pop('seq')
+    return state == game.last_state and client.last_seq == game.state_seq
+
+
+def new_game(manager, seed=5):
+    game = manager.WarGame('test')
+    game.players = {'sid0': {'index': 0, 'username': 'Ann'}, 'sid1': {'index': 1, 'username': 'Bob'}}
+    manager.games['test'] = game
+    game.seed = seed
+    game._deal()
+    game.game_in_progress = True
+    game.phase = manager.PHASE_TURN
+    return game
+
+
+def deliver(sio, client, to, start=0):
+    """Feeds client the emits sent to `to` since index start; returns the new index."""
+    for event, data, target in sio.emitted[start:]:
+        if target == to or (isinstance(target, list) and to in target):
+            client.receive(event, data)
+    return len(sio.emitted)
+
+
+def test_deltas_rebuild_every_broadcast_state(war):
+    game = new_game(war)
+    client = Client()
+    seen = 0
+    steps = 0
+    while game.advance() is not None and steps < 300:
+        steps += 1
+        seen = deliver(war.sio, client, 'test', seen)
+        assert in_sync(client, game)
+    assert client.sync_requests == []
+    assert any(event == 'game_state_delta' for event, _, _ in war.sio.emitted)
+
+
+def test_stats_deltas_carry_only_changed_fields(war):
+    old = {'player_0_stats': {'hands_won': 1, 'win_pct': 50}, 'message': 'a', 'player_0_count': 26}
+    new = {'player_0_stats': {'hands_won': 2, 'win_pct': 50}, 'message': 'a', 'player_0_count': 26}
+    assert war.WarGame._state_delta(old, new) == {'player_0_stats': {'hands_won': 2}, 'message': 'a'}
+
+
+def test_sequence_gap_asks_for_a_snapshot_and_recovers(war):
+    game = new_game(war)
+    client = Client()
+    game.advance()
+    seen = deliver(war.sio, client, 'test')
+    for _ in range(3):
+        game.advance()
+    seen = len(war.sio.emitted) # The client misses these
+    game.advance()
+    seen = deliver(war.sio, client, 'test', seen)
+    assert client.sync_requests == [1]
+
+    war._handle_state_sync('sid0', 'test', seq=client.sync_requests[-1])
+    seen = deliver(war.sio, client, 'sid0', seen)
+    assert in_sync(client, game)
+
+    game.advance()
+    deliver(war.sio, client, 'test', seen)
+    assert in_sync(client, game)
+    assert client.sync_requests == [1]
+
+
+def test_state_sync_before_any_broadcast_answers_only_the_requester(war):
+    game = war.WarGame('test')
+    game.players = {'sid0': {'index': 0, 'username': 'Ann'}}
+    game.player_hands = {0: Hand(cards('♠', '2', '3')), 1: Hand(cards('♥', '2', '3'))}
+    war.games['test'] = game
+
+    war._handle_state_sync('sid0', 'test')
+    assert [(event, target) for event, _, target in war.sio.emitted] == [('game_state_update', 'sid0')]
+    assert war.sio.emitted[0][1]['seq'] == game.state_seq == 0
+
+    # The room's first broadcast is then a delta on that baseline
+    game.broadcast_state("Speed set to 1.0s")
+    assert war.sio.emitted[-1][0] == 'game_state_delta'
+    assert war.sio.emitted[-1][1]['seq'] == 1
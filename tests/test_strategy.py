@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from math_logic.strategy import StrategySolver, solve_zero_sum
+
+
+def assert_equilibrium(payoffs, result):
+    """Neither player can do better than the value by switching to any single option."""
+    A = np.asarray(payoffs, dtype=float)
+    x, y, value = np.array(result['row']), np.array(result['col']), result['value']
+    assert x.sum() == pytest.approx(1) and y.sum() == pytest.approx(1)
+    assert (x >= 0).all() and (y >= 0).all()
+    assert (x @ A >= value - 1e-7).all() # Row player's mix guarantees at least the value
+    assert (A @ y <= value + 1e-7).all() # Column player's mix concedes at most the value
+    assert x @ A @ y == pytest.approx(value)
+
+
+@pytest.mark.parametrize('payoffs, row, col, value', [
+    ([[1, -1], [-1, 1]], [0.5, 0.5], [0.5, 0.5], 0), # Matching pennies
+    ([[0, -1, 1], [1, 0, -1], [-1, 1, 0]], [1 / 3] * 3, [1 / 3] * 3, 0), # Rock-paper-scissors
+    ([[3, 5], [1, 2]], [1, 0], [1, 0], 3), # Saddle point at (0, 0)
+    ([[2, 3, 1], [4, 6, 5]], [0, 1], [1, 0, 0], 4), # Row 1 dominates; column 0 is then best
+    ([[60, 40], [30, 70]], [2 / 3, 1 / 3], [0.5, 0.5], 50), # The calculators' % of points won
+    ([[7]], [1], [1], 7),
+])
+def test_known_games(payoffs, row, col, value):
+    result = solve_zero_sum(payoffs)
+    assert result['row'] == pytest.approx(row)
+    assert result['col'] == pytest.approx(col)
+    assert result['value'] == pytest.approx(value)
+
+
+def test_random_games_are_equilibria():
+    rng = np.random.default_rng(21)
+    for _ in range(200):
+        m, n = rng.integers(1, 9, 2)
+        payoffs = rng.integers(-5, 6, (m, n)) if rng.random() < 0.5 else rng.normal(size=(m, n))
+        assert_equilibrium(payoffs, solve_zero_sum(payoffs))
+
+
+def test_batch_solves_each_distinct_matrix_once():
+    solver = StrategySolver(cache_size=10)
+    pennies, rps = [[1, -1], [-1, 1]], [[0, -1, 1], [1, 0, -1], [-1, 1, 0]]
+    calls = []
+
+    def run(func, matrices):
+        calls.append(len(matrices))
+        return func(matrices)
+
+    results = solver.solve_batch([pennies, rps, [[1.0, -1.0], [-1.0, 1.0]]], run=run)
+    assert results[0] == results[2] and results[1]['value'] == pytest.approx(0)
+    assert calls == [2]
+    assert solver.solve(rps, run=run) == results[1]
+    assert calls == [2]
+    assert solver.stats() == {'hits': 1, 'misses': 2, 'solved': 2, 'size': 2}
+
+
+def test_cache_evicts_least_recently_used():
+    solver = StrategySolver(cache_size=2)
+    for value in (1, 2, 1, 3):
+        solver.solve([[value]])
+    solver.solve([[1]])
+    assert solver.stats()['hits'] == 2 and solver.stats()['size'] == 2
+
+
+@pytest.mark.parametrize('payoffs', [[], [[1, 2], [3]], [[1, float('nan')]], [['a']], [1, 2]])
+def test_bad_matrices_are_refused(payoffs):
+    with pytest.raises(ValueError):
+        StrategySolver().solve(payoffs)
@@ -0,0 +1,76 @@
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from web_logic import write_behind
+from web_logic.write_behind import UserWriter
+
+
+@pytest.fixture
+def site(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'users.db'}"
+    db = SQLAlchemy(app)
+
+    class User(db.Model):
+        id = db.Column(db.String(36), primary_key=True)
+        username = db.Column(db.String(20), nullable=False)
+        last_seen = db.Column(db.DateTime, nullable=True)
+
+    with app.app_context():
+        db.create_all()
+    app.db, app.User = db, User
+    return app
+
+
+def usernames(site):
+    with site.app_context():
+        return {user.id: user.username for user in site.User.query.all()}
+
+
+def test_batch_writes_and_renames(site):
+    writer = UserWriter(site, site.db, site.User)
+    writer.save('a', 'Ann')
+    writer.save('b', 'Bob')
+    assert writer.flush() == 2
+    writer.save('a', 'Anna', rename=True)
+    writer.save('b', 'Ignored') # Known to exist: no write
+    writer.touch('b')
+    assert writer.flush() == 1
+    assert usernames(site) == {'a': 'Anna', 'b': 'Bob'}
+    assert writer.stats()['touched'] == 1
+
+
+def test_bad_row_does_not_hold_up_the_batch(site):
+    writer = UserWriter(site, site.db, site.User)
+    writer.save('a', 'Ann')
+    writer.save('bad', None) # NOT NULL violation
+    writer.save('c', 'Cy')
+    assert writer.flush() == 2
+    assert usernames(site) == {'a': 'Ann', 'c': 'Cy'}
+    assert writer.stats()['pending'] == 1
+
+    for _ in range(write_behind.MAX_ATTEMPTS - 1):
+        writer.save('d', 'Dee')
+        writer.flush()
+    assert writer.stats()['pending'] == 0 # Dropped after MAX_ATTEMPTS failed writes
+    assert usernames(site) == {'a': 'Ann', 'c': 'Cy', 'd': 'Dee'}
+
+    # A fixed entry for the dropped id is written normally
+    writer.save('bad', 'Fixed', rename=True)
+    assert writer.flush() == 1 and usernames(site)['bad'] == 'Fixed'
+
+
+def test_lost_connection_keeps_the_batch(site, monkeypatch):
+    from sqlalchemy import exc
+    writer = UserWriter(site, site.db, site.User)
+    writer.save('a', 'Ann')
+
+    def unreachable(batch, seen):
+        raise exc.OperationalError('INSERT', {}, Exception('connection refused'))
+
+    monkeypatch.setattr(writer, '_write', unreachable)
+    for _ in range(write_behind.MAX_ATTEMPTS + 1):
+        assert writer.flush() == 0
+    monkeypatch.undo()
+    assert writer.flush() == 1 and usernames(site) == {'a': 'Ann'}
@@ -0,0 +1,151 @@
+"""
+Fingerprinted, precompressed static assets.
+
+The build step (python -m web_logic.assets, run by bin/post_compile on deploy)
+copies every file under static/ to static/build/ with a content hash in its
+name (css/styles.css -> build/css/styles.3f9a1c0b2e.css), writes gzip and
+brotli siblings next to the text ones, and records the mapping in
+static/build/asset-manifest.json (static/manifest.json is the PWA manifest).
+
+init_assets(app) loads that manifest: url_for('static', filename=...) then
+resolves to the hashed name, and hashed files are served with a year-long
+immutable Cache-Control and the precompressed sibling the client accepts.
+Since a hashed name changes whenever the content does, returning visitors
+never revalidate an asset. Without a build (local development) nothing
+changes and static files are served as usual.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError: # Optional: .gz siblings only
+    brotli = None
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+BUILD_DIR = 'build' # Inside the static folder
+MANIFEST_NAME = 'asset-manifest.json'
+HASH_LENGTH = 10
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.html', '.txt', '.ico', '.map')
+MIN_COMPRESS_SIZE = 512 # Bytes
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365 # One year
+
+
+# --- Build ---
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build(static_dir):
+    """Writes static_dir/build/ (hashed copies, .gz/.br siblings, manifest). Returns the manifest."""
+    out_dir = os.path.join(static_dir, BUILD_DIR)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    manifest = {}
+    saved = 0
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != out_dir)
+        for name in sorted(files):
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            base, ext = os.path.splitext(rel)
+            hashed = f"{BUILD_DIR}/{base}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+            target = os.path.join(static_dir, hashed)
+            _write(target, data)
+            manifest[rel] = hashed
+
+            if ext.lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data):
+                    _write(target + '.gz', compressed)
+                    saved += len(data) - len(compressed)
+                if brotli is not None:
+                    compressed = brotli.compress(data, quality=11)
+                    if len(compressed) < len(data):
+                        _write(target + '.br', compressed)
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    log.info(f"Built {len(manifest)} static assets into {out_dir} (gzip saves {saved} bytes).")
+    return manifest
+
+
+def load_manifest(static_dir):
+    """{ 'css/styles.css': 'build/css/styles.<hash>.css' }, or {} if there is no build."""
+    try:
+        with open(os.path.join(static_dir, BUILD_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        log.error(f"Ignoring unreadable static asset manifest: {e}")
+        return {}
+
+
+# --- Serving ---
+
+def init_assets(app):
+    """Resolves url_for('static') to fingerprinted names and serves them immutable and precompressed."""
+    static_dir = app.static_folder
+    manifest = load_manifest(static_dir)
+    app.extensions['asset_manifest'] = manifest
+    if not manifest:
+        return
+    log.info(f"Serving {len(manifest)} fingerprinted static assets.")
+
+    @app.url_defaults
+    def _fingerprint(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+    send_static_file = app.view_functions['static']
+    prefix = BUILD_DIR + '/'
+
+    def static(filename):
+        if not filename.startswith(prefix):
+            return send_static_file(filename=filename)
+        accept = request.accept_encodings
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = None
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accept.quality(encoding) > 0 and os.path.isfile(os.path.join(static_dir, filename + suffix)):
+                response = send_from_directory(static_dir, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(static_dir, filename)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+        return response
+
+    app.view_functions['static'] = static
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets.")
+    parser.add_argument('--static-dir', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static'))
+    args = parser.parse_args()
+    build(args.static_dir)
@@ -0,0 +1,171 @@
+"""
+Database access that cooperates with eventlet.
+
+psycopg2 is a C driver, so eventlet.monkey_patch() can't make it green: every
+query would block the hub and stall every War room's game loop until the
+server answered. make_psycopg2_green() installs a wait callback that runs
+queries asynchronously and yields to the hub while waiting on the socket
+(the same technique as the psycogreen package).
+
+Connections come from an explicitly sized pool (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE), so a burst of requests queues for a
+connection instead of opening more than Postgres allows, and
+instrument_engine() times every query and tracks how close the pool runs to
+its limit (DatabaseStats).
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import event
+
+from web_logic.metrics import Histogram
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 5
+DEFAULT_POOL_TIMEOUT = 10 # Seconds to wait for a free connection before failing the request
+DEFAULT_POOL_RECYCLE = 1800 # Seconds; reconnect before the server drops idle connections
+DEFAULT_SLOW_QUERY_MS = 200
+QUERY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5) # Seconds
+
+
+def _eventlet_wait_callback(conn, timeout=-1):
+    """psycopg2 wait callback: polls the connection and parks the greenlet until the socket is ready."""
+    from eventlet.hubs import trampoline
+    from psycopg2 import OperationalError, extensions
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            trampoline(conn.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(conn.fileno(), write=True)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def make_psycopg2_green():
+    """Makes psycopg2 yield to the eventlet hub while it waits for the server. Returns False if unavailable."""
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        log.warning("psycopg2 is not installed; database calls will block the eventlet hub.")
+        return False
+    extensions.set_wait_callback(_eventlet_wait_callback)
+    return True
+
+
+def engine_options_from_env(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for uri, with the pool sized from the environment."""
+    options = {'pool_pre_ping': True}
+    if uri.startswith('sqlite'):
+        return options # SQLite uses its own single-file pools
+    options.update(
+        pool_size=int(os.environ.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW)),
+        pool_timeout=float(os.environ.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)),
+        pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE)),
+    )
+    return options
+
+
+class DatabaseStats:
+    """
+    Query timings and pool usage for one engine (see instrument_engine). Updated
+    without locks: greenlets never switch in the middle of these updates.
+    """
+
+    def __init__(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.pool = None
+
+        # Queries
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.max_query_seconds = 0.0
+        self.slow_queries = 0
+        self.errors = 0
+        self.latency = Histogram(QUERY_BUCKETS)
+
+        # Pool
+        self.checkouts = 0
+        self.saturated_checkouts = 0 # Checkouts that took the pool's last free connection
+        self.peak_checked_out = 0
+
+    def record_query(self, seconds, statement):
+        self.queries += 1
+        self.query_seconds += seconds
+        self.max_query_seconds = max(self.max_query_seconds, seconds)
+        self.latency.observe(seconds)
+        if seconds >= self.slow_query_seconds:
+            self.slow_queries += 1
+            log.warning(f"Slow query ({seconds * 1000:.0f} ms): {statement[:200]}")
+
+    def capacity(self):
+        """Connections the pool can hand out at once, or None if unbounded."""
+        size = getattr(self.pool, 'size', None)
+        max_overflow = getattr(self.pool, '_max_overflow', None)
+        if size is None or max_overflow is None or max_overflow < 0:
+            return None
+        return size() + max_overflow
+
+    def record_checkout(self):
+        checked_out = self.pool.checkedout() if hasattr(self.pool, 'checkedout') else 0
+        capacity = self.capacity()
+        self.checkouts += 1
+        self.peak_checked_out = max(self.peak_checked_out, checked_out)
+        if capacity is not None and checked_out >= capacity:
+            self.saturated_checkouts += 1
+
+    def stats(self):
+        pool = self.pool
+        return {
+            'queries': self.queries,
+            'query_seconds': self.query_seconds,
+            'max_query_seconds': self.max_query_seconds,
+            'slow_queries': self.slow_queries,
+            'errors': self.errors,
+            'pool_capacity': self.capacity(),
+            'pool_checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'pool_checkouts': self.checkouts,
+            'pool_saturated_checkouts': self.saturated_checkouts,
+            'pool_peak_checked_out': self.peak_checked_out,
+        }
+
+    def collect_metrics(self, writer):
+        writer.histogram('wescoup_db_query_duration_seconds', "Database query latency", self.latency)
+        writer.stats('wescoup_db', self.stats(),
+                     counters=('queries', 'slow_queries', 'errors', 'pool_checkouts', 'pool_saturated_checkouts'))
+
+
+def instrument_engine(engine, stats=None):
+    """Hooks query timing and pool tracking into engine. Returns its DatabaseStats."""
+    stats = stats or DatabaseStats(int(os.environ.get('DB_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)))
+    stats.pool = engine.pool
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        stats.record_query(time.perf_counter() - started, statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+        stats.errors += 1
+
+    @event.listens_for(engine.pool, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.record_checkout()
+
+    return stats
@@ -0,0 +1,231 @@
+"""
+Cookie-based user identity.
+
+Every visitor carries a signed cookie (IDENTITY_COOKIE_NAME) holding their
+user id and display name. g.user is a CurrentUser built from that cookie:
+g.user.id and g.user.username are answered without touching the database,
+and the User row is only loaded when a route reads anything else (email,
+password_hash, ...) or changes the user. Pages that never look at g.user -
+and pages that only show the name - cost zero queries. The other columns
+are kept in an LRU+TTL UserCache (web_logic/user_cache.py), so even those
+pages read a returning user's row once per cache TTL.
+
+New visitors get an id and a cookie but no row: the row is only written once
+they rename themselves or join a War room, and then through the write-behind
+UserWriter (web_logic/write_behind.py), which inserts queued users in batches.
+The writer also keeps User.last_seen current (one batched update per user per
+interval), and UserPruner (web_logic/pruning.py) deletes anonymous rows that
+have been idle for months.
+
+Call init_identity(app, db, User) once; it registers the request hooks.
+"""
+import logging
+import uuid
+
+from flask import g, request
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from web_logic.pruning import user_pruner_from_env
+from web_logic.user_cache import user_cache_from_env
+from web_logic.write_behind import UserWriter
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+IDENTITY_COOKIE_NAME = 'wescoup_id' # Signed {id, username}
+LEGACY_COOKIE_NAME = 'user_id' # Plain user id cookie from before identities were signed
+COOKIE_MAX_AGE = 60 * 60 * 24 * 365 * 5 # Long-term cookie (5 years)
+COOKIE_SALT = 'wescoup-identity'
+DEFAULT_USERNAME = 'Player1'
+MAX_USERNAME_LENGTH = 20 # User.username is String(20)
+
+# Set by init_identity()
+_serializer = None
+_db = None
+_User = None
+user_writer = None
+user_cache = None # None when USER_CACHE_SIZE=0
+user_pruner = None
+
+
+def init_identity(app, db, User):
+    """
+    Wires identity into the app: signs cookies with SECRET_KEY, sets up the
+    UserCache, starts the UserWriter and UserPruner and registers the request hooks.
+    """
+    global _serializer, _db, _User, user_writer, user_cache, user_pruner
+    _serializer = URLSafeSerializer(app.config['SECRET_KEY'], salt=COOKIE_SALT)
+    _db = db
+    _User = User
+    user_cache = user_cache_from_env()
+    user_writer = UserWriter(app, db, User, on_rename=user_cache.invalidate if user_cache else None)
+    user_writer.start()
+    user_pruner = user_pruner_from_env(app, db, User, on_delete=_forget_users)
+    user_pruner.start()
+    app.before_request(load_identity)
+    app.after_request(save_identity)
+
+
+def _forget_users(user_ids):
+    """Drops pruned users from the in-process caches."""
+    user_writer.forget(user_ids)
+    if user_cache is not None:
+        user_cache.invalidate(*user_ids)
+
+
+# --- Cookie Helpers ---
+
+def sign_identity(user_id, username):
+    return _serializer.dumps({'id': user_id, 'u': username})
+
+
+def read_identity(cookies):
+    """Returns (user_id, username) from a valid signed cookie, or (None, None)."""
+    token = cookies.get(IDENTITY_COOKIE_NAME)
+    if not token or _serializer is None:
+        return None, None
+    try:
+        payload = _serializer.loads(token)
+        return payload['id'], payload['u']
+    except (BadSignature, KeyError, TypeError):
+        return None, None
+
+
+def user_id_from_cookies(cookies):
+    """The visitor's user id (signed cookie first, then the legacy plain cookie), or None."""
+    user_id, _ = read_identity(cookies)
+    return user_id or cookies.get(LEGACY_COOKIE_NAME)
+
+
+def materialize_user(cookies):
+    """
+    Queues a User row for the visitor in a signed cookie (e.g. when they join a
+    War room). Visitors that already have one are skipped when the batch is written.
+    """
+    user_id, username = read_identity(cookies)
+    if user_id and user_writer is not None:
+        user_writer.save(user_id, username)
+
+
+# --- g.user ---
+
+class CurrentUser:
+    """
+    Stand-in for the User row on g.user. id and username come from the signed
+    cookie; other attributes come from the UserCache, or load the row on a miss.
+    Assignments load the row and invalidate the cached copy, except renames,
+    which only go into the cookie and the UserWriter.
+    """
+    __slots__ = ('_id', '_username', '_row')
+
+    def __init__(self, user_id, username=None, row=None):
+        object.__setattr__(self, '_id', user_id)
+        object.__setattr__(self, '_username', username)
+        object.__setattr__(self, '_row', row)
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def username(self):
+        # The cookie wins: it already holds a rename the UserWriter may not have written yet
+        if self._username is None:
+            return self.row.username
+        return self._username
+
+    @property
+    def loaded(self):
+        return self._row is not None
+
+    @property
+    def row(self):
+        """
+        The User row, loaded on first use. Visitors without a row yet (or whose
+        row has gone missing) get an unsaved one built from the cookie.
+        """
+        if self._row is None:
+            row = _db.session.get(_User, self._id)
+            if row is None:
+                row = _User(id=self._id, username=self._username or DEFAULT_USERNAME)
+            object.__setattr__(self, '_row', row)
+        return self._row
+
+    def _values(self):
+        """The user's column values, from the cache or (on a miss) the row."""
+        cached = user_cache.get(self._id)
+        if cached is None:
+            row = self.row
+            cached = user_cache.put(self._id, {column.key: getattr(row, column.key)
+                                               for column in _User.__table__.columns})
+        return cached
+
+    def __getattr__(self, name):
+        if self._row is None and user_cache is not None:
+            values = self._values()
+            if name in values:
+                return values[name]
+        return getattr(self.row, name)
+
+    def __setattr__(self, name, value):
+        if user_cache is not None:
+            user_cache.invalidate(self._id)
+        if name == 'username':
+            object.__setattr__(self, '_username', value)
+            if self._row is None:
+                user_writer.save(self._id, value, rename=True)
+                return
+        row = self.row
+        _db.session.add(row) # No-op for a loaded row; saves an unsaved one with the route's commit
+        setattr(row, name, value)
+
+    def __repr__(self):
+        return f"CurrentUser('{self._id}', loaded={self.loaded})"
+
+
+# --- Request Hooks ---
+
+def load_identity():
+    """Sets g.user from the identity cookie. Only legacy-cookie visitors touch the database."""
+    # Skip identity work for static assets (and the metrics scraper)
+    if request.path.startswith('/static') or request.path in ('/favicon.ico', '/metrics'):
+        return
+
+    user_id, username = read_identity(request.cookies)
+    if user_id:
+        g.user = CurrentUser(user_id, username)
+        g.identity_cookie = (user_id, username)
+        user_writer.touch(user_id)
+        return
+
+    legacy_id = request.cookies.get(LEGACY_COOKIE_NAME)
+    if legacy_id:
+        # One-time migration: load the row, then after_request issues the signed cookie
+        row = _db.session.get(_User, legacy_id)
+        if row:
+            g.user = CurrentUser(row.id, row=row)
+            user_writer.touch(row.id)
+            return
+
+    # New anonymous user (Tier 1): just an id in a cookie until they do something worth saving
+    g.user = CurrentUser(str(uuid.uuid4()), DEFAULT_USERNAME)
+
+
+def save_identity(response):
+    """(Re)issues the signed cookie when it is missing or no longer matches g.user (e.g. a new username)."""
+    try:
+        user = g.get('user')
+        if user is None:
+            return response
+        current = (user.id, user.username)
+        if g.get('identity_cookie') != current:
+            response.set_cookie(IDENTITY_COOKIE_NAME, sign_identity(*current),
+                                max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+            # A response carrying someone's cookie must not be stored by shared caches
+            if response.cache_control.public:
+                response.cache_control.public = False
+                response.cache_control.private = True
+    except Exception as e:
+        log.error(f"Failed setting identity cookie: {e}")
+    return response
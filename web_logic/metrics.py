@@ -0,0 +1,242 @@
+"""
+Prometheus metrics at /metrics (text exposition format).
+
+Collection is plain attribute arithmetic: every worker runs on one OS thread
+under eventlet and a greenlet can't be switched out in the middle of
+`counts[i] += 1`, so the hot path takes no locks and allocates nothing.
+All the formatting happens at scrape time:
+
+  * wescoup_http_request_duration_seconds{endpoint}  - route latency histogram
+  * wescoup_http_request_db_queries{endpoint}        - DB queries per request histogram
+  * wescoup_greenlets, wescoup_hub_timers/listeners  - live greenlets and what the hub waits on
+  * plus whatever the registered collectors report (rooms and players,
+    emits, scheduler lag, pool and cache stats, ...)
+
+A collector is a callable taking a MetricsWriter. /metrics is closed by
+default (404): set METRICS_TOKEN to serve it to requests carrying
+`Authorization: Bearer <token>`, or METRICS_PUBLIC=1 to open it to anyone.
+Direct requests from the same machine (no proxy in between) are always let
+through, for local development.
+"""
+import bisect
+import gc
+import hmac
+import logging
+import os
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0) # Seconds
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+GREENLET_SCAN_CHUNK = 20000 # Objects checked between hub yields when counting greenlets
+PREFIX = 'wescoup'
+
+
+class Histogram:
+    """Cumulative-bucket histogram (the Prometheus kind)."""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class LabeledHistograms(dict):
+    """label value -> Histogram, created on first observation."""
+
+    def __init__(self, bounds):
+        super().__init__()
+        self.bounds = bounds
+
+    def observe(self, label, value):
+        histogram = self.get(label)
+        if histogram is None:
+            histogram = self[label] = Histogram(self.bounds)
+        histogram.observe(value)
+
+
+# --- Exposition ---
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+class MetricsWriter:
+    """Builds the exposition text; samples of one metric family are grouped under one HELP/TYPE."""
+
+    def __init__(self):
+        self._families = {} # name -> (type, help, [lines])
+
+    def _family(self, name, kind, help_text):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, [])
+        return family[2]
+
+    def gauge(self, name, help_text, value, **labels):
+        if value is not None:
+            self._family(name, 'gauge', help_text).append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def counter(self, name, help_text, value, **labels):
+        if value is not None:
+            self._family(name, 'counter', help_text).append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, name, help_text, histogram, **labels):
+        lines = self._family(name, 'histogram', help_text)
+        cumulative = 0
+        for bound, count in zip(histogram.bounds + (float('inf'),), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(float(bound))})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(float(histogram.sum))}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    def stats(self, prefix, stats, counters=()):
+        """Writes a stats() dict: keys in counters as counters, other numbers as gauges."""
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in counters:
+                self.counter(f"{prefix}_{key}_total", f"{prefix} {key}", value)
+            else:
+                self.gauge(f"{prefix}_{key}", f"{prefix} {key}", value)
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self._families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+
+def count_greenlets():
+    """
+    Live greenlets. This walks the whole heap, so it only runs at scrape time and
+    yields to the hub every GREENLET_SCAN_CHUNK objects to keep game loops on pace.
+    """
+    try:
+        from greenlet import greenlet
+    except ImportError:
+        return None
+    objects = gc.get_objects()
+    count = 0
+    for start in range(0, len(objects), GREENLET_SCAN_CHUNK):
+        for obj in objects[start:start + GREENLET_SCAN_CHUNK]:
+            if isinstance(obj, greenlet) and not obj.dead:
+                count += 1
+        time.sleep(0) # eventlet.sleep(0) once monkey-patched
+    return count
+
+
+def hub_stats():
+    """Timers and fd listeners on the eventlet hub (cheap), or {} without eventlet."""
+    try:
+        from eventlet import hubs
+    except ImportError:
+        return {}
+    hub = hubs.get_hub()
+    listeners = getattr(hub, 'listeners', {})
+    return {
+        'timers': len(getattr(hub, 'timers', ())) + len(getattr(hub, 'next_timers', ())),
+        'listeners': sum(len(by_fd) for by_fd in listeners.values()),
+    }
+
+
+# --- Flask Integration ---
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = LabeledHistograms(LATENCY_BUCKETS)
+        self.request_queries = LabeledHistograms(QUERY_COUNT_BUCKETS)
+        self.collectors = []
+        self.started = time.time()
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def add_stats(self, prefix, stats, counters=()):
+        """Registers a stats() callable (e.g. UserCache.stats) as a collector."""
+        self.collectors.append(lambda writer: writer.stats(prefix, stats(), counters))
+
+    def init_app(self, app, engine):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        event.listen(engine, 'before_cursor_execute', self._count_query)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def _count_query(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g._metrics_queries = g.get('_metrics_queries', 0) + 1
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.get('_metrics_started')
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            self.request_seconds.observe(endpoint, time.perf_counter() - started)
+            self.request_queries.observe(endpoint, g.get('_metrics_queries', 0))
+        return response
+
+    def render(self):
+        writer = MetricsWriter()
+        for endpoint, histogram in sorted(self.request_seconds.items()):
+            writer.histogram(f"{PREFIX}_http_request_duration_seconds", "Request latency by endpoint",
+                             histogram, endpoint=endpoint)
+        for endpoint, histogram in sorted(self.request_queries.items()):
+            writer.histogram(f"{PREFIX}_http_request_db_queries", "Database queries per request by endpoint",
+                             histogram, endpoint=endpoint)
+        writer.gauge(f"{PREFIX}_greenlets", "Live greenlets", count_greenlets())
+        for key, value in hub_stats().items():
+            writer.gauge(f"{PREFIX}_hub_{key}", f"Eventlet hub {key}", value)
+        writer.gauge(f"{PREFIX}_process_start_time_seconds", "Worker start time (Unix time)", self.started)
+        for collector in self.collectors:
+            try:
+                collector(writer)
+            except Exception as e:
+                log.error(f"Metrics collector {collector!r} failed: {e}")
+        return writer.render()
+
+    @staticmethod
+    def _allowed():
+        token = os.environ.get('METRICS_TOKEN')
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            return hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8'))
+        if os.environ.get('METRICS_PUBLIC') == '1':
+            return True
+        return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+    def metrics_view(self):
+        if not self._allowed():
+            if os.environ.get('METRICS_TOKEN'):
+                return 'Unauthorized', 401
+            return 'Not Found', 404
+        return self.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                                    'Cache-Control': 'no-store'}
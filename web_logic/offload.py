@@ -0,0 +1,129 @@
+"""
+Keeping CPU-bound work off the eventlet hub.
+
+Everything in a worker shares one OS thread, so a greenlet that computes for
+100 ms (a bcrypt hash, a big solve) freezes every War room for 100 ms.
+
+  * run_cpu(func, *args) runs func on eventlet's native thread pool (tpool)
+    and parks only the calling greenlet until it finishes. At most
+    CPU_OFFLOAD_LIMIT jobs run at once; further callers wait their turn
+    (green), so a burst of logins can't starve the pool. Functions that
+    release the GIL (bcrypt, NumPy) then truly run in parallel with the hub.
+  * HubWatchdog is a native thread that notices when the hub stops turning
+    (a heartbeat greenlet misses its beat for HUB_WATCHDOG_MS) and logs the
+    stack of whatever is holding it, once per stall.
+"""
+import logging
+import os
+import sys
+import traceback
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_OFFLOAD_LIMIT = max(2, os.cpu_count() or 2)
+DEFAULT_WATCHDOG_MS = 250 # HUB_WATCHDOG_MS=0 turns the watchdog off
+
+_slots = None # Semaphore bounding concurrent run_cpu jobs (created on first use)
+
+# Counters
+offload_stats = {'jobs': 0, 'running': 0, 'waiting': 0}
+
+
+# --- CPU Offload ---
+
+def run_cpu(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on a native thread and returns its result (or raises
+    its exception). Blocks only the calling greenlet. Don't touch the database or
+    Flask globals inside func: it runs outside the greenlet's context.
+    """
+    global _slots
+    try:
+        from eventlet import tpool
+        from eventlet.semaphore import Semaphore
+    except ImportError: # No eventlet: nothing to protect
+        return func(*args, **kwargs)
+    if _slots is None:
+        _slots = Semaphore(int(os.environ.get('CPU_OFFLOAD_LIMIT', DEFAULT_OFFLOAD_LIMIT)))
+
+    offload_stats['waiting'] += 1
+    with _slots:
+        offload_stats['waiting'] -= 1
+        offload_stats['running'] += 1
+        try:
+            return tpool.execute(func, *args, **kwargs)
+        finally:
+            offload_stats['running'] -= 1
+            offload_stats['jobs'] += 1
+
+
+# --- Hub Watchdog ---
+
+class HubWatchdog:
+    """
+    A heartbeat greenlet stamps the time every threshold/4 seconds; a native
+    thread checks the stamp and, if it is older than threshold, logs the hub
+    thread's current stack (the greenlet that is hogging it).
+    """
+
+    def __init__(self, threshold_ms=DEFAULT_WATCHDOG_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 4
+        self.stalls = 0
+        self.max_stall = 0.0
+        self._beat = None
+        self._hub_thread_id = None
+
+    def start(self):
+        import eventlet
+        from eventlet import patcher
+        real_threading = patcher.original('threading')
+        real_time = patcher.original('time')
+        self._clock = real_time.monotonic
+        self._sleep = real_time.sleep
+        self._beat = self._clock()
+        self._hub_thread_id = real_threading.get_ident()
+        eventlet.spawn(self._heartbeat)
+        real_threading.Thread(target=self._watch, name='hub-watchdog', daemon=True).start()
+        log.info(f"Hub watchdog started (threshold {self.threshold * 1000:.0f} ms).")
+
+    def _heartbeat(self):
+        import eventlet
+        while True:
+            self._beat = self._clock()
+            eventlet.sleep(self.interval)
+
+    def _watch(self):
+        reported = None # Beat of the stall already logged
+        while True:
+            self._sleep(self.interval)
+            beat = self._beat
+            stalled = self._clock() - beat
+            if stalled < self.threshold:
+                continue
+            self.max_stall = max(self.max_stall, stalled)
+            if reported == beat:
+                continue # Same stall, already logged
+            reported = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._hub_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else '(no frame)\n'
+            log.warning(f"Eventlet hub blocked for {stalled * 1000:.0f}+ ms; the hub thread is at:\n{stack}")
+
+    def stats(self):
+        return {'stalls': self.stalls, 'max_stall_seconds': self.max_stall}
+
+
+def watchdog_from_env():
+    """Starts a HubWatchdog unless HUB_WATCHDOG_MS=0. Returns it, or None."""
+    threshold_ms = int(os.environ.get('HUB_WATCHDOG_MS', DEFAULT_WATCHDOG_MS))
+    if threshold_ms <= 0:
+        return None
+    try:
+        watchdog = HubWatchdog(threshold_ms)
+        watchdog.start()
+    except ImportError:
+        return None
+    return watchdog
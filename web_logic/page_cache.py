@@ -0,0 +1,112 @@
+"""
+Rendered-page cache for routes whose HTML only changes between deploys.
+
+@page_cache.page renders a route's template once per worker and keeps the
+body with its gzip (and, if the brotli package is installed, brotli) variant
+precompressed. Hits skip Jinja entirely: the client gets the variant its
+Accept-Encoding prefers, a strong ETag per variant, Cache-Control, and a bare
+304 when its If-None-Match already matches.
+
+Only decorate routes that don't read g.user (or anything else per request);
+those keep rendering normally. In debug mode the cache is bypassed so
+template edits show up immediately.
+"""
+import functools
+import gzip
+import hashlib
+import logging
+import os
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_MAX_AGE = 600 # Seconds browsers may reuse a page before revalidating
+MIN_COMPRESS_SIZE = 512 # Bytes; smaller bodies are served as-is
+
+
+class CachedPage:
+    __slots__ = ('mimetype', 'variants') # variants = { encoding or None: (etag, body) }
+
+    def __init__(self, mimetype, body):
+        self.mimetype = mimetype
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {None: (etag, body)}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants['gzip'] = (etag + '-gz', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self.variants['br'] = (etag + '-br', brotli.compress(body, quality=11))
+
+    def etags(self):
+        return [etag for etag, _ in self.variants.values()]
+
+
+class PageCache:
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self._pages = {} # request path -> CachedPage
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(int(os.environ.get('PAGE_CACHE_MAX_AGE', DEFAULT_MAX_AGE)))
+
+    def clear(self):
+        self._pages.clear()
+
+    def page(self, view):
+        """Route decorator: serve view's rendered page from the cache."""
+        @functools.wraps(view)
+        def cached_view(*args, **kwargs):
+            if current_app.debug:
+                return view(*args, **kwargs)
+            cached = self._pages.get(request.path)
+            if cached is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                cached = self._pages[request.path] = CachedPage(response.mimetype, response.get_data())
+                self.misses += 1
+            else:
+                self.hits += 1
+            return self._respond(cached)
+        return cached_view
+
+    def _choose_variant(self, cached):
+        accept = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in cached.variants and accept.quality(encoding) > 0:
+                return encoding
+        return None
+
+    def _respond(self, cached):
+        if any(etag in request.if_none_match for etag in cached.etags()):
+            self.not_modified += 1
+            response = current_app.response_class(status=304)
+            etag, _ = cached.variants[self._choose_variant(cached)]
+        else:
+            encoding = self._choose_variant(cached)
+            etag, body = cached.variants[encoding]
+            response = current_app.response_class(body, mimetype=cached.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
+
+    def stats(self):
+        return {'pages': len(self._pages), 'hits': self.hits, 'misses': self.misses,
+                'not_modified': self.not_modified}
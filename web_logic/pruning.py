@@ -0,0 +1,118 @@
+"""
+Background pruning of stale anonymous users.
+
+Anonymous (Tier 1) rows - no email, no password - whose last_seen is older
+than USER_PRUNE_DAYS are deleted every PRUNE_INTERVAL seconds, in chunks of
+PRUNE_CHUNK rows with a short pause between chunks. Each chunk is its own
+small transaction found through the last_seen index, so no lock is held for
+long and requests keep flowing while a large backlog is cleared.
+
+Rows from before User.last_seen existed have it NULL (the migration doesn't
+backfill them in one big UPDATE). Each run first stamps those with the
+current time, in the same chunked transactions, so their inactivity clock
+starts at the first run after the migration; NULL rows are never pruned.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_DAYS = 180 # USER_PRUNE_DAYS=0 turns pruning off
+PRUNE_INTERVAL = 6 * 60 * 60 # Seconds between runs
+PRUNE_CHUNK = 500 # Rows per DELETE
+PRUNE_PAUSE = 0.2 # Seconds between chunks
+
+
+class UserPruner:
+    def __init__(self, app, db, User, days=DEFAULT_DAYS, chunk=PRUNE_CHUNK, on_delete=None):
+        self.app = app
+        self.db = db
+        self.table = User.__table__
+        self.days = days
+        self.chunk = chunk
+        self.on_delete = on_delete # Called with each chunk of deleted ids
+        self._thread = None
+        self.deleted = 0
+        self.last_run = None
+
+    def start(self):
+        if self._thread is None and self.days > 0:
+            self._thread = threading.Thread(target=self._run, name='user-pruner', daemon=True)
+            self._thread.start()
+
+    def _stale_ids(self, conn, cutoff):
+        table = self.table
+        query = (select(table.c.id)
+                 .where(table.c.last_seen < cutoff,
+                        table.c.email.is_(None),
+                        table.c.password_hash.is_(None))
+                 .order_by(table.c.last_seen)
+                 .limit(self.chunk))
+        return list(conn.execute(query).scalars())
+
+    def backfill_last_seen(self, now, pause=PRUNE_PAUSE):
+        """Sets last_seen = now on rows that predate the column, one chunk per transaction."""
+        table = self.table
+        total = 0
+        while True:
+            with self.db.engine.begin() as conn:
+                ids = list(conn.execute(select(table.c.id).where(table.c.last_seen.is_(None))
+                                        .limit(self.chunk)).scalars())
+                if ids:
+                    conn.execute(update(table).where(table.c.id.in_(ids), table.c.last_seen.is_(None))
+                                 .values(last_seen=now))
+            total += len(ids)
+            if len(ids) < self.chunk:
+                return total
+            time.sleep(pause)
+
+    def prune(self, pause=PRUNE_PAUSE):
+        """Deletes every stale anonymous user, one chunk per transaction. Returns the number deleted."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = now - timedelta(days=self.days)
+        table = self.table
+        total = 0
+        with self.app.app_context():
+            self.backfill_last_seen(now, pause)
+            while True:
+                with self.db.engine.begin() as conn:
+                    ids = self._stale_ids(conn, cutoff)
+                    if ids:
+                        # Re-check the conditions: the user may have come back since the SELECT
+                        conn.execute(delete(table).where(table.c.id.in_(ids),
+                                                         table.c.last_seen < cutoff,
+                                                         table.c.email.is_(None),
+                                                         table.c.password_hash.is_(None)))
+                if not ids:
+                    break
+                total += len(ids)
+                if self.on_delete is not None:
+                    self.on_delete(ids)
+                if len(ids) < self.chunk:
+                    break
+                time.sleep(pause)
+        self.deleted += total
+        self.last_run = time.time()
+        if total:
+            log.info(f"Pruned {total} anonymous user(s) inactive for {self.days}+ days.")
+        return total
+
+    def _run(self):
+        while True:
+            try:
+                self.prune()
+            except Exception as e:
+                log.error(f"User pruning failed: {e}", exc_info=True)
+            time.sleep(PRUNE_INTERVAL)
+
+
+def user_pruner_from_env(app, db, User, on_delete=None):
+    return UserPruner(app, db, User, days=int(os.environ.get('USER_PRUNE_DAYS', DEFAULT_DAYS)),
+                      chunk=int(os.environ.get('USER_PRUNE_CHUNK', PRUNE_CHUNK)), on_delete=on_delete)
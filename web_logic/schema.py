@@ -0,0 +1,118 @@
+"""
+Versioned database schema.
+
+Instead of running create_all() (a round of table inspection) on every boot,
+the database records the schema version it is at in a one-row
+'schema_version' table. ensure_schema() reads it with a single query and only
+runs the MIGRATIONS that are newer, each in its own transaction. Migrations
+are written to be safe on databases that predate this table (create_all
+skips existing tables; added columns are checked for first).
+
+On Heroku the release phase runs `flask --app app upgrade-db` before new
+dynos start, so web workers can skip the check entirely with
+DB_SCHEMA_CHECK=off.
+"""
+import logging
+import os
+
+import sqlalchemy as sa
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+VERSION_TABLE = 'schema_version'
+
+_metadata = sa.MetaData()
+_version_table = sa.Table(
+    VERSION_TABLE, _metadata,
+    sa.Column('version', sa.Integer, nullable=False),
+)
+
+
+# --- Migrations ---
+
+def _create_tables(conn, db):
+    """The tables as they were before versioning (checkfirst: existing tables are left alone)."""
+    db.metadata.create_all(conn, checkfirst=True)
+
+
+def _add_user_last_seen(conn, db):
+    """
+    User.last_seen and its index. Existing rows are left NULL rather than
+    backfilled here, in one long write-locking UPDATE: UserPruner stamps them
+    in small chunks on its first run (see pruning.py).
+    """
+    table = db.metadata.tables['user']
+    if 'last_seen' in {column['name'] for column in sa.inspect(conn).get_columns(table.name)}:
+        return # Created with the column by _create_tables
+    quote = conn.dialect.identifier_preparer.quote
+    conn.execute(sa.text(f"ALTER TABLE {quote(table.name)} ADD COLUMN last_seen "
+                         f"{table.c.last_seen.type.compile(conn.dialect)}"))
+    for index in table.indexes:
+        if 'last_seen' in index.columns:
+            index.create(conn)
+
+
+def _create_equation_lab_tables(conn, db):
+    """EquationCard, StressTest and StressTestResult (math_logic/equation_lab.py)."""
+    tables = [db.metadata.tables[name] for name in ('equation_card', 'stress_test', 'stress_test_result')]
+    db.metadata.create_all(conn, tables=tables, checkfirst=True)
+
+
+# (version, description, migration(conn, db)), oldest first. Append only.
+MIGRATIONS = [
+    (1, 'create tables', _create_tables),
+    (2, 'add User.last_seen', _add_user_last_seen),
+    (3, 'add Equation Lab tables', _create_equation_lab_tables),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """The database's schema version (0 if it has never been versioned)."""
+    try:
+        version = conn.execute(sa.select(_version_table.c.version)).scalar()
+    except sa.exc.DBAPIError:
+        conn.rollback()
+        return 0
+    return version or 0
+
+
+def ensure_schema(db):
+    """Brings the database up to SCHEMA_VERSION. Costs one query when it already is."""
+    with db.engine.connect() as conn:
+        version = current_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    _metadata.create_all(db.engine, checkfirst=True)
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        with db.engine.begin() as conn:
+            # Another worker may have got here first
+            if current_version(conn) >= number:
+                continue
+            migrate(conn, db)
+            conn.execute(_version_table.delete())
+            conn.execute(_version_table.insert(), {'version': number})
+        log.info(f"Database schema migrated to version {number} ({description}).")
+        version = number
+    return version
+
+
+def init_schema(app, db):
+    """Checks the schema at boot (unless DB_SCHEMA_CHECK=off) and adds `flask upgrade-db`."""
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Apply pending database schema migrations."""
+        print(f"Database schema at version {ensure_schema(db)}.")
+
+    if os.environ.get('DB_SCHEMA_CHECK', 'boot') == 'off':
+        return
+    with app.app_context():
+        try:
+            ensure_schema(db)
+        except Exception as e:
+            app.logger.error(f"Database schema migration failed: {e}")
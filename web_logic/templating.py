@@ -0,0 +1,61 @@
+"""
+Jinja bytecode cache, so templates are compiled at build time, not per worker.
+
+Templates are compiled to Python code the first time each worker renders
+them. init_template_cache(app) points Jinja at a FileSystemBytecodeCache in
+JINJA_CACHE_DIR (default .jinja_cache/ in the app root), and the build step
+(python -m web_logic.templating, run by bin/post_compile) fills it with every
+template, so freshly booted workers only unmarshal code objects.
+
+Entries are keyed by template name rather than absolute path, because the
+slug is built in a temporary directory and run from another one; Jinja still
+recompiles any template whose source checksum no longer matches.
+"""
+import hashlib
+import logging
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(APP_ROOT, '.jinja_cache')
+
+
+class NameKeyedBytecodeCache(FileSystemBytecodeCache):
+    def get_cache_key(self, name, filename=None):
+        return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+
+def init_template_cache(app, directory=None):
+    directory = directory or os.environ.get('JINJA_CACHE_DIR', DEFAULT_CACHE_DIR)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        log.warning(f"No Jinja bytecode cache ({directory}: {e}).")
+        return None
+    cache = NameKeyedBytecodeCache(directory)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': cache}
+    return cache
+
+
+def precompile_templates(app):
+    """Compiles every template into the bytecode cache. Returns how many."""
+    env = app.jinja_env
+    names = env.list_templates(extensions=('html', 'htm', 'xml', 'txt'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # A bare app over the same templates builds the same Jinja environment as app.py,
+    # without connecting to the database or starting workers
+    build_app = Flask('app', root_path=APP_ROOT)
+    init_template_cache(build_app)
+    log.info(f"Precompiled {precompile_templates(build_app)} templates.")
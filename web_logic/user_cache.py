@@ -0,0 +1,119 @@
+"""
+In-process cache of User column values, keyed by user id.
+
+CurrentUser answers id and username from the cookie; this cache covers the
+rest (email, password_hash, ...) so a returning visitor's row is read once per
+USER_CACHE_TTL seconds instead of once per request. It is an LRU bounded to
+USER_CACHE_SIZE entries, and every change to a user invalidates its entry.
+
+With SOCKETIO_MESSAGE_QUEUE set, invalidations are also published on a
+channel of that server so the other workers drop their copy too.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_SIZE = 10000
+DEFAULT_TTL = 300 # Seconds
+CHANNEL = 'wescoup:user-invalidate'
+
+
+class UserCache:
+    def __init__(self, max_size=DEFAULT_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict() # user_id -> (expires_at, values), least recently used first
+        self._lock = threading.Lock()
+        self._client = None # RespClient for cross-worker invalidation
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """Returns the cached {column: value} dict for user_id, or None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return values
+
+    def _drop(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate(self, *user_ids):
+        """Drops user_ids here and, if connected, on every other worker."""
+        self._drop(user_ids)
+        if self._client is not None and user_ids:
+            try:
+                self._client.execute('PUBLISH', CHANNEL, ' '.join(user_ids))
+            except Exception as e:
+                log.error(f"Failed to publish user cache invalidation: {e}")
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def connect(self, url):
+        """Publishes invalidations to (and applies those of other workers from) the server at url."""
+        from game_logic.backend import RespClient
+        self._client = RespClient(url)
+        threading.Thread(target=self._listen, name='user-cache-invalidation', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                for _, data in self._client.listen(CHANNEL):
+                    self._drop(data.decode('utf-8').split())
+            except Exception as e:
+                log.error(f"User cache invalidation channel lost, reconnecting: {e}")
+                # Whatever was missed meanwhile may be stale
+                with self._lock:
+                    self._entries.clear()
+                time.sleep(1)
+
+
+def user_cache_from_env():
+    """A UserCache sized by USER_CACHE_SIZE / USER_CACHE_TTL (size 0 disables it), or None."""
+    size = int(os.environ.get('USER_CACHE_SIZE', DEFAULT_SIZE))
+    if size <= 0:
+        return None
+    cache = UserCache(size, float(os.environ.get('USER_CACHE_TTL', DEFAULT_TTL)))
+    url = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    if url:
+        cache.connect(url)
+    return cache
@@ -0,0 +1,253 @@
+"""
+Write-behind buffer for User rows.
+
+Anonymous visitors don't get a database row until they do something worth
+keeping (renaming themselves, joining a War room). Those requests call
+UserWriter.save(); a background thread then writes everything queued in
+one batch every FLUSH_INTERVAL seconds, or sooner once MAX_BATCH users are
+waiting: one SELECT to find which ids already exist, one bulk INSERT for
+the new ones and one executemany UPDATE for renames.
+
+Activity goes through the same thread: UserWriter.touch() records a visit in
+memory, at most once per user per LAST_SEEN_INTERVAL, and the batch sets
+User.last_seen for all of them with one executemany UPDATE.
+
+A batch that fails (say, one row breaks a constraint) is retried one row per
+transaction, so the bad row can't hold up everyone else; rows that keep
+failing are dropped after MAX_ATTEMPTS flushes. Lost connections just put
+the whole batch back for the next flush.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, exc, insert, select, update
+
+# Configure logging
+log = logging.getLogger(__name__)
+
+# --- Constants ---
+FLUSH_INTERVAL = 2.0 # Seconds between batch writes
+MAX_BATCH = 500 # Flush early once this many users are waiting
+RECENT_SIZE = 10000 # Ids known to exist, so repeat saves (e.g. every War join) are skipped
+LAST_SEEN_INTERVAL = 900 # Seconds; finer last_seen precision isn't worth a write per request
+MAX_ATTEMPTS = 5 # Failed writes before a queued user is dropped (lost connections don't count)
+
+
+def _utc(timestamp):
+    """Naive UTC datetime, as stored in User.last_seen."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _is_disconnect(error):
+    """True for errors that say nothing about the rows, e.g. the database being unreachable."""
+    return isinstance(error, exc.DBAPIError) and (error.connection_invalidated
+                                                  or isinstance(error, exc.OperationalError))
+
+
+class UserWriter:
+    def __init__(self, app, db, User, interval=FLUSH_INTERVAL, max_batch=MAX_BATCH, on_rename=None):
+        self.app = app
+        self.db = db
+        self.table = User.__table__
+        self.interval = interval
+        self.max_batch = max_batch
+        self.on_rename = on_rename # Called with the ids of renamed rows after each write (cache invalidation)
+        self._pending = {} # user_id -> {'username': str, 'rename': bool}
+        self._recent = OrderedDict() # user_id -> None, oldest first
+        self.seen_interval = float(os.environ.get('LAST_SEEN_INTERVAL', LAST_SEEN_INTERVAL))
+        self._seen = {} # user_id -> timestamp, waiting to be written
+        self._touched = OrderedDict() # user_id -> timestamp of the last recorded visit, oldest first
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._attempts = {} # user_id -> failed writes of its queued entry
+        self._thread = None
+
+        # Counters
+        self.batches = 0
+        self.inserted = 0
+        self.renamed = 0
+        self.touched = 0
+
+    def start(self):
+        """Starts the background flusher (a green thread under eventlet.monkey_patch())."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='user-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def save(self, user_id, username, rename=False):
+        """
+        Queues a user to be created if missing. rename=True also updates the
+        name of an existing row. The last save for an id wins.
+        """
+        with self._lock:
+            if not rename and user_id in self._recent:
+                return
+            entry = self._pending.get(user_id)
+            if entry is None:
+                self._pending[user_id] = {'username': username, 'rename': rename}
+            elif rename or not entry['rename']:
+                entry['username'] = username
+                entry['rename'] = entry['rename'] or rename
+            waiting = len(self._pending)
+        if waiting >= self.max_batch:
+            self._wake.set()
+
+    def touch(self, user_id):
+        """Records a visit. Only the first visit per LAST_SEEN_INTERVAL is queued for writing."""
+        now = time.time()
+        with self._lock:
+            last = self._touched.get(user_id)
+            if last is not None and now - last < self.seen_interval:
+                return
+            self._touched[user_id] = now
+            self._touched.move_to_end(user_id)
+            while len(self._touched) > RECENT_SIZE:
+                self._touched.popitem(last=False)
+            self._seen[user_id] = now
+
+    def forget(self, user_ids):
+        """Drops deleted users from the known-to-exist set, so a later save() recreates them."""
+        with self._lock:
+            for user_id in user_ids:
+                self._recent.pop(user_id, None)
+
+    def pending_username(self, user_id):
+        """The queued (not yet written) name for user_id, or None."""
+        with self._lock:
+            entry = self._pending.get(user_id)
+            return entry['username'] if entry else None
+
+    def _remember(self, user_ids):
+        recent = self._recent
+        for user_id in user_ids:
+            recent[user_id] = None
+            recent.move_to_end(user_id)
+        while len(recent) > RECENT_SIZE:
+            recent.popitem(last=False)
+
+    def flush(self):
+        """Writes everything queued so far. Returns the number of users saved (not counting visits)."""
+        with self._lock:
+            batch = self._pending
+            seen = self._seen
+            self._pending = {}
+            self._seen = {}
+        if not batch and not seen:
+            return 0
+
+        try:
+            new_rows, renames = self._write(batch, seen)
+            touched = len(seen)
+        except Exception as e:
+            if _is_disconnect(e):
+                log.error(f"Failed to write {len(batch)} queued user(s) and {len(seen)} visit(s), will retry: {e}")
+                self._requeue(batch, seen)
+                return 0
+            log.warning(f"Batch of {len(batch)} user(s) and {len(seen)} visit(s) failed, "
+                        f"writing them one at a time: {e}")
+            batch, touched, new_rows, renames = self._write_each(batch, seen)
+
+        with self._lock:
+            self._remember(batch)
+            for user_id in batch:
+                self._attempts.pop(user_id, None)
+        self.batches += 1
+        self.inserted += len(new_rows)
+        self.renamed += len(renames)
+        self.touched += touched
+        if renames and self.on_rename is not None:
+            self.on_rename(*(rename['uid'] for rename in renames))
+        return len(batch)
+
+    def _write(self, batch, seen):
+        """Writes users and visits in one transaction; returns (inserted rows, renames)."""
+        table = self.table
+        now = _utc(time.time())
+        new_rows = renames = ()
+        with self.app.app_context(), self.db.engine.begin() as conn:
+            if batch:
+                ids = list(batch)
+                existing = set(conn.execute(select(table.c.id).where(table.c.id.in_(ids))).scalars())
+                new_rows = [{'id': user_id, 'username': entry['username'], 'last_seen': now}
+                            for user_id, entry in batch.items() if user_id not in existing]
+                renames = [{'uid': user_id, 'uname': entry['username']}
+                           for user_id, entry in batch.items() if user_id in existing and entry['rename']]
+                if new_rows:
+                    conn.execute(insert(table), new_rows)
+                if renames:
+                    conn.execute(update(table).where(table.c.id == bindparam('uid'))
+                                 .values(username=bindparam('uname')), renames)
+            if seen:
+                # Ids without a row (anonymous visitors) simply match nothing
+                conn.execute(update(table).where(table.c.id == bindparam('uid'))
+                             .values(last_seen=bindparam('seen')),
+                             [{'uid': user_id, 'seen': _utc(ts)} for user_id, ts in seen.items()])
+        return new_rows, renames
+
+    def _write_each(self, batch, seen):
+        """
+        Fallback for a failed batch: one transaction per user and per visit, so
+        a bad row only holds up itself. Returns (written users, visits written,
+        inserted rows, renames); failed rows are requeued or dropped by _requeue().
+        """
+        written, failed, failed_seen = {}, {}, {}
+        new_rows, renames = [], []
+        touched = 0
+        for user_id, entry in batch.items():
+            try:
+                inserted, renamed = self._write({user_id: entry}, {})
+            except Exception as e:
+                failed[user_id] = entry
+                if not _is_disconnect(e):
+                    self._attempts[user_id] = self._attempts.get(user_id, 0) + 1
+                    log.warning(f"Failed to write user {user_id} "
+                                f"(attempt {self._attempts[user_id]} of {MAX_ATTEMPTS}): {e}")
+                continue
+            written[user_id] = entry
+            new_rows += inserted
+            renames += renamed
+        for user_id, ts in seen.items():
+            try:
+                self._write({}, {user_id: ts})
+                touched += 1
+            except Exception as e:
+                if _is_disconnect(e):
+                    failed_seen[user_id] = ts
+                else: # Only a timestamp: the next visit after LAST_SEEN_INTERVAL records a new one
+                    log.warning(f"Dropping last_seen for user {user_id}: {e}")
+        self._requeue(failed, failed_seen)
+        return written, touched, new_rows, renames
+
+    def _requeue(self, batch, seen):
+        """Puts failed writes back in the queue, except users that have failed MAX_ATTEMPTS times."""
+        with self._lock:
+            for user_id, entry in batch.items():
+                if self._attempts.get(user_id, 0) >= MAX_ATTEMPTS:
+                    self._attempts.pop(user_id)
+                    log.error(f"Dropping queued user {user_id} ({entry['username']!r}) "
+                              f"after {MAX_ATTEMPTS} failed writes")
+                    continue
+                # Keep anything queued meanwhile (it is newer)
+                if self._pending.setdefault(user_id, entry) is not entry:
+                    self._attempts.pop(user_id, None)
+            for user_id, ts in seen.items():
+                self._seen.setdefault(user_id, ts)
+
+    def stats(self):
+        return {'pending': len(self._pending), 'pending_visits': len(self._seen), 'batches': self.batches,
+                'inserted': self.inserted, 'renamed': self.renamed, 'touched': self.touched}
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.error(f"User writer flush failed: {e}", exc_info=True)